@@ -0,0 +1,50 @@
+"""unique_unread_messages_channel_id
+
+Revision ID: 14e5c8cf39ad
+Revises: 8ddd432d522a
+Create Date: 2025-02-08 10:12:44.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '14e5c8cf39ad'
+down_revision: Union[str, None] = '8ddd432d522a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ### 合并同一频道的重复未读记录：计数相加，保留最新的已读位置，只留下id最大的一条 ###
+    op.execute("""
+        WITH merged AS (
+            SELECT channel_id,
+                   MAX(id) AS keep_id,
+                   SUM(COALESCE(unread_count, 0)) AS total_count,
+                   MAX(last_read_message_id) AS last_read_message_id
+            FROM unread_messages
+            GROUP BY channel_id
+            HAVING COUNT(*) > 1
+        )
+        UPDATE unread_messages u
+        SET unread_count = merged.total_count,
+            last_read_message_id = merged.last_read_message_id
+        FROM merged
+        WHERE u.id = merged.keep_id
+    """)
+    op.execute("""
+        DELETE FROM unread_messages u
+        USING unread_messages keep
+        WHERE u.channel_id = keep.channel_id
+          AND u.id < keep.id
+    """)
+
+    # ### 每个频道一条记录，供 INSERT ... ON CONFLICT (channel_id) 原子计数 ###
+    op.create_index('ix_unread_messages_channel_id', 'unread_messages', ['channel_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_unread_messages_channel_id', table_name='unread_messages')
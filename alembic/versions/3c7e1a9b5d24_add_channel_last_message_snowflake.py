@@ -0,0 +1,40 @@
+"""add_channel_last_message_snowflake
+
+Revision ID: 3c7e1a9b5d24
+Revises: af9d35a2ff95
+Create Date: 2025-02-16 09:21:37.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c7e1a9b5d24'
+down_revision: Union[str, None] = 'af9d35a2ff95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ### 频道高水位：已入库的最新消息 snowflake ###
+    op.add_column('channels', sa.Column('last_message_snowflake', sa.BigInteger(), nullable=True))
+
+    # 用已有消息回填（跳过手动创建的非数字ID）
+    op.execute("""
+        UPDATE channels c
+        SET last_message_snowflake = m.max_snowflake
+        FROM (
+            SELECT channel_id, MAX(platform_message_id::bigint) AS max_snowflake
+            FROM messages
+            WHERE platform_message_id ~ '^[0-9]+$'
+            GROUP BY channel_id
+        ) m
+        WHERE c.id = m.channel_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('channels', 'last_message_snowflake')
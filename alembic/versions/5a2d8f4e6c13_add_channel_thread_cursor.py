@@ -0,0 +1,27 @@
+"""add_channel_thread_cursor
+
+Revision ID: 5a2d8f4e6c13
+Revises: 3c7e1a9b5d24
+Create Date: 2025-02-17 15:02:48.219573
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a2d8f4e6c13'
+down_revision: Union[str, None] = '3c7e1a9b5d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ### 论坛帖子抓取游标，为空时下一次抓取为全量抓取 ###
+    op.add_column('channels', sa.Column('thread_cursor_snowflake', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('channels', 'thread_cursor_snowflake')
@@ -0,0 +1,50 @@
+"""add_hot_query_indexes
+
+Revision ID: 861e15ef5b48
+Revises: fc63f9d073f1
+Create Date: 2025-02-12 14:05:33.187420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '861e15ef5b48'
+down_revision: Union[str, None] = 'fc63f9d073f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (索引名, 表名, 索引定义)，与 tests/benchmarks/bench_message_queries.py 中的列表保持一致
+INDEXES = [
+    # 频道消息分页、上下文构建、标记已读（DISTINCT ON）、删除消息时查找最新消息
+    ('ix_messages_channel_id_created_at', 'messages', '(channel_id, created_at DESC)'),
+    ('ix_messages_created_at', 'messages', '(created_at)'),
+    ('ix_messages_kol_id', 'messages', '(kol_id)'),
+    # 预加载附件、删除消息
+    ('ix_attachments_message_id', 'attachments', '(message_id)'),
+    ('ix_ai_messages_processed_priority_created', 'ai_messages', '(is_processed, priority, created_at)'),
+    ('ix_ai_messages_processed_created_at', 'ai_messages', '(created_at DESC) WHERE is_processed'),
+    ('ix_ai_messages_unprocessed', 'ai_messages', '(id) WHERE NOT is_processed'),
+    ('ix_ai_messages_trading_priority', 'ai_messages',
+     '(priority DESC, created_at DESC) WHERE is_processed AND is_trading_related'),
+    ('ix_ai_messages_high_priority_processed_at', 'ai_messages',
+     '(processed_at DESC) WHERE is_processed AND is_trading_related AND priority >= 4'),
+    ('ix_ai_processing_logs_stage_start_time', 'ai_processing_logs', '(stage, start_time)'),
+]
+
+
+def upgrade() -> None:
+    # ### 并发创建索引，不阻塞消息写入；中断后重跑会跳过已存在的索引 ###
+    with op.get_context().autocommit_block():
+        for name, table, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+        for table in dict.fromkeys(table for _, table, _ in INDEXES):
+            op.execute(f"ANALYZE {table}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
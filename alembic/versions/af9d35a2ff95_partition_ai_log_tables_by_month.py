@@ -0,0 +1,117 @@
+"""partition_ai_log_tables_by_month
+
+Revision ID: af9d35a2ff95
+Revises: 861e15ef5b48
+Create Date: 2025-02-14 11:48:06.552931
+
+"""
+from typing import Sequence, Union
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'af9d35a2ff95'
+down_revision: Union[str, None] = '861e15ef5b48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+# 表名 -> (start_time 为空时的回填表达式, 需要重建的索引：旧表上的全部索引，与模型声明一致)
+TABLES = {
+    'ai_processing_logs': (
+        'now()',
+        [
+            ('ix_ai_processing_logs_message_id', '(message_id)'),
+            ('ix_ai_processing_logs_stage', '(stage)'),
+            ('ix_ai_processing_logs_status', '(status)'),
+            ('ix_ai_processing_logs_start_time', '(start_time)'),
+            ('ix_ai_processing_logs_stage_start_time', '(stage, start_time)'),
+        ],
+    ),
+    'ai_processing_steps': (
+        'coalesce(created_at, now())',
+        [
+            ('ix_ai_processing_steps_ai_message_id', '(ai_message_id)'),
+            ('ix_ai_processing_steps_step_name', '(step_name)'),
+            ('ix_ai_processing_steps_status', '(status)'),
+        ],
+    ),
+}
+
+FOREIGN_KEYS = {
+    'ai_processing_steps': [
+        ('ai_processing_steps_ai_message_id_fkey', 'ai_message_id', 'ai_messages(id)'),
+    ],
+}
+
+
+def _month_start(dt: datetime) -> datetime:
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    month_index = dt.year * 12 + dt.month - 1 + months
+    return dt.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+
+def upgrade() -> None:
+    # ### 按月分区 AI 处理日志/步骤表：改名旧表 -> 建分区表 -> 复制数据 -> 删除旧表 ###
+    # 这两张表没有入站外键，可以直接替换；复制期间旧表被锁定，大表请在低峰期执行
+    conn = op.get_bind()
+    now = _month_start(datetime.now(timezone.utc))
+
+    for table, (start_time_fill, indexes) in TABLES.items():
+        legacy = f'{table}_legacy'
+        op.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+        op.execute(f'ALTER INDEX {table}_pkey RENAME TO {legacy}_pkey')
+        op.execute(f'UPDATE {legacy} SET start_time = {start_time_fill} WHERE start_time IS NULL')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+
+        op.execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (start_time)')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN start_time SET NOT NULL')
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, start_time)')
+
+        # 覆盖已有数据的最早月份到未来 MONTHS_AHEAD 个月
+        oldest = conn.execute(sa.text(f'SELECT min(start_time) FROM {legacy}')).scalar()
+        month = _add_months(now, -1)
+        if oldest is not None and oldest < month:
+            month = _month_start(oldest.astimezone(timezone.utc))
+        while month <= _add_months(now, MONTHS_AHEAD):
+            op.execute(
+                f"CREATE TABLE {table}_p{month.year:04d}{month.month:02d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            )
+            month = _add_months(month, 1)
+
+        op.execute(f'INSERT INTO {table} SELECT * FROM {legacy}')
+        op.execute(f'DROP TABLE {legacy}')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+
+        for name, definition in indexes:
+            op.execute(f'CREATE INDEX {name} ON {table} {definition}')
+        for name, column, target in FOREIGN_KEYS.get(table, []):
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {target}')
+
+
+def downgrade() -> None:
+    # ### 还原为普通表：数据复制回非分区表 ###
+    for table, (_, indexes) in TABLES.items():
+        partitioned = f'{table}_partitioned'
+        op.execute(f'ALTER TABLE {table} RENAME TO {partitioned}')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+
+        op.execute(f'CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS)')
+        op.execute(f'INSERT INTO {table} SELECT * FROM {partitioned}')
+        op.execute(f'DROP TABLE {partitioned} CASCADE')
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN start_time DROP NOT NULL')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+
+        for name, definition in indexes:
+            op.execute(f'CREATE INDEX {name} ON {table} {definition}')
+        for name, column, target in FOREIGN_KEYS.get(table, []):
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {target}')
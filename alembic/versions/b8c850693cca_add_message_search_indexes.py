@@ -0,0 +1,41 @@
+"""add_message_search_indexes
+
+Revision ID: b8c850693cca
+Revises: 14e5c8cf39ad
+Create Date: 2025-02-09 16:40:27.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8c850693cca'
+down_revision: Union[str, None] = '14e5c8cf39ad'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ### 三元组扩展，用于中文和代币符号的子串匹配 ###
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # ### 全文检索生成列（添加 STORED 生成列会重写 messages 表）###
+    op.execute("""
+        ALTER TABLE messages
+        ADD COLUMN content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED
+    """)
+
+    # ### GIN 索引并发创建，不阻塞消息写入 ###
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_content_tsv ON messages USING gin (content_tsv)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_content_trgm ON messages USING gin (content gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_messages_content_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_messages_content_tsv")
+    op.drop_column('messages', 'content_tsv')
@@ -0,0 +1,48 @@
+"""add_message_symbols_table
+
+Revision ID: fc63f9d073f1
+Revises: b8c850693cca
+Create Date: 2025-02-11 09:27:51.664210
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fc63f9d073f1'
+down_revision: Union[str, None] = 'b8c850693cca'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ### 代币符号倒排索引表 ###
+    op.create_table('message_symbols',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('symbol', sa.String(length=20), nullable=False),
+        sa.Column('message_id', sa.Integer(), nullable=True),
+        sa.Column('ai_message_id', sa.Integer(), nullable=True),
+        sa.Column('channel_id', sa.Integer(), nullable=True),
+        sa.Column('source', sa.String(length=10), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['ai_message_id'], ['ai_messages.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['channel_id'], ['channels.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_message_symbols_symbol_created_at', 'message_symbols', ['symbol', 'created_at'], unique=False)
+    # 部分唯一索引：同一条消息/AI消息的同一个符号只记录一次，同时用于外键级联删除
+    op.create_index('uq_message_symbols_message', 'message_symbols', ['message_id', 'symbol'], unique=True,
+                    postgresql_where=sa.text('message_id IS NOT NULL'))
+    op.create_index('uq_message_symbols_ai_message', 'message_symbols', ['ai_message_id', 'symbol'], unique=True,
+                    postgresql_where=sa.text('ai_message_id IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('uq_message_symbols_ai_message', table_name='message_symbols')
+    op.drop_index('uq_message_symbols_message', table_name='message_symbols')
+    op.drop_index('ix_message_symbols_symbol_created_at', table_name='message_symbols')
+    op.drop_table('message_symbols')
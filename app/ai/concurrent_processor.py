@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 
 from ..config.settings import get_settings, reload_settings
 from .preprocessor import message_preprocessor
+from ..services.ingest_tracer import ingest_tracer
 from .models import AIMessage, AIProcessingLog
 
 logger = logging.getLogger(__name__)
@@ -197,7 +198,7 @@ class ConcurrentAIProcessor:
         """处理任务批次"""
         logger.info(f"工作器 {worker_name} 开始处理 {len(tasks)} 个任务")
         
-        from ..database import SessionLocal  # 避免循环导入
+        from ..database import AsyncAISessionLocal  # 避免循环导入
         
         for task in tasks:
             start_time = time.time()
@@ -207,12 +208,9 @@ class ConcurrentAIProcessor:
                 # 频率限制
                 await self.rate_limiter.acquire()
                 
-                # 处理单个任务
-                db = SessionLocal()
-                try:
-                    ai_message = db.query(AIMessage).filter(
-                        AIMessage.id == task.ai_message_id
-                    ).first()
+                # 处理单个任务（异步会话，数据库等待与OpenAI请求可以重叠）
+                async with AsyncAISessionLocal() as db:
+                    ai_message = await db.get(AIMessage, task.ai_message_id)
                     
                     if not ai_message:
                         logger.warning(f"AI消息 {task.ai_message_id} 不存在")
@@ -223,13 +221,11 @@ class ConcurrentAIProcessor:
                         continue
                     
                     # 执行处理，带超时
+                    ingest_tracer.mark_ai(task.ai_message_id, "ai_started")
                     success = await asyncio.wait_for(
                         message_preprocessor.process_stage1(db, ai_message),
                         timeout=self.processing_timeout
                     )
-                    
-                finally:
-                    db.close()
                 
                 # 更新统计
                 self.stats["total_processed"] += 1
@@ -246,6 +242,9 @@ class ConcurrentAIProcessor:
             except Exception as e:
                 logger.error(f"处理任务 {task.ai_message_id} 时出错: {str(e)}")
                 self.stats["failed"] += 1
+            finally:
+                # 接收链路在AI处理结束（成功、失败或跳过）后结束
+                ingest_tracer.finish_ai(task.ai_message_id)
             
             # 标记任务完成
             self.task_queue.task_done()
@@ -10,6 +10,9 @@ import logging
 from .models import AIMessage
 from .concurrent_processor import concurrent_processor
 from ..config.settings import get_settings
+from ..database import DBSession, run_db
+from ..utils import json_codec
+from ..services.ingest_tracer import ingest_tracer
 
 logger = logging.getLogger(__name__)
 
@@ -36,14 +39,27 @@ class AIMessageHandler:
         self._active_connections.pop(client_id, None)
         logger.info(f"AI WebSocket客户端 {client_id} 已断开")
 
-    async def store_message(self, db: Session, message: Message) -> AIMessage:
+    async def store_message(self, db: DBSession, message: Message) -> Optional[int]:
         """
         存储转发的消息到AI消息表中，并添加到并发处理队列
         只处理开启转发的频道消息
         """
+        prepared = await run_db(db, self.prepare_message, message)
+        if not prepared:
+            return None
+        await self.dispatch_prepared(prepared)
+        return prepared["ai_message_id"]
+
+    def prepare_message(self, db: Session, message: Message) -> Optional[Dict[str, Any]]:
+        """
+        创建AI消息记录并准备广播数据（同步数据库阶段）
+
+        返回值只包含普通数据，调用方可以在会话之外（包括异步会话）安全使用，
+        之后通过 dispatch_prepared 加入处理队列并广播。
+        """
         # 检查频道是否开启转发
         if not message.channel.is_forwarding:
-            logger.debug(f"频道 {message.channel.name} 未开启转发，跳过AI处理")
+            logger.debug("频道 %s 未开启转发，跳过AI处理", message.channel.name)
             return None
         
         # 准备引用和附件数据
@@ -64,10 +80,10 @@ class AIMessageHandler:
         }
 
         # 记录附件信息用于调试
-        if message.attachments:
-            logger.info(f"消息包含 {len(message.attachments)} 个附件")
+        if message.attachments and logger.isEnabledFor(logging.INFO):
+            logger.info("消息包含 %d 个附件", len(message.attachments))
             for i, att in enumerate(message.attachments):
-                logger.info(f"附件 {i+1}: {att.filename}, 类型: {att.content_type}, ID: {att.id}")
+                logger.info("附件 %d: %s, 类型: %s, ID: %s", i + 1, att.filename, att.content_type, att.id)
 
         # 创建新的AI消息记录
         ai_message = AIMessage(
@@ -90,16 +106,29 @@ class AIMessageHandler:
         # 计算消息优先级（可以根据频道、内容等因素调整）
         priority = self._calculate_message_priority(message, ai_message)
 
+        return {
+            "ai_message_id": ai_message.id,
+            "priority": priority,
+            "broadcast": self._build_new_message_payload(message, ai_message)
+        }
+
+    async def dispatch_prepared(self, prepared: Dict[str, Any]):
+        """将已创建的AI消息加入并发处理队列，并广播原始消息到前端"""
+        ai_message_id = prepared["ai_message_id"]
+        priority = prepared["priority"]
+
         # 添加到并发处理队列
-        success = await concurrent_processor.add_task(ai_message.id, priority)
-        if not success:
-            logger.error(f"无法将AI消息 {ai_message.id} 添加到处理队列")
+        success = await concurrent_processor.add_task(ai_message_id, priority)
+        if success:
+            ingest_tracer.mark_ai(ai_message_id, "ai_enqueued")
+        else:
+            logger.error(f"无法将AI消息 {ai_message_id} 添加到处理队列")
+            ingest_tracer.finish_ai(ai_message_id)
 
         # 广播原始消息到前端
-        await self.broadcast_new_message(message, ai_message)
+        await self._broadcast_to_clients(prepared["broadcast"])
         
-        logger.info(f"AI消息 {ai_message.id} 已存储并加入处理队列，优先级: {priority}")
-        return ai_message
+        logger.info("AI消息 %s 已存储并加入处理队列，优先级: %s", ai_message_id, priority)
 
     def _calculate_message_priority(self, message: Message, ai_message: AIMessage) -> int:
         """计算消息处理优先级 (1-5, 5最高)"""
@@ -120,8 +149,8 @@ class AIMessageHandler:
         
         return min(priority, 5)  # 最大优先级为5
 
-    async def broadcast_new_message(self, message: Message, ai_message: AIMessage):
-        """广播新消息到前端"""
+    def _build_new_message_payload(self, message: Message, ai_message: AIMessage) -> Dict[str, Any]:
+        """构建新消息的前端广播数据"""
         # 准备附件信息
         attachments = []
         if message.attachments:
@@ -168,7 +197,7 @@ class AIMessageHandler:
             "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
         }
 
-        await self._broadcast_to_clients(message_data)
+        return message_data
 
     async def broadcast_processing_result(self, ai_message: AIMessage):
         """广播AI处理结果到前端"""
@@ -244,6 +273,7 @@ class AIMessageHandler:
         }
 
         await self._broadcast_to_clients(analysis_data)
+        ingest_tracer.mark_ai(ai_message.id, "result_broadcast")
         
         # 如果是高优先级交易消息，发送特殊通知
         if ai_message.is_trading_related and ai_message.priority >= 4:
@@ -265,7 +295,7 @@ class AIMessageHandler:
         if not self._active_connections:
             return
         
-        message_text = json.dumps(data, ensure_ascii=False)
+        message_text = json_codec.dumps(data)
         disconnected_clients = []
         
         for client_id, websocket in self._active_connections.items():
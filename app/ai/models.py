@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Boolean, Float, ForeignKey, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.schema import DefaultClause
 from sqlalchemy.orm import relationship
@@ -41,6 +41,26 @@ class AIMessage(Base):
     processing_steps = relationship("AIProcessingStep", back_populates="ai_message", cascade="all, delete-orphan")
     manual_edits = relationship("AIManualEdit", back_populates="ai_message", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # 状态筛选 + 优先级 + 时间排序
+        Index("ix_ai_messages_processed_priority_created", "is_processed", "priority", "created_at"),
+        # 已处理消息列表按时间倒序分页
+        Index("ix_ai_messages_processed_created_at", text("created_at DESC"), postgresql_where=text("is_processed")),
+        # 待处理消息计数
+        Index("ix_ai_messages_unprocessed", "id", postgresql_where=text("NOT is_processed")),
+        # 高优先级交易消息
+        Index(
+            "ix_ai_messages_trading_priority",
+            text("priority DESC"), text("created_at DESC"),
+            postgresql_where=text("is_processed AND is_trading_related")
+        ),
+        Index(
+            "ix_ai_messages_high_priority_processed_at",
+            text("processed_at DESC"),
+            postgresql_where=text("is_processed AND is_trading_related AND priority >= 4")
+        ),
+    )
+    
     def __repr__(self):
         return f"<AIMessage(id={self.id}, channel_id='{self.channel_id}', is_trading_related={self.is_trading_related}, priority={self.priority})>"
 
@@ -48,16 +68,25 @@ class AIProcessingLog(Base):
     """AI处理日志表，记录处理过程和性能"""
     __tablename__ = 'ai_processing_logs'
     
-    id = Column(Integer, primary_key=True)
+    # 复合主键中的 id 需要显式声明自增，否则插入时不会由数据库序列生成
+    id = Column(Integer, primary_key=True, autoincrement=True)
     message_id = Column(Integer, nullable=False, index=True)
-    stage = Column(String(50), nullable=False)  # 处理阶段：stage1, stage2, stage3
-    status = Column(String(20), nullable=False)  # 状态：processing, completed, failed
-    start_time = Column(DateTime(timezone=True), server_default=func.now())
+    stage = Column(String(50), nullable=False, index=True)  # 处理阶段：stage1, stage2, stage3
+    status = Column(String(20), nullable=False, index=True)  # 状态：processing, completed, failed
+    # 按月分区的分区键，因此也是主键的一部分
+    start_time = Column(DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now(), index=True)
     end_time = Column(DateTime(timezone=True), nullable=True)
     duration_ms = Column(Integer, nullable=True)  # 处理耗时(毫秒)
     error_message = Column(Text, nullable=True)
     details = Column(JSON, nullable=True)  # 处理详情
     
+    __table_args__ = (
+        # 按阶段和时间窗口统计处理耗时
+        Index("ix_ai_processing_logs_stage_start_time", "stage", "start_time"),
+        # 按月范围分区，分区由 partition_manager 提前创建
+        {"postgresql_partition_by": "RANGE (start_time)"},
+    )
+    
     def __repr__(self):
         return f"<AIProcessingLog(id={self.id}, message_id={self.message_id}, stage='{self.stage}', status='{self.status}')>" 
 
@@ -65,11 +94,12 @@ class AIProcessingStep(Base):
     """AI处理步骤详情表，记录每个处理步骤的输入和输出数据"""
     __tablename__ = 'ai_processing_steps'
     
-    id = Column(Integer, primary_key=True)
+    # 复合主键中的 id 需要显式声明自增，否则插入时不会由数据库序列生成
+    id = Column(Integer, primary_key=True, autoincrement=True)
     ai_message_id = Column(Integer, ForeignKey('ai_messages.id'), nullable=False, index=True)
     step_name = Column(String(100), nullable=False, index=True)  # 步骤名称：context_building, message_analysis, trading_signal_extraction等
     step_order = Column(Integer, nullable=False)  # 步骤顺序
-    status = Column(String(20), nullable=False, default='processing')  # processing, completed, failed, skipped
+    status = Column(String(20), nullable=False, default='processing', index=True)  # processing, completed, failed, skipped
     
     # 输入数据
     input_data = Column(JSON, nullable=True)  # 步骤的输入数据
@@ -81,8 +111,8 @@ class AIProcessingStep(Base):
     processing_details = Column(JSON, nullable=True)  # 处理过程中的详细信息
     error_message = Column(Text, nullable=True)  # 错误信息
     
-    # 时间信息
-    start_time = Column(DateTime(timezone=True), server_default=func.now())
+    # 时间信息（按月分区的分区键，因此也是主键的一部分）
+    start_time = Column(DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now())
     end_time = Column(DateTime(timezone=True), nullable=True)
     duration_ms = Column(Integer, nullable=True)  # 处理耗时(毫秒)
     
@@ -96,6 +126,11 @@ class AIProcessingStep(Base):
     # 关联关系
     ai_message = relationship("AIMessage", back_populates="processing_steps")
     
+    __table_args__ = (
+        # 按月范围分区，分区由 partition_manager 提前创建
+        {"postgresql_partition_by": "RANGE (start_time)"},
+    )
+    
     def __repr__(self):
         return f"<AIProcessingStep(id={self.id}, ai_message_id={self.ai_message_id}, step_name='{self.step_name}', status='{self.status}')>"
 
@@ -11,6 +11,9 @@ from .models import AIMessage, AIProcessingLog
 from .workflow_tracker import WorkflowTracker, WorkflowStepContext
 from ..models.base import Message, Channel, KOL, Attachment
 from ..config.settings import get_settings
+from ..database import DBSession, run_db, commit_db
+from ..services.identity_cache import identity_cache
+from ..services.ingest_tracer import ingest_tracer
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +33,7 @@ class MessagePreprocessor:
         """设置处理结果回调函数"""
         self.result_callback = callback
         
-    async def process_stage1(self, db: Session, ai_message: AIMessage) -> bool:
+    async def process_stage1(self, db: DBSession, ai_message: AIMessage) -> bool:
         """
         执行第一阶段处理
         
@@ -53,7 +56,7 @@ class MessagePreprocessor:
             status="processing"
         )
         db.add(log)
-        db.commit()
+        await commit_db(db)
         
         try:
             # 1. 构建上下文
@@ -94,6 +97,12 @@ class MessagePreprocessor:
                     # 提取附件信息
                     if ai_message.references.get("attachments"):
                         attachments = []
+                        # 一次查询取出所有引用的附件数据
+                        attachment_map = await run_db(
+                            db,
+                            self._load_attachments,
+                            [att["id"] for att in ai_message.references.get("attachments") if "id" in att]
+                        )
                         # 复制原始附件列表，确保不修改原始数据
                         for att in ai_message.references.get("attachments"):
                             att_copy = dict(att)  # 创建附件信息的副本
@@ -102,8 +111,7 @@ class MessagePreprocessor:
                             if "id" in att_copy:
                                 attachment_id = att_copy["id"]
                                 try:
-                                    # 从数据库查询附件对象
-                                    attachment_obj = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+                                    attachment_obj = attachment_map.get(attachment_id)
                                     
                                     if attachment_obj:
                                         # 更新附件信息，包含实际的二进制数据
@@ -187,6 +195,7 @@ class MessagePreprocessor:
                     attachments=attachments,
                     referenced_content=referenced_content
                 )
+                ingest_tracer.mark_ai(ai_message.id, "openai_response")
                 
                 # 统计API调用信息（需要从openai_client获取）
                 analysis_step.set_output(
@@ -272,7 +281,7 @@ class MessagePreprocessor:
             await self._handle_processing_error(db, ai_message, log, start_time, str(e))
             return False
     
-    async def _build_context(self, db: Session, ai_message: AIMessage) -> tuple[List[str], List[Dict[str, Any]]]:
+    async def _build_context(self, db: DBSession, ai_message: AIMessage) -> tuple[List[str], List[Dict[str, Any]]]:
         """
         构建消息上下文
         获取同一频道的最近历史消息，包括文本和图片附件
@@ -281,49 +290,12 @@ class MessagePreprocessor:
             tuple: (context_messages: List[str], context_attachments: List[Dict])
         """
         try:
-            # 获取同频道的最近消息
-            recent_messages = db.query(Message).filter(
-                and_(
-                    Message.channel_id == self._get_channel_id_by_platform_id(db, ai_message.channel_id),
-                    Message.created_at < ai_message.created_at
-                )
-            ).order_by(desc(Message.created_at)).limit(self.max_context_messages).all()
-            
-            context_messages = []
-            context_attachments = []
-            context_ids = []
-            
-            for msg in reversed(recent_messages):  # 按时间正序
-                # 添加文本内容
-                if msg.content:
-                    context_messages.append(msg.content)
-                    context_ids.append(msg.id)
-                
-                # 添加图片附件信息
-                if hasattr(msg, 'attachments') and msg.attachments:
-                    for attachment in msg.attachments:
-                        # 只处理图片附件
-                        if attachment.content_type and attachment.content_type.startswith('image/'):
-                            try:
-                                context_attachments.append({
-                                    "id": attachment.id,
-                                    "filename": attachment.filename,
-                                    "content_type": attachment.content_type,
-                                    "file_data": attachment.file_data,
-                                    "url": f"/api/messages/attachments/{attachment.id}",
-                                    "message_content": msg.content or "[图片消息]",
-                                    "message_id": msg.id,
-                                    "size": len(attachment.file_data) if attachment.file_data else 0
-                                })
-                                logger.debug(f"添加上下文图片: {attachment.filename} (消息ID: {msg.id})")
-                            except Exception as e:
-                                logger.error(f"处理上下文图片附件失败: {str(e)}")
-                                continue
+            context_messages, context_attachments, context_ids = await run_db(db, self._load_context, ai_message)
             
             # 保存上下文消息ID到AI消息记录
             if context_ids:
                 ai_message.context_messages = context_ids
-                db.commit()
+                await commit_db(db)
             
             logger.info(f"为消息 {ai_message.id} 构建了 {len(context_messages)} 条上下文消息，{len(context_attachments)} 个上下文图片")
             return context_messages, context_attachments
@@ -332,14 +304,74 @@ class MessagePreprocessor:
             logger.error(f"构建上下文失败: {str(e)}")
             return [], []
     
+    def _load_context(self, db: Session, ai_message: AIMessage) -> tuple[List[str], List[Dict[str, Any]], List[int]]:
+        """查询同频道最近的历史消息及其图片附件（同步数据库阶段）"""
+        # 获取同频道的最近消息
+        recent_messages = db.query(Message).filter(
+            and_(
+                Message.channel_id == self._get_channel_id_by_platform_id(db, ai_message.channel_id),
+                Message.created_at < ai_message.created_at
+            )
+        ).order_by(desc(Message.created_at)).limit(self.max_context_messages).all()
+        
+        context_messages = []
+        context_attachments = []
+        context_ids = []
+        
+        for msg in reversed(recent_messages):  # 按时间正序
+            # 添加文本内容
+            if msg.content:
+                context_messages.append(msg.content)
+                context_ids.append(msg.id)
+            
+            # 添加图片附件信息
+            if hasattr(msg, 'attachments') and msg.attachments:
+                for attachment in msg.attachments:
+                    # 只处理图片附件
+                    if attachment.content_type and attachment.content_type.startswith('image/'):
+                        try:
+                            context_attachments.append({
+                                "id": attachment.id,
+                                "filename": attachment.filename,
+                                "content_type": attachment.content_type,
+                                "file_data": attachment.file_data,
+                                "url": f"/api/messages/attachments/{attachment.id}",
+                                "message_content": msg.content or "[图片消息]",
+                                "message_id": msg.id,
+                                "size": len(attachment.file_data) if attachment.file_data else 0
+                            })
+                            logger.debug(f"添加上下文图片: {attachment.filename} (消息ID: {msg.id})")
+                        except Exception as e:
+                            logger.error(f"处理上下文图片附件失败: {str(e)}")
+                            continue
+        
+        return context_messages, context_attachments, context_ids
+    
+    def _load_attachments(self, db: Session, attachment_ids: List[int]) -> Dict[int, Attachment]:
+        """按ID批量获取附件（同步数据库阶段）"""
+        if not attachment_ids:
+            return {}
+        rows = db.query(Attachment).filter(Attachment.id.in_(attachment_ids)).all()
+        return {row.id: row for row in rows}
+    
+    def _record_symbols(self, db: Session, ai_message: AIMessage):
+        """在保存点内写入符号索引，失败时不影响分析结果的提交"""
+        from ..services.symbol_index import record_ai_symbols  # 避免循环导入
+        with db.begin_nested():
+            record_ai_symbols(db, ai_message)
+    
     def _get_channel_id_by_platform_id(self, db: Session, platform_channel_id: str) -> Optional[int]:
         """根据平台频道ID获取数据库频道ID"""
+        identity_cache.ensure_loaded(db)
+        cached = identity_cache.get_channel(platform_channel_id)
+        if cached:
+            return cached.id
         channel = db.query(Channel).filter(Channel.platform_channel_id == platform_channel_id).first()
         return channel.id if channel else None
     
     async def _update_ai_message(
         self, 
-        db: Session, 
+        db: DBSession, 
         ai_message: AIMessage, 
         analysis_result: Dict[str, Any],
         trading_signal: Optional[Dict[str, Any]],
@@ -365,11 +397,17 @@ class MessagePreprocessor:
         if "error" in analysis_result:
             ai_message.processing_error = analysis_result["error"]
         
-        db.commit()
+        # 代币符号索引（交易信号的 symbols 和关键词），与分析结果一起提交
+        try:
+            await run_db(db, self._record_symbols, ai_message)
+        except Exception as e:
+            logger.error(f"写入AI消息 {ai_message.id} 的符号索引失败: {str(e)}")
+        
+        await commit_db(db)
     
     async def _complete_processing(
         self, 
-        db: Session, 
+        db: DBSession, 
         ai_message: AIMessage, 
         log: AIProcessingLog, 
         start_time: float
@@ -382,7 +420,7 @@ class MessagePreprocessor:
         log.end_time = datetime.now(timezone.utc)
         log.duration_ms = duration_ms
         
-        db.commit()
+        await commit_db(db)
         
         # 性能警告
         if duration_ms > 5000:  # 超过5秒
@@ -390,7 +428,7 @@ class MessagePreprocessor:
     
     async def _handle_processing_error(
         self, 
-        db: Session, 
+        db: DBSession, 
         ai_message: AIMessage, 
         log: AIProcessingLog, 
         start_time: float, 
@@ -408,7 +446,7 @@ class MessagePreprocessor:
         ai_message.processing_error = error_message
         ai_message.processed_at = datetime.now(timezone.utc)
         
-        db.commit()
+        await commit_db(db)
     
     async def get_high_priority_messages(self, db: Session, limit: int = 10) -> List[AIMessage]:
         """获取高优先级的交易相关消息"""
@@ -5,13 +5,14 @@ import time
 import logging
 from datetime import datetime, timezone
 from .models import AIMessage, AIProcessingStep
+from ..database import DBSession, run_db, commit_db, refresh_db
 
 logger = logging.getLogger(__name__)
 
 class WorkflowTracker:
     """AI工作流跟踪器，用于记录每个处理步骤的详细信息"""
     
-    def __init__(self, db: Session, ai_message: AIMessage):
+    def __init__(self, db: DBSession, ai_message: AIMessage):
         self.db = db
         self.ai_message = ai_message
         self.current_step_order = 0
@@ -50,8 +51,8 @@ class WorkflowTracker:
         )
         
         self.db.add(step)
-        self.db.commit()
-        self.db.refresh(step)
+        await commit_db(self.db)
+        await refresh_db(self.db, step)
         
         logger.info(f"开始处理步骤: {step_name} (AI消息ID: {self.ai_message.id})")
         return step
@@ -98,7 +99,7 @@ class WorkflowTracker:
         step.tokens_used = tokens_used
         step.cost_usd = cost_usd
         
-        self.db.commit()
+        await commit_db(self.db)
         
         logger.info(f"完成处理步骤: {step.step_name}, 耗时: {duration_ms}ms, API调用: {api_calls_count}次")
     
@@ -134,7 +135,7 @@ class WorkflowTracker:
         step.end_time = end_time
         step.duration_ms = duration_ms
         
-        self.db.commit()
+        await commit_db(self.db)
         
         logger.error(f"步骤失败: {step.step_name}, 错误: {error_message}, 耗时: {duration_ms}ms")
     
@@ -173,8 +174,8 @@ class WorkflowTracker:
         )
         
         self.db.add(step)
-        self.db.commit()
-        self.db.refresh(step)
+        await commit_db(self.db)
+        await refresh_db(self.db, step)
         
         logger.info(f"跳过处理步骤: {step_name}, 原因: {reason}")
         return step
@@ -212,11 +213,15 @@ class WorkflowTracker:
             except Exception:
                 return f"<{type(data).__name__} object>"
     
-    async def get_workflow_summary(self) -> Dict[str, Any]:
-        """获取工作流摘要信息"""
-        steps = self.db.query(AIProcessingStep).filter(
+    def _load_steps(self, db: Session) -> List[AIProcessingStep]:
+        """按顺序查询当前AI消息的所有处理步骤"""
+        return db.query(AIProcessingStep).filter(
             AIProcessingStep.ai_message_id == self.ai_message.id
         ).order_by(AIProcessingStep.step_order).all()
+    
+    async def get_workflow_summary(self) -> Dict[str, Any]:
+        """获取工作流摘要信息"""
+        steps = await run_db(self.db, self._load_steps)
         
         total_duration = sum(step.duration_ms or 0 for step in steps)
         total_api_calls = sum(step.api_calls_count or 0 for step in steps)
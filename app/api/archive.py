@@ -0,0 +1,59 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Path, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+import asyncio
+import logging
+
+from ..database import get_async_db
+from ..services.archiver import archiver
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+TABLE_PATTERN = "^(messages|ai_messages)$"
+
+@router.get("/history/{table}")
+async def get_history(
+    table: str = Path(..., pattern=TABLE_PATTERN),
+    start: Optional[datetime] = Query(None, description="起始时间（包含）"),
+    end: Optional[datetime] = Query(None, description="结束时间（不包含），用于向前翻页"),
+    channel_id: Optional[str] = Query(None, description="Discord 频道ID"),
+    limit: int = Query(100, gt=0, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """跨数据库和归档文件查询消息或AI分析结果（按时间倒序）"""
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be earlier than end")
+    try:
+        rows = await archiver.query_history(db, table, start, end, channel_id, limit)
+        return {
+            "table": table,
+            "count": len(rows),
+            "next_end": rows[-1]["created_at"].isoformat() if len(rows) == limit else None,
+            "rows": rows
+        }
+    except Exception as e:
+        logger.error(f"Error querying history: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/archive/run")
+async def run_archive(
+    older_than_days: int = Query(..., gt=0, description="归档并删除早于该天数的消息和AI消息"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """手动执行一次归档"""
+    try:
+        return await archiver.run_once(db, older_than_days)
+    except Exception as e:
+        logger.error(f"Error running archive: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/archive/stats")
+async def get_archive_stats():
+    """归档文件统计"""
+    try:
+        return await asyncio.to_thread(archiver.get_stats)
+    except Exception as e:
+        logger.error(f"Error getting archive stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,28 +1,22 @@
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, select
 import logging
 from pydantic import BaseModel
 import traceback
 
-from ..database import SessionLocal, get_db
+from ..database import SessionLocal, get_db, get_async_db
 from ..models.base import Channel, KOL, KOLCategory, Message, UnreadMessage, Attachment
-from ..services.discord_client import DiscordClient
+from ..services.discord_client import DiscordClient, get_discord_client
+from ..services.identity_cache import identity_cache
+from ..services.thread_crawler import thread_crawler
 
 router = APIRouter()
 message_logger = logging.getLogger("Message Logs")
 logger = logging.getLogger(__name__)
 
-# Create a single instance of DiscordClient
-_discord_client = None
-
-def get_discord_client():
-    global _discord_client
-    if _discord_client is None:
-        _discord_client = DiscordClient()
-    return _discord_client
-
 def get_db():
     db = SessionLocal()
     try:
@@ -38,28 +32,30 @@ class ChannelActiveUpdate(BaseModel):
 
 class ThreadSyncRequest(BaseModel):
     message_count: Optional[int] = 100
+    full: bool = False  # 忽略抓取游标，重新抓取所有帖子
+    bulk: bool = False  # 帖子消息使用批量导入（不广播、不转发AI）
 
 @router.get("/channels")
 async def get_channels(
     guild_id: Optional[str] = None,
     kol_category: Optional[str] = None,
     include_inactive: bool = False,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取频道列表，支持按服务器ID和KOL分类筛选"""
     try:
-        query = db.query(Channel)
+        query = select(Channel)
         
         if guild_id:
-            query = query.filter(Channel.guild_id == guild_id)
+            query = query.where(Channel.guild_id == guild_id)
         
         if kol_category:
-            query = query.filter(Channel.kol_category == kol_category)
+            query = query.where(Channel.kol_category == kol_category)
             
         if not include_inactive:
-            query = query.filter(Channel.is_active == True)
+            query = query.where(Channel.is_active == True)
             
-        channels = query.order_by(desc(Channel.created_at)).all()
+        channels = (await db.scalars(query.order_by(desc(Channel.created_at)))).all()
         
         result = []
         for channel in channels:
@@ -87,89 +83,26 @@ async def get_channels(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/channels/sync")
-async def sync_channels(db: Session = Depends(get_db)):
+async def sync_channels(db: Session = Depends(get_db), discord_client: DiscordClient = Depends(get_discord_client)):
     """同步Discord中的频道列表和论坛帖子到数据库"""
-    result = await get_discord_client().sync_channels_to_db(db)
+    result = await discord_client.sync_channels_to_db(db)
     return result
 
 @router.post("/channels/sync-threads")
-async def sync_all_threads(request: ThreadSyncRequest = None, db: Session = Depends(get_db)):
-    """同步所有论坛帖子"""
+async def sync_all_threads(request: ThreadSyncRequest = None, discord_client: DiscordClient = Depends(get_discord_client)):
+    """同步所有论坛帖子（默认增量：只抓取上次同步后有变化的帖子）"""
+    request = request or ThreadSyncRequest()
     try:
-        thread_count = 0
-        message_count = request.message_count if request else 100
-        # 获取所有论坛频道
-        forum_channels = db.query(Channel).filter(
-            Channel.type == 15,  # Discord论坛频道类型
-            Channel.is_active == True
-        ).all()
-        
-        for channel in forum_channels:
-            try:
-                # 获取帖子列表
-                threads = await get_discord_client().get_forum_threads(channel.platform_channel_id)
-                for thread_data in threads:
-                    # 为每个帖子创建新的数据库会话
-                    thread_db = SessionLocal()
-                    try:
-                        thread_id = thread_data.get('id')
-                        thread_name = thread_data.get('name', '未知帖子')
-                        is_archived = thread_data.get('archived', False)
-                        
-                        # 创建或更新帖子作为子频道
-                        thread = thread_db.query(Channel).filter(
-                            Channel.platform_channel_id == str(thread_id)
-                        ).first()
-                        
-                        if not thread:
-                            thread = Channel(
-                                platform_channel_id=str(thread_id),
-                                name=thread_name,
-                                guild_id=channel.guild_id,
-                                guild_name=channel.guild_name,
-                                type=11,  # Discord 帖子类型
-                                parent_id=str(channel.platform_channel_id),
-                                category_name=channel.name,
-                                is_active=False if is_archived else True,
-                                position=0,
-                                owner_id=thread_data.get('owner_id')
-                            )
-                            thread_db.add(thread)
-                            thread_count += 1
-                        else:
-                            thread.name = thread_name
-                            if is_archived:  # 如果是已归档帖子，直接设置为False
-                                thread.is_active = False
-                        
-                        thread_db.commit()
-
-                        # 同步帖子的历史消息
-                        if not is_archived and message_count > 0:
-                            messages = await get_discord_client().get_channel_messages(thread_id, limit=message_count)
-                            # 为每条消息创建新的数据库会话
-                            for msg in messages:
-                                msg_db = SessionLocal()
-                                try:
-                                    await get_discord_client().store_message(msg, msg_db)
-                                except Exception as e:
-                                    message_logger.error(f"存储消息失败: {str(e)}")
-                                    msg_db.rollback()
-                                finally:
-                                    msg_db.close()
-                    except Exception as e:
-                        message_logger.error(f"处理帖子 {thread_name} 失败: {str(e)}")
-                        thread_db.rollback()
-                    finally:
-                        thread_db.close()
-                
-                message_logger.info(f"论坛 {channel.name} 同步了 {len(threads)} 个帖子")
-            except Exception as e:
-                message_logger.error(f"同步论坛 {channel.name} 帖子失败: {str(e)}")
-                continue
-        
+        result = await thread_crawler.crawl(
+            discord_client,
+            full=request.full,
+            message_count=request.message_count or 0,
+            bulk=request.bulk
+        )
         return {
-            "message": f"Successfully synced {thread_count} threads",
-            "thread_count": thread_count
+            "message": f"Successfully synced {result['inserted_count']} threads",
+            "thread_count": result["inserted_count"],
+            **result
         }
         
     except Exception as e:
@@ -178,40 +111,43 @@ async def sync_all_threads(request: ThreadSyncRequest = None, db: Session = Depe
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/channels/{channel_id}/activate")
-async def activate_channel(channel_id: int, db: Session = Depends(get_db)):
+async def activate_channel(channel_id: int, db: AsyncSession = Depends(get_async_db)):
     """激活指定频道的监听"""
-    channel = db.query(Channel).filter(Channel.id == channel_id).first()
+    channel = await db.scalar(select(Channel).where(Channel.id == channel_id))
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
         
     channel.is_active = True
-    db.commit()
+    await db.commit()
+    identity_cache.put_channel(channel)
     return {"message": f"Channel {channel.name} activated"}
 
 @router.post("/channels/{channel_id}/deactivate")
-async def deactivate_channel(channel_id: int, db: Session = Depends(get_db)):
+async def deactivate_channel(channel_id: int, db: AsyncSession = Depends(get_async_db)):
     """停用指定频道的监听"""
-    channel = db.query(Channel).filter(Channel.id == channel_id).first()
+    channel = await db.scalar(select(Channel).where(Channel.id == channel_id))
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
         
     channel.is_active = False
-    db.commit()
+    await db.commit()
+    identity_cache.put_channel(channel)
     return {"message": f"Channel {channel.name} deactivated"}
 
 @router.post("/channels/{channel_id}/category")
 async def update_channel_category(
     channel_id: int,
     category: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    channel = db.query(Channel).filter(Channel.id == channel_id).first()
+    channel = await db.scalar(select(Channel).where(Channel.id == channel_id))
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
     
     try:
         channel.kol_category = KOLCategory(category) if category else None
-        db.commit()
+        await db.commit()
+        identity_cache.put_channel(channel)
         return {"message": "Channel category updated successfully"}
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid category")
@@ -238,6 +174,7 @@ async def reset_channels(
         # Finally delete all channels
         db.query(Channel).delete()
         db.commit()
+        identity_cache.invalidate()
         
         return {"message": "频道重置成功"}
         
@@ -253,15 +190,16 @@ async def reset_channels(
 async def update_channel_forwarding(
     channel_id: str,
     update: ChannelForwardingUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新频道的转发状态"""
-    channel = db.query(Channel).filter(Channel.platform_channel_id == channel_id).first()
+    channel = await db.scalar(select(Channel).where(Channel.platform_channel_id == channel_id))
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
     
     channel.is_forwarding = update.is_forwarding
-    db.commit()
+    await db.commit()
+    identity_cache.put_channel(channel)
     
     return {"status": "success", "is_forwarding": channel.is_forwarding}
 
@@ -269,14 +207,15 @@ async def update_channel_forwarding(
 async def update_channel_active(
     channel_id: str,
     update: ChannelActiveUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新频道的监听状态"""
-    channel = db.query(Channel).filter(Channel.platform_channel_id == channel_id).first()
+    channel = await db.scalar(select(Channel).where(Channel.platform_channel_id == channel_id))
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
     
     channel.is_active = update.is_active
-    db.commit()
+    await db.commit()
+    identity_cache.put_channel(channel)
     
     return {"status": "success", "is_active": channel.is_active} 
\ No newline at end of file
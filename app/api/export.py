@@ -0,0 +1,205 @@
+from typing import Any, AsyncIterator, Callable, List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from datetime import datetime, date, timezone
+import csv
+import io
+import json
+import logging
+import zlib
+
+from ..database import AsyncSessionLocal
+from ..models.base import Message, Channel, KOL
+from ..ai.models import AIMessage
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+FORMAT_PATTERN = "^(ndjson|csv)$"
+# 每次从服务端游标取出的行数，也是一个输出块的行数
+EXPORT_CHUNK_ROWS = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+MESSAGE_COLUMNS = [
+    Message.id,
+    Message.platform_message_id,
+    Channel.platform_channel_id.label("channel_id"),
+    Channel.name.label("channel_name"),
+    Channel.guild_id,
+    Channel.guild_name,
+    Channel.category_id,
+    Channel.category_name,
+    KOL.platform_user_id.label("author_id"),
+    KOL.name.label("author_name"),
+    Message.content,
+    Message.embeds,
+    Message.referenced_message_id,
+    Message.referenced_content,
+    Message.created_at,
+]
+
+AI_MESSAGE_COLUMNS = [
+    AIMessage.id,
+    AIMessage.channel_id,
+    AIMessage.channel_name,
+    AIMessage.message_content,
+    AIMessage.references,
+    AIMessage.is_trading_related,
+    AIMessage.priority,
+    AIMessage.keywords,
+    AIMessage.category,
+    AIMessage.sentiment,
+    AIMessage.analysis_summary,
+    AIMessage.has_trading_signal,
+    AIMessage.trading_signal,
+    AIMessage.context_messages,
+    AIMessage.is_processed,
+    AIMessage.processing_error,
+    AIMessage.created_at,
+    AIMessage.processed_at,
+]
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def _encode_ndjson(columns: List[str], rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default) + "\n"
+        for row in rows
+    )
+
+def _csv_encoder() -> Callable[[List[str], Any], str]:
+    """CSV 编码器：第一个块带表头"""
+    wrote_header = False
+
+    def encode(columns: List[str], rows) -> str:
+        nonlocal wrote_header
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not wrote_header:
+            writer.writerow(columns)
+            wrote_header = True
+        for row in rows:
+            writer.writerow([_csv_value(value) for value in row])
+        return buffer.getvalue()
+
+    return encode
+
+async def _stream_rows(stmt, fmt: str, compress: bool) -> AsyncIterator[bytes]:
+    """
+    通过服务端游标分块读取查询结果并逐块编码输出
+
+    内存占用只与块大小有关，与导出的总行数无关。会话在生成器内创建，
+    响应流结束（或客户端断开）时关闭并释放连接。
+    """
+    encode = _encode_ndjson if fmt == "ndjson" else _csv_encoder()
+    # wbits=31 输出带 gzip 头的流，可以逐块压缩
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    total = 0
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        columns = list(result.keys())
+        if fmt == "csv":
+            header = encode(columns, [])
+            yield compressor.compress(header.encode("utf-8")) if compressor else header.encode("utf-8")
+
+        async for rows in result.partitions():
+            total += len(rows)
+            data = encode(columns, rows).encode("utf-8")
+            if compressor:
+                data = compressor.compress(data)
+                if not data:
+                    continue
+            yield data
+
+    if compressor:
+        yield compressor.flush()
+    logger.info(f"导出完成: {total} 行 ({fmt}{', gzip' if compress else ''})")
+
+def _export_response(stmt, name: str, fmt: str, compress: bool) -> StreamingResponse:
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    filename = f"{name}-{timestamp}.{fmt}{'.gz' if compress else ''}"
+    return StreamingResponse(
+        _stream_rows(stmt, fmt, compress),
+        media_type="application/gzip" if compress else MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def _check_time_range(start: Optional[datetime], end: Optional[datetime]):
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be earlier than end")
+
+@router.get("/export/messages")
+async def export_messages(
+    fmt: str = Query("ndjson", alias="format", pattern=FORMAT_PATTERN),
+    compress: bool = Query(False, alias="gzip", description="gzip 压缩输出"),
+    channel_id: Optional[List[str]] = Query(None, description="Discord 频道ID，可重复"),
+    guild_id: Optional[str] = Query(None),
+    category_id: Optional[str] = Query(None, description="Discord 频道分类ID"),
+    start: Optional[datetime] = Query(None, description="起始时间（包含）"),
+    end: Optional[datetime] = Query(None, description="结束时间（不包含）"),
+):
+    """按时间顺序流式导出消息"""
+    _check_time_range(start, end)
+    stmt = (
+        select(*MESSAGE_COLUMNS)
+        .join(Channel, Message.channel_id == Channel.id)
+        .outerjoin(KOL, Message.kol_id == KOL.id)
+        .order_by(Message.created_at, Message.id)
+    )
+    if channel_id:
+        stmt = stmt.where(Channel.platform_channel_id.in_(channel_id))
+    if guild_id:
+        stmt = stmt.where(Channel.guild_id == guild_id)
+    if category_id:
+        stmt = stmt.where(Channel.category_id == category_id)
+    if start:
+        stmt = stmt.where(Message.created_at >= start)
+    if end:
+        stmt = stmt.where(Message.created_at < end)
+    return _export_response(stmt, "messages", fmt, compress)
+
+@router.get("/export/ai-messages")
+async def export_ai_messages(
+    fmt: str = Query("ndjson", alias="format", pattern=FORMAT_PATTERN),
+    compress: bool = Query(False, alias="gzip", description="gzip 压缩输出"),
+    channel_id: Optional[List[str]] = Query(None, description="Discord 频道ID，可重复"),
+    category: Optional[str] = Query(None, description="AI 分析的消息分类"),
+    trading_only: bool = Query(False, description="只导出交易相关消息"),
+    processed_only: bool = Query(True, description="只导出已完成分析的消息"),
+    start: Optional[datetime] = Query(None, description="起始时间（包含）"),
+    end: Optional[datetime] = Query(None, description="结束时间（不包含）"),
+):
+    """按时间顺序流式导出AI分析结果"""
+    _check_time_range(start, end)
+    stmt = select(*AI_MESSAGE_COLUMNS).order_by(AIMessage.created_at, AIMessage.id)
+    if channel_id:
+        stmt = stmt.where(AIMessage.channel_id.in_(channel_id))
+    if category:
+        stmt = stmt.where(AIMessage.category == category)
+    if trading_only:
+        stmt = stmt.where(AIMessage.is_trading_related.is_(True))
+    if processed_only:
+        stmt = stmt.where(AIMessage.is_processed.is_(True))
+    if start:
+        stmt = stmt.where(AIMessage.created_at >= start)
+    if end:
+        stmt = stmt.where(AIMessage.created_at < end)
+    return _export_response(stmt, "ai-messages", fmt, compress)
@@ -1,7 +1,8 @@
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException, Query, Depends, Body, Response, UploadFile, File
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, select
 from datetime import datetime, timezone
 from pydantic import BaseModel
 import logging
@@ -10,15 +11,16 @@ import asyncio
 import traceback
 import os
 
-from ..database import SessionLocal, get_db
+from ..database import SessionLocal, IngestSessionLocal, get_db, get_async_db, run_db
 from ..models.base import Message, KOL, Platform, Channel, Attachment, UnreadMessage
-from ..services.discord_client import DiscordClient
+from ..services.discord_client import DiscordClient, get_discord_client
 from ..services.file_utils import FileHandler
+from ..services import unread_counter, message_search, bulk_importer
+from ..services.identity_cache import CachedChannel
 from ..ai.message_handler import ai_message_handler
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
-discord_client = DiscordClient()
 
 class MessageCreate(BaseModel):
     content: str
@@ -28,10 +30,16 @@ class MessageCreate(BaseModel):
 class SyncHistoryRequest(BaseModel):
     message_count: int
     include_threads: bool = False  # 新增参数，控制是否同步论坛帖子
+    bulk: bool = False  # 批量导入（COPY + 合并），历史消息不广播、不转发AI
+    incremental: bool = False  # 增量同步：有高水位的频道只拉取比它新的消息（最多 message_count 条）
 
 class ChannelReadRequest(BaseModel):
     channel_id: str
 
+class ChannelsReadRequest(BaseModel):
+    channel_ids: Optional[List[str]] = None  # Discord频道ID列表
+    guild_id: Optional[str] = None  # 标记整个服务器（包括其中的帖子）
+
 def get_db():
     db = SessionLocal()
     try:
@@ -45,31 +53,48 @@ async def get_messages(
     page: int = Query(1, gt=0),
     per_page: int = Query(20, gt=0),
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取频道消息"""
     try:
-        channel = db.query(Channel).filter(Channel.platform_channel_id == channel_id).first()
+        channel = await db.scalar(select(Channel).where(Channel.platform_channel_id == channel_id))
         if not channel:
             raise HTTPException(status_code=404, detail="Channel not found")
         
-        # 构建查询
-        query = db.query(Message).filter(Message.channel_id == channel.id)
+        total_found = None
+        total_is_estimate = False
+        highlights = {}
         
-        # 如果有搜索条件，添加搜索过滤
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(Message.content.ilike(search_term))
-        
-        # 按创建时间倒序查询消息
-        messages = query.order_by(desc(Message.created_at)).offset(
-            (page - 1) * per_page
-        ).limit(per_page).all()
+            # 有搜索条件时走全文检索/三元组索引，频道内仍按时间倒序
+            found = await run_db(
+                db,
+                message_search.search_messages,
+                search,
+                page,
+                per_page,
+                channel_id=channel.id,
+                sort="time"
+            )
+            messages = [message for message, _, _ in found["results"]]
+            highlights = {message.id: highlight for message, _, highlight in found["results"]}
+            total_found = found["total"]
+            total_is_estimate = found["total_is_estimate"]
+        else:
+            # 按创建时间倒序查询消息，作者和附件随同预加载
+            messages = (await db.scalars(
+                select(Message).where(Message.channel_id == channel.id)
+                .options(selectinload(Message.kol), selectinload(Message.attachments))
+                .order_by(desc(Message.created_at))
+                .offset((page - 1) * per_page)
+                .limit(per_page)
+            )).all()
         
         return {
             "messages": [{
                 "id": message.id,
                 "content": message.content,
+                "highlight": highlights.get(message.id),
                 "author_name": message.kol.name,
                 "created_at": message.created_at.isoformat(),
                 "referenced_message_id": message.referenced_message_id,
@@ -83,7 +108,8 @@ async def get_messages(
                 ] if message.attachments else []
             } for message in messages],
             "search_term": search,
-            "total_found": query.count() if search else None
+            "total_found": total_found,
+            "total_is_estimate": total_is_estimate
         }
     except Exception as e:
         logger.error(f"Error getting messages: {str(e)}")
@@ -92,7 +118,8 @@ async def get_messages(
 @router.post("/messages")
 async def create_message(
     message_create: MessageCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    discord_client: DiscordClient = Depends(get_discord_client)
 ):
     """创建新消息"""
     try:
@@ -207,7 +234,8 @@ async def delete_message(message_id: int, db: Session = Depends(get_db)):
 @router.post("/messages/sync-history")
 async def sync_history_messages(
     request: SyncHistoryRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    discord_client: DiscordClient = Depends(get_discord_client)
 ):
     """同步所有频道的历史消息"""
     if request.message_count <= 0:
@@ -226,10 +254,54 @@ async def sync_history_messages(
     # 创建信号量限制并发数
     semaphore = asyncio.Semaphore(3)
 
+    def sync_after(channel: Channel) -> Optional[str]:
+        if request.incremental and channel.last_message_snowflake:
+            return str(channel.last_message_snowflake)
+        return None
+
+    async def store_messages(channel: Channel, messages: List[dict], channel_db: Session, label: str) -> int:
+        if request.bulk:
+            # 只为尚未入库的消息下载附件，然后整批 COPY 导入
+            try:
+                new_ids = set(await run_db(
+                    channel_db,
+                    bulk_importer.filter_new_message_ids,
+                    [str(message_data.get('id')) for message_data in messages if message_data.get('id')]
+                ))
+                attachments = {}
+                for message_data in messages:
+                    message_id = str(message_data.get('id'))
+                    if message_id in new_ids and message_data.get('attachments'):
+                        attachments[message_id] = await discord_client.download_attachments(message_data)
+                return await run_db(
+                    channel_db,
+                    bulk_importer.bulk_import_messages,
+                    CachedChannel.from_model(channel),
+                    messages,
+                    attachments
+                )
+            except Exception as e:
+                logger.error(f"批量导入失败: {str(e)}")
+                errors.append(f"{label} {channel.name} 批量导入失败: {str(e)}")
+                channel_db.rollback()
+                return 0
+
+        success_count = 0
+        for message_data in messages:
+            try:
+                await discord_client.store_message(message_data, channel_db)
+                success_count += 1
+            except Exception as e:
+                logger.error(f"存储消息失败: {str(e)}")
+                errors.append(f"{label} {channel.name} 消息 {message_data.get('id')} 存储失败: {str(e)}")
+                channel_db.rollback()
+                continue
+        return success_count
+
     async def process_channel(channel: Channel):
         nonlocal total_messages, channel_messages, thread_messages, channel_count, thread_count
         # 为每个频道创建新的数据库会话
-        channel_db = SessionLocal()
+        channel_db = IngestSessionLocal()
         try:
             async with semaphore:
                 # 如果是论坛频道且不需要同步帖子，则跳过
@@ -241,7 +313,8 @@ async def sync_history_messages(
                     # 获取历史消息
                     messages = await discord_client.get_channel_messages(
                         channel.platform_channel_id,
-                        limit=request.message_count
+                        limit=request.message_count,
+                        after=sync_after(channel)
                     )
                     
                     if not messages:
@@ -249,16 +322,7 @@ async def sync_history_messages(
                         return
                     
                     # 存储消息
-                    success_count = 0
-                    for message_data in messages:
-                        try:
-                            await discord_client.store_message(message_data, channel_db)
-                            success_count += 1
-                        except Exception as e:
-                            logger.error(f"存储消息失败: {str(e)}")
-                            errors.append(f"帖子 {channel.name} 消息 {message_data.get('id')} 存储失败: {str(e)}")
-                            channel_db.rollback()
-                            continue
+                    success_count = await store_messages(channel, messages, channel_db, "帖子")
                     
                     if success_count > 0:
                         thread_messages += success_count
@@ -270,7 +334,8 @@ async def sync_history_messages(
                 if channel.type not in [4, 15]:  # 排除分类和论坛频道
                     messages = await discord_client.get_channel_messages(
                         channel.platform_channel_id,
-                        limit=request.message_count
+                        limit=request.message_count,
+                        after=sync_after(channel)
                     )
                     
                     if not messages:
@@ -278,16 +343,7 @@ async def sync_history_messages(
                         return
                     
                     # 存储消息
-                    success_count = 0
-                    for message_data in messages:
-                        try:
-                            await discord_client.store_message(message_data, channel_db)
-                            success_count += 1
-                        except Exception as e:
-                            logger.error(f"存储消息失败: {str(e)}")
-                            errors.append(f"频道 {channel.name} 消息 {message_data.get('id')} 存储失败: {str(e)}")
-                            channel_db.rollback()
-                            continue
+                    success_count = await store_messages(channel, messages, channel_db, "频道")
                     
                     if success_count > 0:
                         channel_messages += success_count
@@ -389,11 +445,11 @@ async def clear_all_messages(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/messages/attachments/{attachment_id}")
-async def get_attachment(attachment_id: int, db: Session = Depends(get_db)):
+async def get_attachment(attachment_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取附件内容"""
     try:
         logger.info(f"Fetching attachment with ID: {attachment_id}")
-        attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+        attachment = await db.get(Attachment, attachment_id)
         
         if not attachment:
             logger.error(f"Attachment not found: {attachment_id}")
@@ -431,105 +487,65 @@ async def debug_log(data: dict = Body(...)):
     return {"status": "ok"}
 
 @router.get("/messages/unread-counts")
-async def get_unread_counts(db: Session = Depends(get_db)):
+async def get_unread_counts(db: AsyncSession = Depends(get_async_db)):
     """获取所有频道的未读消息数"""
     try:
-        unread_counts = {}
-        channels = db.query(Channel).all()
-        
-        for channel in channels:
-            # 获取该频道的未读消息记录
-            unread = db.query(UnreadMessage).filter(UnreadMessage.channel_id == channel.id).first()
-            if unread and unread.unread_count > 0:
-                unread_counts[channel.platform_channel_id] = unread.unread_count
-        
-        return unread_counts
+        return await run_db(db, unread_counter.get_unread_counts)
     except Exception as e:
         logger.error(f"Error getting unread counts: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/messages/mark-channel-read")
-async def mark_channel_read(request: ChannelReadRequest, db: Session = Depends(get_db)):
+async def mark_channel_read(request: ChannelReadRequest, db: AsyncSession = Depends(get_async_db)):
     """标记频道所有消息为已读"""
     try:
-        channel = db.query(Channel).filter(Channel.platform_channel_id == request.channel_id).first()
-        if not channel:
-            raise HTTPException(status_code=404, detail="Channel not found")
-        
-        # 获取频道最新消息
-        latest_message = db.query(Message).filter(
-            Message.channel_id == channel.id
-        ).order_by(desc(Message.created_at)).first()
-        
-        # 更新或创建未读消息记录
-        unread = db.query(UnreadMessage).filter(UnreadMessage.channel_id == channel.id).first()
-        if unread:
-            unread.unread_count = 0
-            if latest_message:
-                unread.last_read_message_id = latest_message.id
-        else:
-            unread = UnreadMessage(
-                channel_id=channel.id,
-                unread_count=0,
-                last_read_message_id=latest_message.id if latest_message else None
-            )
-            db.add(unread)
-        
-        db.commit()
-        return {"status": "success"}
+        marked = await run_db(db, unread_counter.mark_channels_read, [request.channel_id])
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error marking channel as read: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if not marked:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    return {"status": "success"}
+
+@router.post("/messages/mark-read")
+async def mark_channels_read(request: ChannelsReadRequest, db: AsyncSession = Depends(get_async_db)):
+    """批量标记频道为已读：指定频道列表和/或整个服务器"""
+    if request.channel_ids is None and request.guild_id is None:
+        raise HTTPException(status_code=400, detail="channel_ids or guild_id is required")
+    
+    try:
+        marked = await run_db(
+            db,
+            unread_counter.mark_channels_read,
+            request.channel_ids,
+            request.guild_id
+        )
+        await db.commit()
+        return {"status": "success", "channel_count": marked}
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error marking channels as read: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/messages/mark-all-read")
-async def mark_all_channels_read(db: Session = Depends(get_db)):
+async def mark_all_channels_read(db: AsyncSession = Depends(get_async_db)):
     """标记所有频道的消息为已读"""
     try:
-        channels = db.query(Channel).all()
-        for channel in channels:
-            # 获取该频道的最新消息
-            latest_message = db.query(Message).filter(
-                Message.channel_id == channel.id
-            ).order_by(desc(Message.created_at)).first()
-            
-            # 更新或创建未读消息记录
-            unread = db.query(UnreadMessage).filter(UnreadMessage.channel_id == channel.id).first()
-            if unread:
-                unread.unread_count = 0
-                if latest_message:
-                    unread.last_read_message_id = latest_message.id
-            else:
-                unread = UnreadMessage(
-                    channel_id=channel.id,
-                    unread_count=0,
-                    last_read_message_id=latest_message.id if latest_message else None
-                )
-                db.add(unread)
-        
-        db.commit()
-        return {"status": "success"}
+        marked = await run_db(db, unread_counter.mark_channels_read)
+        await db.commit()
+        return {"status": "success", "channel_count": marked}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error marking all channels as read: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 async def increment_unread_count(channel_id: int, db: Session):
     """增加频道的未读消息计数"""
     try:
-        unread = db.query(UnreadMessage).filter(UnreadMessage.channel_id == channel_id).first()
-        if not unread:
-            # 如果没有未读记录，创建新记录
-            unread = UnreadMessage(
-                channel_id=channel_id,
-                unread_count=1,
-                last_read_message_id=None  # 初始化时不设置last_read_message_id
-            )
-            db.add(unread)
-        else:
-            # 增加未读计数
-            unread.unread_count += 1
-        
+        unread_counter.increment_unread_count(db, channel_id)
         db.commit()
     except Exception as e:
         db.rollback()
@@ -542,18 +558,10 @@ async def ping():
     return {"status": "ok", "timestamp": datetime.now(timezone.utc).isoformat()}
 
 @router.get("/unread-counts")
-async def get_unread_counts(db: Session = Depends(get_db)):
+async def get_all_unread_counts(db: AsyncSession = Depends(get_async_db)):
     """Get unread message counts for all channels"""
     try:
-        unread_counts = {}
-        unread_messages = db.query(UnreadMessage).all()
-        
-        for unread in unread_messages:
-            channel = db.query(Channel).filter(Channel.id == unread.channel_id).first()
-            if channel:
-                unread_counts[channel.platform_channel_id] = unread.unread_count
-        
-        return unread_counts
+        return await run_db(db, unread_counter.get_unread_counts, include_zero=True)
     except Exception as e:
         logger.error(f"Error getting unread counts: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -563,32 +571,23 @@ async def search_messages_global(
     search: str = Query(..., min_length=1),
     page: int = Query(1, gt=0),
     per_page: int = Query(20, gt=0),
-    db: Session = Depends(get_db)
+    sort: str = Query("relevance", pattern="^(relevance|time)$"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """全局搜索消息（包括所有频道和帖子）"""
+    """全局搜索消息（包括所有频道和帖子），默认按相关度排序"""
     try:
         if len(search.strip()) < 1:
             raise HTTPException(status_code=400, detail="Search term must be at least 1 character")
         
-        search_term = f"%{search}%"
-        
         # 在所有消息中搜索，并关联频道信息
-        query = db.query(Message, Channel).join(
-            Channel, Message.channel_id == Channel.id
-        ).filter(
-            Message.content.ilike(search_term)
-        ).order_by(desc(Message.created_at))
-        
-        total_count = query.count()
-        
-        # 分页查询
-        results = query.offset((page - 1) * per_page).limit(per_page).all()
+        found = await run_db(db, message_search.search_messages, search.strip(), page, per_page, sort=sort)
         
         messages = []
-        for message, channel in results:
+        for message, channel, highlight in found["results"]:
             messages.append({
                 "id": message.id,
                 "content": message.content,
+                "highlight": highlight,
                 "author_name": message.kol.name,
                 "created_at": message.created_at.isoformat(),
                 "referenced_message_id": message.referenced_message_id,
@@ -608,7 +607,8 @@ async def search_messages_global(
         return {
             "messages": messages,
             "search_term": search,
-            "total_found": total_count,
+            "total_found": found["total"],
+            "total_is_estimate": found["total_is_estimate"],
             "page": page,
             "per_page": per_page,
             "has_more": len(messages) == per_page
@@ -0,0 +1,99 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone, timedelta
+import logging
+
+from ..database import get_async_db, run_db
+from ..services import symbol_index
+from ..services.symbol_extractor import normalize_symbol
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+SOURCE_PATTERN = "^(message|ai)$"
+
+def _parse_symbol(sym: str) -> str:
+    symbol = normalize_symbol(sym)
+    if not symbol:
+        raise HTTPException(status_code=400, detail="Invalid symbol")
+    return symbol
+
+@router.get("/symbols/trending")
+async def get_trending_symbols(
+    hours: float = Query(1, gt=0, le=24 * 30),
+    limit: int = Query(20, gt=0, le=200),
+    source: Optional[str] = Query(None, pattern=SOURCE_PATTERN),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """时间窗口内提及次数最多的符号"""
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    try:
+        symbols = await run_db(db, symbol_index.get_top_symbols, since, limit=limit, source=source)
+        return {
+            "since": since.isoformat(),
+            "hours": hours,
+            "symbols": symbols
+        }
+    except Exception as e:
+        logger.error(f"Error getting trending symbols: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/symbols/{sym}/messages")
+async def get_symbol_messages(
+    sym: str,
+    hours: float = Query(1, gt=0, le=24 * 30),
+    before: Optional[datetime] = Query(None, description="只返回该时间之前的内容，用于向前翻页"),
+    source: Optional[str] = Query(None, pattern=SOURCE_PATTERN),
+    limit: int = Query(50, gt=0, le=500),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取最近一段时间内提到某个符号的消息和AI分析结果（按时间倒序）"""
+    symbol = _parse_symbol(sym)
+    until = before or datetime.now(timezone.utc)
+    since = until - timedelta(hours=hours)
+    try:
+        mentions = await run_db(
+            db,
+            symbol_index.get_symbol_mentions,
+            symbol,
+            since,
+            until=before,
+            source=source,
+            limit=limit
+        )
+        return {
+            "symbol": symbol,
+            "since": since.isoformat(),
+            "messages": mentions,
+            "has_more": len(mentions) == limit
+        }
+    except Exception as e:
+        logger.error(f"Error getting messages for symbol {symbol}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/symbols/{sym}/mention-rate")
+async def get_symbol_mention_rate(
+    sym: str,
+    hours: float = Query(24, gt=0, le=24 * 30),
+    bucket: str = Query("hour", pattern="^(minute|hour|day)$"),
+    source: Optional[str] = Query(None, pattern=SOURCE_PATTERN),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """按时间桶统计某个符号的提及次数"""
+    symbol = _parse_symbol(sym)
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    try:
+        series = await run_db(db, symbol_index.get_mention_rate, symbol, since, bucket=bucket, source=source)
+        total = sum(point["mentions"] for point in series)
+        return {
+            "symbol": symbol,
+            "since": since.isoformat(),
+            "bucket": bucket,
+            "total": total,
+            "per_hour": round(total / hours, 2),
+            "series": series
+        }
+    except Exception as e:
+        logger.error(f"Error getting mention rate for symbol {symbol}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -13,12 +13,35 @@ class Settings(BaseSettings):
     postgres_host: str = Field(default="localhost", env="POSTGRES_HOST")
     postgres_port: str = Field(default="5432", env="POSTGRES_PORT")
     postgres_db: str = Field(default="autotrade", env="POSTGRES_DB")
-    
+
+    # 数据库连接池配置（API 连接池，以及未单独配置时其他子系统的默认值）
+    db_pool_size: int = Field(default=5, env="DB_POOL_SIZE")  # 常驻连接数
+    db_max_overflow: int = Field(default=10, env="DB_MAX_OVERFLOW")  # 超出常驻连接后允许的临时连接数
+    db_pool_timeout: int = Field(default=30, env="DB_POOL_TIMEOUT")  # 等待空闲连接的超时时间(秒)
+    db_pool_recycle: int = Field(default=1800, env="DB_POOL_RECYCLE")  # 连接最长存活时间(秒)，-1 表示不回收
+    db_pool_pre_ping: bool = Field(default=True, env="DB_POOL_PRE_PING")  # 取出连接前检测是否可用
+    db_pool_slow_wait_ms: int = Field(default=500, env="DB_POOL_SLOW_WAIT_MS")  # 等待连接超过该时长时记录警告
+
+    # 子系统独立连接池：消息接收（网关/历史同步）与AI处理互不抢占连接
+    db_ingest_pool_size: int = Field(default=5, env="DB_INGEST_POOL_SIZE")
+    db_ingest_max_overflow: int = Field(default=5, env="DB_INGEST_MAX_OVERFLOW")
+    db_ai_pool_size: int = Field(default=10, env="DB_AI_POOL_SIZE")  # 与 AI_MAX_CONCURRENT_WORKERS 对齐
+    db_ai_max_overflow: int = Field(default=5, env="DB_AI_MAX_OVERFLOW")
+
     # 应用配置
     BASE_URL: str = Field(default="http://localhost:8000", env="BASE_URL")
     
     # Discord配置
     discord_token: Optional[str] = Field(default=None, env="DISCORD_TOKEN")
+    discord_rest_global_rate: int = Field(default=50, env="DISCORD_REST_GLOBAL_RATE")  # 全局每秒最多REST请求数
+    discord_rest_max_retries: int = Field(default=5, env="DISCORD_REST_MAX_RETRIES")  # 429 最多重试次数
+    discord_sync_concurrency: int = Field(default=8, env="DISCORD_SYNC_CONCURRENCY")  # 频道同步时的并发请求数
+    discord_http_pool_size: int = Field(default=100, env="DISCORD_HTTP_POOL_SIZE")  # 共享HTTP连接池的最大连接数
+    discord_http_pool_per_host: int = Field(default=20, env="DISCORD_HTTP_POOL_PER_HOST")  # 每个主机的最大连接数
+    discord_http_dns_ttl: int = Field(default=300, env="DISCORD_HTTP_DNS_TTL")  # DNS缓存时间(秒)
+    discord_http_keepalive: float = Field(default=30, env="DISCORD_HTTP_KEEPALIVE")  # 空闲连接保持时间(秒)
+    discord_gateway_compression: bool = Field(default=True, env="DISCORD_GATEWAY_COMPRESSION")  # 网关使用 zlib-stream 传输压缩
+    discord_gateway_url: str = Field(default="wss://gateway.discord.gg", env="DISCORD_GATEWAY_URL")  # 网关地址，离线重放时指向 app/tools/gateway_replay.py
     
     # OpenAI配置
     openai_api_key: Optional[str] = Field(default=None, env="OPENAI_API_KEY")
@@ -33,12 +56,60 @@ class Settings(BaseSettings):
     ai_queue_max_size: int = Field(default=2000, env="AI_QUEUE_MAX_SIZE")  # 队列最大大小
     ai_processing_timeout: int = Field(default=30, env="AI_PROCESSING_TIMEOUT")  # 处理超时时间(秒)
     
+    # 消息搜索配置
+    search_count_cap: int = Field(default=1000, env="SEARCH_COUNT_CAP")  # 精确计数的上限，超过后使用查询计划估算
+
+    # 分区与数据保留配置（保留天数为 0 表示不清理）
+    maintenance_interval_minutes: int = Field(default=360, env="MAINTENANCE_INTERVAL_MINUTES")  # 分区维护间隔
+    partition_months_ahead: int = Field(default=3, env="PARTITION_MONTHS_AHEAD")  # 提前创建的月分区数
+    partition_retention_days: int = Field(default=0, env="PARTITION_RETENTION_DAYS")  # AI日志/步骤分区保留天数
+    partition_retention_mode: str = Field(default="detach", env="PARTITION_RETENTION_MODE")  # detach: 分离为独立表, drop: 删除
+    message_retention_days: int = Field(default=0, env="MESSAGE_RETENTION_DAYS")  # 消息保留天数
+    ai_message_retention_days: int = Field(default=0, env="AI_MESSAGE_RETENTION_DAYS")  # AI消息保留天数
+    retention_batch_size: int = Field(default=5000, env="RETENTION_BATCH_SIZE")  # 每批删除的行数
+
+    # 冷数据归档配置（归档后从数据库删除；天数为 0 表示不自动归档）
+    archive_dir: str = Field(default="archive", env="ARCHIVE_DIR")  # 归档根目录，不要放在公开挂载的 storage 目录下
+    archive_format: str = Field(default="auto", env="ARCHIVE_FORMAT")  # auto: 有 pyarrow 时用 parquet，否则 ndjson(.gz)
+    archive_after_days: int = Field(default=0, env="ARCHIVE_AFTER_DAYS")  # 早于该天数的消息和AI消息移入归档
+    archive_batch_size: int = Field(default=5000, env="ARCHIVE_BATCH_SIZE")  # 每批归档的行数
+
+    # 网关重连后补齐断线期间的消息
+    gap_fill_enabled: bool = Field(default=True, env="GAP_FILL_ENABLED")
+    gap_fill_margin_seconds: int = Field(default=60, env="GAP_FILL_MARGIN_SECONDS")  # 从最后收到事件的时间再往前多补的秒数
+    gap_fill_concurrency: int = Field(default=4, env="GAP_FILL_CONCURRENCY")  # 同时补齐的频道数
+    gap_fill_max_messages: int = Field(default=500, env="GAP_FILL_MAX_MESSAGES")  # 每个频道最多补齐的消息数
+
+    # 网关消息分发队列（按频道分片，固定数量的消费者）
+    dispatch_workers: int = Field(default=4, env="DISPATCH_WORKERS")  # 消费者数量，不超过消息接收连接池大小
+    dispatch_queue_size: int = Field(default=1000, env="DISPATCH_QUEUE_SIZE")  # 每个分片队列的最大长度
+    dispatch_overflow_policy: str = Field(default="spill", env="DISPATCH_OVERFLOW_POLICY")  # spill: 写入溢出文件, drop_oldest, drop_newest
+    dispatch_spill_dir: str = Field(default="spill", env="DISPATCH_SPILL_DIR")  # 溢出文件目录
+
+    # 网关会话恢复（RESUME）
+    gateway_resume_enabled: bool = Field(default=True, env="GATEWAY_RESUME_ENABLED")
+    gateway_session_ttl_seconds: int = Field(default=300, env="GATEWAY_SESSION_TTL_SECONDS")  # Redis 中会话状态的过期时间
+    gateway_session_save_interval: float = Field(default=5, env="GATEWAY_SESSION_SAVE_INTERVAL")  # 序列号写入 Redis 的最小间隔(秒)
+
+    # 网关帧录制（gzip 压缩的 ndjson，用于离线重放和基准测试）
+    gateway_record_enabled: bool = Field(default=False, env="GATEWAY_RECORD_ENABLED")
+    gateway_record_dir: str = Field(default="recordings", env="GATEWAY_RECORD_DIR")  # 录制目录，文件包含完整消息内容
+    gateway_record_max_mb: float = Field(default=100, env="GATEWAY_RECORD_MAX_MB")  # 单个文件的最大未压缩大小，超过后轮转
+    gateway_record_keep_files: int = Field(default=24, env="GATEWAY_RECORD_KEEP_FILES")  # 保留的录制文件数，0 表示不删除
+
+    # 消息接收链路耗时追踪（Discord timestamp → 入库 → 前端推送 → AI处理结果）
+    ingest_trace_enabled: bool = Field(default=True, env="INGEST_TRACE_ENABLED")
+    ingest_trace_window: int = Field(default=5000, env="INGEST_TRACE_WINDOW")  # 每个阶段保留最近多少个样本计算分位数
+    ingest_trace_max_active: int = Field(default=10000, env="INGEST_TRACE_MAX_ACTIVE")  # 最多同时追踪的消息数
+    ingest_trace_otel: bool = Field(default=False, env="INGEST_TRACE_OTEL")  # 安装了 opentelemetry 时把链路导出为 span
+
     # Redis配置
-    redis_url: Optional[str] = Field(default=None, env="REDIS_URL")
+    redis_url: Optional[str] = Field(default=None, env="REDIS_URL")  # 设置后网关会话保存到 Redis，重启后可以恢复
     
     # 应用配置
     debug: bool = Field(default=False, env="DEBUG")
     log_level: str = Field(default="INFO", env="LOG_LEVEL")
+    log_sample_interval_seconds: float = Field(default=10, env="LOG_SAMPLE_INTERVAL_SECONDS")  # 每条消息级别的日志采样间隔，0 表示不采样
     
     @validator('use_openai_proxy', pre=True)
     def parse_bool(cls, v):
@@ -0,0 +1,39 @@
+from typing import Dict, Set
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 无 $ 前缀时也识别为代币符号的常见币种（必须是全大写的独立单词）
+KNOWN_SYMBOLS: Set[str] = {
+    "BTC", "ETH", "SOL", "BNB", "XRP", "ADA", "DOGE", "TRX", "TON", "AVAX",
+    "DOT", "LINK", "MATIC", "POL", "SHIB", "LTC", "BCH", "UNI", "ATOM", "XLM",
+    "ETC", "FIL", "APT", "ARB", "OP", "SUI", "SEI", "NEAR", "INJ", "TIA",
+    "PEPE", "WIF", "BONK", "FLOKI", "ORDI", "SATS", "JUP", "PYTH", "WLD", "ENA",
+    "AAVE", "MKR", "LDO", "CRV", "DYDX", "GMX", "RNDR", "FET", "TAO", "STX",
+    "HBAR", "ICP", "KAS", "IMX", "AR", "ENS", "BLUR", "MEME", "TRUMP", "HYPE",
+}
+
+# 额外的已知币种，逗号分隔，例如 SYMBOL_EXTRA_TICKERS=ZRO,EIGEN
+KNOWN_SYMBOLS.update(
+    s.strip().upper() for s in os.getenv("SYMBOL_EXTRA_TICKERS", "").split(",") if s.strip()
+)
+
+# 交易对的计价币种，交易对只记录基础币种
+QUOTE_SYMBOLS: Set[str] = {"USDT", "USDC", "BUSD", "FDUSD", "USD", "BTC", "ETH"}
+
+# 中文名称和俗称
+SYMBOL_ALIASES: Dict[str, str] = {
+    "比特币": "BTC",
+    "大饼": "BTC",
+    "以太坊": "ETH",
+    "以太": "ETH",
+    "二饼": "ETH",
+    "姨太": "ETH",
+    "狗狗币": "DOGE",
+    "莱特币": "LTC",
+    "瑞波币": "XRP",
+}
+
+# 单条消息最多记录的符号数，避免刷屏消息写入大量索引行
+MAX_SYMBOLS_PER_MESSAGE = 20
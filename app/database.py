@@ -1,11 +1,22 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import Pool, QueuePool, AsyncAdaptedQueuePool
+from typing import Any, Callable, Deque, Dict, Type, TypeVar, Union
+from collections import deque
 from dotenv import load_dotenv
+import threading
+import logging
+import time
 import os
 
+from .config.settings import get_settings
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
@@ -13,15 +24,178 @@ POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "autotrade")
 
 SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+
+class PoolMetrics:
+    """连接池取连接的等待时间统计（包含池满时的排队和新建连接的耗时）"""
+
+    def __init__(self, name: str, slow_wait_ms: int, sample_size: int = 1000):
+        self.name = name
+        self.slow_wait_ms = slow_wait_ms
+        self._lock = threading.Lock()
+        self._recent: Deque[float] = deque(maxlen=sample_size)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.slow_waits = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record(self, wait_ms: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.total_wait_ms += wait_ms
+                self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+                self._recent.append(wait_ms)
+            if wait_ms >= self.slow_wait_ms:
+                self.slow_waits += 1
+
+        if timed_out:
+            logger.error(f"连接池 {self.name} 获取连接超时，已等待 {wait_ms:.0f}ms")
+        elif wait_ms >= self.slow_wait_ms:
+            logger.warning(f"连接池 {self.name} 获取连接等待 {wait_ms:.0f}ms")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts = self.checkouts
+            return {
+                "checkouts": checkouts,
+                "timeouts": self.timeouts,
+                "slow_waits": self.slow_waits,
+                "avg_wait_ms": round(self.total_wait_ms / checkouts, 2) if checkouts else 0.0,
+                "p95_wait_ms": round(recent[int(len(recent) * 0.95) - 1], 2) if recent else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 2)
+            }
+
+def _timed_pool_class(base: Type[Pool], metrics: PoolMetrics) -> Type[Pool]:
+    """生成记录取连接等待时间的连接池类（pool.recreate() 会沿用同一个类）"""
+
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except exc.TimeoutError:
+                metrics.record((time.perf_counter() - start) * 1000, timed_out=True)
+                raise
+            metrics.record((time.perf_counter() - start) * 1000)
+            return conn
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+settings = get_settings()
+
+# 各子系统连接池的统计，键为连接池名称
+pool_metrics: Dict[str, PoolMetrics] = {}
+_engines: Dict[str, Any] = {}
+
+def _pool_options(name: str, pool_size: int, max_overflow: int, base: Type[Pool]) -> Dict[str, Any]:
+    metrics = PoolMetrics(name, settings.db_pool_slow_wait_ms)
+    pool_metrics[name] = metrics
+    return {
+        "poolclass": _timed_pool_class(base, metrics),
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping
+    }
+
+def _create_sync_engine(name: str, pool_size: int, max_overflow: int):
+    _engines[name] = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        **_pool_options(name, pool_size, max_overflow, QueuePool)
+    )
+    return _engines[name]
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def _create_async_engine(name: str, pool_size: int, max_overflow: int):
+    _engines[name] = create_async_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL,
+        **_pool_options(name, pool_size, max_overflow, AsyncAdaptedQueuePool)
+    )
+    return _engines[name]
+
+# API 请求使用的默认引擎
+engine = _create_sync_engine("api", settings.db_pool_size, settings.db_max_overflow)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎（asyncpg），与同步引擎并存，供事件循环中的请求和消息接收路径使用
+# expire_on_commit=False：提交后访问已加载的属性不会触发隐式IO
+async_engine = _create_async_engine("api_async", settings.db_pool_size, settings.db_max_overflow)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# 消息接收：网关实时消息、历史消息同步、帖子同步
+ingest_engine = _create_sync_engine("ingest", settings.db_ingest_pool_size, settings.db_ingest_max_overflow)
+IngestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=ingest_engine)
+async_ingest_engine = _create_async_engine("ingest_async", settings.db_ingest_pool_size, settings.db_ingest_max_overflow)
+AsyncIngestSessionLocal = async_sessionmaker(bind=async_ingest_engine, autoflush=False, expire_on_commit=False)
+
+# AI处理工作器
+async_ai_engine = _create_async_engine("ai_async", settings.db_ai_pool_size, settings.db_ai_max_overflow)
+AsyncAISessionLocal = async_sessionmaker(bind=async_ai_engine, autoflush=False, expire_on_commit=False)
+
+def get_pool_stats() -> Dict[str, Any]:
+    """获取各连接池的占用情况和取连接等待时间"""
+    stats = {}
+    for name, eng in _engines.items():
+        pool = eng.pool
+        stats[name] = {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            **pool_metrics[name].snapshot()
+        }
+    return stats
+
 Base = declarative_base()
 
+T = TypeVar("T")
+DBSession = Union[Session, AsyncSession]
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def run_db(db: DBSession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    在同步或异步会话上执行以同步 Session 编写的数据库函数
+
+    AsyncSession 通过 run_sync 执行，数据库IO在事件循环上等待而不会阻塞它；
+    同步 Session 直接调用，兼容尚未迁移到异步会话的调用方。
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return fn(db, *args, **kwargs)
+
+async def commit_db(db: DBSession) -> None:
+    """提交同步或异步会话"""
+    if isinstance(db, AsyncSession):
+        await db.commit()
+    else:
+        db.commit()
+
+async def rollback_db(db: DBSession) -> None:
+    """回滚同步或异步会话"""
+    if isinstance(db, AsyncSession):
+        await db.rollback()
+    else:
+        db.rollback()
+
+async def refresh_db(db: DBSession, instance: Any) -> None:
+    """刷新同步或异步会话中的对象"""
+    if isinstance(db, AsyncSession):
+        await db.refresh(instance)
+    else:
+        db.refresh(instance)
@@ -4,7 +4,7 @@ from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
 from pathlib import Path
 import json
 from typing import List
@@ -20,13 +20,20 @@ apply_proxy_patch()
 
 # Configure improved logging
 from .utils.logging_config import configure_logging, register_websocket, unregister_websocket
+from .utils import json_codec
 logger = configure_logging()
 
 from .models.base import Base
-from .database import engine
+from .database import engine, SessionLocal, get_pool_stats
 from .services.message_handler import MessageHandler
-from .services.discord_client import DiscordClient
-from .api import messages, channels
+from .services.discord_client import get_discord_client
+from .services.identity_cache import identity_cache
+from .services.partition_manager import partition_manager
+from .services.discord_rest import discord_rest
+from .services.gateway_session import gateway_session
+from .services.gateway_recorder import gateway_recorder
+from .services.ingest_tracer import ingest_tracer
+from .api import messages, channels, symbols, archive, export
 from . import routes
 from .ai import ai_message_handler
 
@@ -36,13 +43,26 @@ Base.metadata.create_all(bind=engine)
 # Initialize templates
 templates = Jinja2Templates(directory=str(Path(__file__).parent / "templates"))
 
+# 前端日志消息的字段
+LOG_MESSAGE_FIELDS = {"type", "level", "logger", "message", "timestamp"}
+
 message_handler = None
-discord_client = DiscordClient()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     global message_handler
+    
+    # 预热频道/KOL身份缓存，消息热路径不再逐条查询
+    db = SessionLocal()
+    try:
+        identity_cache.load(db)
+    finally:
+        db.close()
+    
+    # 分区维护和数据保留（启动时先确保当前月份的分区存在）
+    await partition_manager.start()
+    
     message_handler = MessageHandler()
     await message_handler.start()
     
@@ -65,13 +85,17 @@ async def lifespan(app: FastAPI):
     # 停止AI消息处理器
     await ai_message_handler.stop_processing()
     logger.info("Stopped AI message processing service")
+    
+    await partition_manager.stop()
 
 # Create FastAPI application
 app = FastAPI(
     title="Discord Message Manager",
     description="A web interface for managing Discord messages and channels",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # 安装了 orjson 时 API 响应用 orjson 编码
+    default_response_class=ORJSONResponse if json_codec.orjson else JSONResponse
 )
 
 # Add CORS middleware
@@ -87,6 +111,9 @@ app.add_middleware(
 app.include_router(routes.router)  # 页面路由
 app.include_router(channels.router, prefix="/api")  # API路由
 app.include_router(messages.router, prefix="/api")  # API路由
+app.include_router(symbols.router, prefix="/api")  # 代币符号索引API
+app.include_router(archive.router, prefix="/api")  # 冷数据归档与历史查询API
+app.include_router(export.router, prefix="/api")  # 流式数据导出API
 
 # 添加AI路由
 from .ai.api import router as ai_router
@@ -126,15 +153,46 @@ async def health_check():
     """健康检查端点"""
     return {
         "status": "healthy",
-        "message_monitoring": message_handler is not None
+        "message_monitoring": message_handler is not None,
+        "identity_cache": identity_cache.get_stats(),
+        "db_pools": get_pool_stats(),
+        "maintenance": partition_manager.last_run,
+        "gap_fill": message_handler.discord_client.last_gap_fill if message_handler else None,
+        "gateway_compression": (
+            message_handler.discord_client.gateway_inflater.get_stats()
+            if message_handler and message_handler.discord_client.gateway_inflater else None
+        ),
+        "discord_rest": discord_rest.get_stats(),
+        "gateway_session": gateway_session.get_stats(),
+        "gateway_recorder": gateway_recorder.get_stats(),
+        "dispatch_queue": (
+            message_handler.discord_client.dispatch_queue.get_stats()
+            if message_handler and message_handler.discord_client.dispatch_queue else None
+        )
     }
 
+@app.get("/health/db-pools")
+async def db_pool_stats():
+    """各子系统数据库连接池的占用情况和取连接等待时间"""
+    return get_pool_stats()
+
+@app.get("/health/ingest-latency")
+async def ingest_latency(recent: bool = False):
+    """
+    消息接收链路各阶段耗时的 p50/p95/p99（毫秒）：
+    Discord timestamp → 网关收到 → 入库 → 前端推送 → AI入队 → AI开始 → OpenAI返回 → AI结果推送
+
+    recent=true 时附带最近结束的链路明细（各节点相对起点的毫秒数）
+    """
+    return ingest_tracer.get_stats(recent=recent)
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     
     try:
-        # Register with Discord client
+        # Register with the shared Discord client (same registry the gateway broadcasts to)
+        discord_client = get_discord_client()
         discord_client.register_websocket(websocket)
         
         # Register with logging system and add log sending method
@@ -148,7 +206,11 @@ async def websocket_endpoint(websocket: WebSocket):
                     if isinstance(message, str):
                         try:
                             # 尝试解析消息是否为 JSON
-                            data = json.loads(message)
+                            data = json_codec.loads(message)
+                            if isinstance(data, dict) and data.get("type") == "log" and LOG_MESSAGE_FIELDS <= data.keys():
+                                # 日志处理器已经编码好的完整日志消息，直接发送，不再重新编码
+                                await websocket.send_text(message)
+                                return True
                             if isinstance(data, dict):
                                 log_data = {
                                     "type": "log",
@@ -159,7 +221,7 @@ async def websocket_endpoint(websocket: WebSocket):
                                 }
                             else:
                                 raise ValueError("Message is not a dict")
-                        except json.JSONDecodeError:
+                        except ValueError:
                             # 如果不是 JSON，按普通字符串处理
                             parts = message.split(' - ', 2)
                             if len(parts) >= 3:
@@ -219,7 +281,7 @@ async def websocket_endpoint(websocket: WebSocket):
                     log_data.setdefault("timestamp", time.time())
                     
                     # 确保中文正确编码
-                    json_str = json.dumps(log_data, ensure_ascii=False)
+                    json_str = json_codec.dumps(log_data)
                     await websocket.send_text(json_str)
                 return True
             except ConnectionClosedOK:
@@ -234,7 +296,7 @@ async def websocket_endpoint(websocket: WebSocket):
         websocket._send_log_message = send_log_message
         
         # Send a welcome message
-        await websocket.send_text(json.dumps({
+        await websocket.send_text(json_codec.dumps({
             "type": "connection", 
             "status": "connected",
             "message": "WebSocket connection established",
@@ -257,7 +319,7 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"WebSocket error: {str(e)}", exc_info=True)
     finally:
         # Always ensure cleanup in all cases
-        discord_client.unregister_websocket(websocket)
+        get_discord_client().unregister_websocket(websocket)
         unregister_websocket(websocket)
 
 @app.websocket("/ws/ai")
@@ -2,6 +2,6 @@
 Database models package
 """
 
-from .base import Message, KOL, Platform, Channel, Attachment, UnreadMessage
+from .base import Message, KOL, Platform, Channel, Attachment, UnreadMessage, MessageSymbol
 
-__all__ = ['Message', 'KOL', 'Platform', 'Channel', 'Attachment', 'UnreadMessage'] 
\ No newline at end of file
+__all__ = ['Message', 'KOL', 'Platform', 'Channel', 'Attachment', 'UnreadMessage', 'MessageSymbol']
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Enum, Boolean, func, LargeBinary
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, JSON, ForeignKey, Enum, Boolean, func, LargeBinary, Computed, Index, DDL, event, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
@@ -36,6 +37,10 @@ class Channel(Base):
     is_forwarding = Column(Boolean, default=False)  # 是否转发到AI模块
     kol_category = Column(Enum(KOLCategory), nullable=True)
     kol_name = Column(String, nullable=True)
+    # 已入库的最新消息 snowflake（高水位），增量同步从这里用 after= 向后拉取
+    last_message_snowflake = Column(BigInteger, nullable=True)
+    # 论坛频道的帖子抓取游标（已抓取帖子的最新活动 snowflake），增量抓取只获取之后有变化的帖子
+    thread_cursor_snowflake = Column(BigInteger, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -59,7 +64,7 @@ class Attachment(Base):
     __tablename__ = "attachments"
     
     id = Column(Integer, primary_key=True)
-    message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"))
+    message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), index=True)
     filename = Column(String)
     content_type = Column(String)
     file_data = Column(LargeBinary)
@@ -73,26 +78,59 @@ class Message(Base):
     id = Column(Integer, primary_key=True)
     platform_message_id = Column(String, unique=True, nullable=False)
     channel_id = Column(Integer, ForeignKey("channels.id"), nullable=False)
-    kol_id = Column(Integer, ForeignKey("kols.id"))
+    kol_id = Column(Integer, ForeignKey("kols.id"), index=True)
     content = Column(String)
     embeds = Column(JSON)
     referenced_message_id = Column(String)
     referenced_content = Column(String)
-    created_at = Column(DateTime(timezone=True))  # Discord 消息的创建时间，使用 UTC
+    created_at = Column(DateTime(timezone=True), index=True)  # Discord 消息的创建时间，使用 UTC
+    # 全文检索向量，由数据库根据 content 自动生成（'simple' 配置不做词干化，适合代币符号和混合语言）
+    content_tsv = Column(TSVECTOR, Computed("to_tsvector('simple', coalesce(content, ''))", persisted=True))
     
     channel = relationship("Channel", back_populates="messages")
     kol = relationship("KOL", back_populates="messages")
     attachments = relationship("Attachment", back_populates="message", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # 频道消息分页、上下文构建、最新消息（DISTINCT ON）都按频道过滤并按时间倒序
+        Index("ix_messages_channel_id_created_at", "channel_id", text("created_at DESC")),
+        Index("ix_messages_content_tsv", "content_tsv", postgresql_using="gin"),
+        # pg_trgm 索引：中文和代币符号等子串匹配（ILIKE '%词%'）
+        Index("ix_messages_content_trgm", "content", postgresql_using="gin", postgresql_ops={"content": "gin_trgm_ops"}),
+    )
+
+# 新建 messages 表之前确保 pg_trgm 扩展存在（create_all 建表时使用）
+event.listen(Message.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 class UnreadMessage(Base):
     __tablename__ = "unread_messages"
     
     id = Column(Integer, primary_key=True)
-    channel_id = Column(Integer, ForeignKey("channels.id"), nullable=False)
+    channel_id = Column(Integer, ForeignKey("channels.id"), nullable=False, unique=True, index=True)  # 每个频道一条记录，供 ON CONFLICT 计数
     last_read_message_id = Column(Integer, ForeignKey("messages.id"), nullable=True)
     unread_count = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     channel = relationship("Channel", backref="unread_messages")
-    last_read_message = relationship("Message") 
\ No newline at end of file
+    last_read_message = relationship("Message")
+
+class MessageSymbol(Base):
+    """代币符号倒排索引：消息原文和AI分析结果中提到的符号"""
+    __tablename__ = "message_symbols"
+    
+    id = Column(BigInteger, primary_key=True)
+    symbol = Column(String(20), nullable=False)
+    message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), nullable=True)
+    # ai_messages 属于 AI 模块的 metadata，外键（ON DELETE CASCADE）由迁移创建
+    ai_message_id = Column(Integer, nullable=True)
+    channel_id = Column(Integer, ForeignKey("channels.id", ondelete="CASCADE"), nullable=True)
+    source = Column(String(10), nullable=False)  # message: 消息原文, ai: AI分析结果
+    created_at = Column(DateTime(timezone=True), nullable=False)  # 消息时间，UTC
+    
+    __table_args__ = (
+        # "最近一小时关于SOL的所有内容" 走 (symbol, created_at) 范围扫描
+        Index("ix_message_symbols_symbol_created_at", "symbol", "created_at"),
+        Index("uq_message_symbols_message", "message_id", "symbol", unique=True, postgresql_where=text("message_id IS NOT NULL")),
+        Index("uq_message_symbols_ai_message", "ai_message_id", "symbol", unique=True, postgresql_where=text("ai_message_id IS NOT NULL")),
+    )
@@ -0,0 +1,367 @@
+from typing import Any, Dict, Iterator, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime, date, timezone, timedelta
+import asyncio
+import gzip
+import json
+import logging
+import os
+
+from ..config.settings import get_settings
+from ..database import run_db
+from .partition_manager import partition_manager
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装 pyarrow 时使用 NDJSON.gz 格式
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+_DATE_DIR_PREFIX = "date="
+
+# 归档的表：查询语句（只包含需要保留的列）、JSON 列、频道过滤列、按ID删除的函数
+# 消息附带频道/作者名称和附件（含 base64 数据），附件表中的行随消息一起删除
+ARCHIVE_TABLES: Dict[str, Dict[str, Any]] = {
+    "messages": {
+        "select": """
+            SELECT m.id, m.platform_message_id, m.channel_id, c.platform_channel_id, c.name AS channel_name,
+                   c.guild_id, c.guild_name, m.kol_id, k.platform_user_id AS author_id, k.name AS author_name,
+                   m.content, m.embeds, m.referenced_message_id, m.referenced_content, m.created_at,
+                   (
+                       SELECT json_agg(json_build_object(
+                           'id', a.id, 'filename', a.filename, 'content_type', a.content_type,
+                           'file_data', encode(a.file_data, 'base64')
+                       ) ORDER BY a.id)
+                       FROM attachments a WHERE a.message_id = m.id
+                   ) AS attachments
+            FROM messages m
+            JOIN channels c ON c.id = m.channel_id
+            LEFT JOIN kols k ON k.id = m.kol_id
+        """,
+        "alias": "m",
+        "json_columns": ("embeds", "attachments"),
+        "channel_column": ("c.platform_channel_id", "platform_channel_id"),
+        "delete": partition_manager.delete_messages_by_ids,
+    },
+    "ai_messages": {
+        "select": """
+            SELECT a.id, a.channel_id, a.channel_name, a.message_content, a.references,
+                   a.is_trading_related, a.priority, a.keywords, a.category, a.sentiment, a.analysis_summary,
+                   a.has_trading_signal, a.trading_signal, a.context_messages,
+                   a.is_processed, a.processing_error, a.created_at, a.processed_at,
+                   (
+                       SELECT json_agg(json_build_object(
+                           'field_name', e.field_name, 'original_value', e.original_value,
+                           'edited_value', e.edited_value, 'edit_reason', e.edit_reason,
+                           'editor_id', e.editor_id, 'editor_name', e.editor_name, 'created_at', e.created_at
+                       ) ORDER BY e.id)
+                       FROM ai_manual_edits e WHERE e.ai_message_id = a.id
+                   ) AS manual_edits
+            FROM ai_messages a
+        """,
+        "alias": "a",
+        "json_columns": ("references", "keywords", "trading_signal", "context_messages", "manual_edits"),
+        "channel_column": ("a.channel_id", "channel_id"),
+        "delete": partition_manager.delete_ai_messages_by_ids,
+    },
+}
+
+def _table_config(table: str) -> Dict[str, Any]:
+    if table not in ARCHIVE_TABLES:
+        raise ValueError(f"不支持归档的表: {table}")
+    return ARCHIVE_TABLES[table]
+
+def _as_utc(value: Any) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+class ColdArchiver:
+    """
+    冷数据归档
+
+    按 id 顺序分批读取早于截止时间的 messages / ai_messages，按消息日期(UTC)写入
+    {archive_dir}/{表名}/date=YYYY-MM-DD/part-{首id}-{末id}.parquet（未安装 pyarrow 时为 .ndjson.gz），
+    文件写入完成后再删除对应的数据库行。读取接口合并数据库中的热数据和归档文件中的冷数据。
+    """
+
+    def __init__(self):
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    # ---- 配置 ----
+
+    @property
+    def root(self) -> str:
+        return os.path.abspath(get_settings().archive_dir)
+
+    @property
+    def file_format(self) -> str:
+        fmt = get_settings().archive_format
+        if fmt == "auto":
+            return "parquet" if pq is not None else "ndjson"
+        if fmt not in ("parquet", "ndjson"):
+            raise ValueError(f"不支持的归档格式: {fmt}")
+        if fmt == "parquet" and pq is None:
+            raise RuntimeError("ARCHIVE_FORMAT=parquet 需要安装 pyarrow")
+        return fmt
+
+    # ---- 数据库 ----
+
+    def fetch_batch(self, db: Session, table: str, cutoff: datetime, after_id: int, batch_size: int) -> List[Dict[str, Any]]:
+        """按 id 顺序读取一批早于 cutoff 的行（keyset 分页）"""
+        config = _table_config(table)
+        alias = config["alias"]
+        rows = db.execute(text(
+            f"{config['select']} WHERE {alias}.created_at < :cutoff AND {alias}.id > :after_id "
+            f"ORDER BY {alias}.id LIMIT :limit"
+        ), {"cutoff": cutoff, "after_id": after_id, "limit": batch_size}).mappings().all()
+        return [dict(row) for row in rows]
+
+    def delete_batch(self, db: Session, table: str, ids: List[int]) -> None:
+        _table_config(table)["delete"](db, ids)
+        db.commit()
+
+    def query_hot(
+        self,
+        db: Session,
+        table: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        channel_id: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """查询数据库中的行（按时间倒序）"""
+        config = _table_config(table)
+        alias = config["alias"]
+        conditions = [f"{alias}.created_at IS NOT NULL"]
+        params: Dict[str, Any] = {"limit": limit}
+        if start is not None:
+            conditions.append(f"{alias}.created_at >= :start")
+            params["start"] = start
+        if end is not None:
+            conditions.append(f"{alias}.created_at < :end")
+            params["end"] = end
+        if channel_id is not None:
+            conditions.append(f"{config['channel_column'][0]} = :channel_id")
+            params["channel_id"] = channel_id
+
+        rows = db.execute(text(
+            f"{config['select']} WHERE {' AND '.join(conditions)} "
+            f"ORDER BY {alias}.created_at DESC, {alias}.id DESC LIMIT :limit"
+        ), params).mappings().all()
+        return [dict(row) for row in rows]
+
+    # ---- 文件 ----
+
+    def _write_batch(self, table: str, rows: List[Dict[str, Any]]) -> List[str]:
+        """按日期拆分一批行并写入文件，返回写入的文件路径"""
+        by_date: Dict[date, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_date.setdefault(_as_utc(row["created_at"]).date(), []).append(row)
+
+        fmt = self.file_format
+        json_columns = _table_config(table)["json_columns"]
+        paths = []
+        for day, day_rows in by_date.items():
+            directory = os.path.join(self.root, table, f"{_DATE_DIR_PREFIX}{day.isoformat()}")
+            os.makedirs(directory, exist_ok=True)
+            name = f"part-{day_rows[0]['id']}-{day_rows[-1]['id']}"
+            path = os.path.join(directory, f"{name}.parquet" if fmt == "parquet" else f"{name}.ndjson.gz")
+            tmp_path = f"{path}.tmp"
+
+            if fmt == "parquet":
+                # JSON 列结构不固定，存为字符串，读取时再解析
+                records = [
+                    {
+                        key: json.dumps(value, ensure_ascii=False, default=_json_default)
+                        if key in json_columns and value is not None else value
+                        for key, value in row.items()
+                    }
+                    for row in day_rows
+                ]
+                pq.write_table(pa.Table.from_pylist(records), tmp_path, compression="zstd")
+            else:
+                with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                    for row in day_rows:
+                        f.write(json.dumps(row, ensure_ascii=False, default=_json_default))
+                        f.write("\n")
+
+            # 先写临时文件再替换，读取方不会看到写了一半的文件
+            os.replace(tmp_path, path)
+            paths.append(path)
+        return paths
+
+    def _read_file(self, table: str, path: str) -> Iterator[Dict[str, Any]]:
+        if path.endswith(".parquet"):
+            if pq is None:
+                raise RuntimeError(f"读取 {path} 需要安装 pyarrow")
+            json_columns = _table_config(table)["json_columns"]
+            for row in pq.read_table(path).to_pylist():
+                for key in json_columns:
+                    if isinstance(row.get(key), str):
+                        row[key] = json.loads(row[key])
+                yield row
+        elif path.endswith(".ndjson.gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def _date_dirs(self, table: str) -> List[date]:
+        table_dir = os.path.join(self.root, table)
+        if not os.path.isdir(table_dir):
+            return []
+        days = []
+        for name in os.listdir(table_dir):
+            if name.startswith(_DATE_DIR_PREFIX):
+                try:
+                    days.append(date.fromisoformat(name[len(_DATE_DIR_PREFIX):]))
+                except ValueError:
+                    continue
+        return sorted(days)
+
+    def query_cold(
+        self,
+        table: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        channel_id: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """查询归档文件中的行（按时间倒序），从最新的日期目录开始读取，凑够 limit 条即停止"""
+        channel_key = _table_config(table)["channel_column"][1]
+        start = _as_utc(start)
+        end = _as_utc(end)
+
+        results: List[Dict[str, Any]] = []
+        for day in reversed(self._date_dirs(table)):
+            if len(results) >= limit:
+                break
+            if start is not None and day < start.date():
+                break
+            if end is not None and day > end.date():
+                continue
+
+            directory = os.path.join(self.root, table, f"{_DATE_DIR_PREFIX}{day.isoformat()}")
+            day_rows = []
+            for name in sorted(os.listdir(directory)):
+                for row in self._read_file(table, os.path.join(directory, name)):
+                    created_at = _as_utc(row["created_at"])
+                    if start is not None and created_at < start:
+                        continue
+                    if end is not None and created_at >= end:
+                        continue
+                    if channel_id is not None and row.get(channel_key) != channel_id:
+                        continue
+                    row["created_at"] = created_at
+                    day_rows.append(row)
+            day_rows.sort(key=lambda r: (r["created_at"], r["id"]), reverse=True)
+            results.extend(day_rows)
+        return results[:limit]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各表归档文件数、大小和日期范围"""
+        stats: Dict[str, Any] = {"root": self.root, "format": self.file_format, "tables": {}}
+        for table in ARCHIVE_TABLES:
+            days = self._date_dirs(table)
+            files = 0
+            size = 0
+            for day in days:
+                directory = os.path.join(self.root, table, f"{_DATE_DIR_PREFIX}{day.isoformat()}")
+                for entry in os.scandir(directory):
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        files += 1
+                        size += entry.stat().st_size
+            stats["tables"][table] = {
+                "files": files,
+                "bytes": size,
+                "first_date": days[0].isoformat() if days else None,
+                "last_date": days[-1].isoformat() if days else None,
+            }
+        stats["last_run"] = self.last_run
+        return stats
+
+    # ---- 归档与合并查询 ----
+
+    async def archive_table(self, db, table: str, older_than_days: int, batch_size: Optional[int] = None) -> Dict[str, int]:
+        """
+        归档并删除早于 older_than_days 天的行
+
+        每批先写文件再删除数据库行；如果在两步之间中断，下次会重新归档这批行，读取时按 id 去重。
+        """
+        batch_size = batch_size or get_settings().archive_batch_size
+        cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+        archived = 0
+        files = 0
+        after_id = 0
+        while True:
+            rows = await run_db(db, self.fetch_batch, table, cutoff, after_id, batch_size)
+            if not rows:
+                break
+            paths = await asyncio.to_thread(self._write_batch, table, rows)
+            await run_db(db, self.delete_batch, table, [row["id"] for row in rows])
+            archived += len(rows)
+            files += len(paths)
+            after_id = rows[-1]["id"]
+            if len(rows) < batch_size:
+                break
+            # 批次之间让出事件循环
+            await asyncio.sleep(0.1)
+
+        if archived:
+            logger.info(f"已归档 {table}: {archived} 行, {files} 个文件")
+        return {"rows": archived, "files": files}
+
+    async def run_once(self, db, older_than_days: Optional[int] = None) -> Dict[str, Any]:
+        """归档所有表"""
+        older_than_days = get_settings().archive_after_days if older_than_days is None else older_than_days
+        if older_than_days <= 0:
+            raise ValueError("归档天数必须大于 0")
+
+        result: Dict[str, Any] = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "older_than_days": older_than_days,
+        }
+        for table in ARCHIVE_TABLES:
+            result[table] = await self.archive_table(db, table, older_than_days)
+        result["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self.last_run = result
+        return result
+
+    async def query_history(
+        self,
+        db,
+        table: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        channel_id: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """合并热数据和冷数据，按时间倒序返回最多 limit 行（同一 id 以数据库为准）"""
+        hot = await run_db(db, self.query_hot, table, start, end, channel_id, limit)
+        cold = await asyncio.to_thread(self.query_cold, table, start, end, channel_id, limit)
+
+        merged: Dict[int, Dict[str, Any]] = {}
+        for row in cold:
+            merged[row["id"]] = {**row, "source": "archive"}
+        for row in hot:
+            merged[row["id"]] = {**row, "created_at": _as_utc(row["created_at"]), "source": "db"}
+
+        rows = sorted(merged.values(), key=lambda r: (r["created_at"], r["id"]), reverse=True)
+        return rows[:limit]
+
+# 全局归档实例
+archiver = ColdArchiver()
@@ -0,0 +1,213 @@
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime
+import io
+import json
+import logging
+
+from ..models.base import Platform
+from .identity_cache import CachedChannel, identity_cache
+from .unread_counter import increment_unread_count
+from .symbol_index import record_bulk_message_symbols
+from .channel_cursor import advance_high_water_mark, to_snowflake
+
+logger = logging.getLogger(__name__)
+
+# 暂存表的列，与 _to_staging_row 的输出顺序一致
+STAGING_COLUMNS = (
+    "platform_message_id",
+    "kol_platform_user_id",
+    "kol_name",
+    "content",
+    "embeds",
+    "referenced_message_id",
+    "referenced_content",
+    "created_at",
+)
+
+def _copy_value(value: Any) -> str:
+    """COPY text 格式的字段编码"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+def _to_staging_row(message_data: dict, channel: CachedChannel) -> Optional[Tuple]:
+    """把 Discord API 返回的消息转换为暂存行；缺少必要字段时返回 None"""
+    platform_message_id = message_data.get("id")
+    timestamp = message_data.get("timestamp")
+    if not platform_message_id or not timestamp:
+        return None
+
+    if channel.type == 11:
+        # 论坛帖子以帖子名称作为KOL，帖子ID作为 platform_user_id（与 store_message 一致）
+        kol_platform_user_id = channel.platform_channel_id
+        kol_name = channel.name
+    else:
+        author = message_data.get("author") or {}
+        if not author.get("id"):
+            return None
+        kol_platform_user_id = str(author["id"])
+        kol_name = f"{author.get('username')}#{author.get('discriminator', '0')}"
+
+    referenced = message_data.get("referenced_message") or {}
+    return (
+        str(platform_message_id),
+        kol_platform_user_id,
+        kol_name,
+        message_data.get("content"),
+        json.dumps(message_data.get("embeds", [])),
+        str(referenced["id"]) if referenced.get("id") else None,
+        referenced.get("content"),
+        datetime.fromisoformat(timestamp.replace("Z", "+00:00")),
+    )
+
+def filter_new_message_ids(db: Session, platform_message_ids: List[str]) -> List[str]:
+    """返回尚未入库的消息ID（一次查询），用于跳过已存在消息的附件下载"""
+    if not platform_message_ids:
+        return []
+    existing = set(db.execute(
+        text("SELECT platform_message_id FROM messages WHERE platform_message_id = ANY(:ids)"),
+        {"ids": list(platform_message_ids)}
+    ).scalars().all())
+    return [pid for pid in platform_message_ids if pid not in existing]
+
+def _resolve_thread_kol(db: Session, channel: CachedChannel) -> Optional[str]:
+    """论坛帖子已有同名KOL时沿用它的 platform_user_id"""
+    kol = identity_cache.get_kol_by_name(channel.name)
+    if kol:
+        return kol.platform_user_id
+    return db.execute(
+        text("SELECT platform_user_id FROM kols WHERE platform = :platform AND name = :name ORDER BY id LIMIT 1"),
+        {"platform": Platform.DISCORD.value, "name": channel.name}
+    ).scalar()
+
+def bulk_import_messages(
+    db: Session,
+    channel: CachedChannel,
+    messages: List[dict],
+    attachments: Optional[Dict[str, List[tuple]]] = None
+) -> int:
+    """
+    批量导入一个频道的历史消息（同步 psycopg2 会话，在一个事务中提交）
+
+    1. 在内存中把消息转换为行，COPY 到事务级临时表
+    2. 一条 INSERT ... ON CONFLICT DO NOTHING 批量写入新KOL
+    3. 一条 INSERT ... SELECT ... ON CONFLICT DO NOTHING 合并消息，RETURNING 得到新消息ID
+    4. 批量写入附件、代币符号索引和未读计数，推进频道高水位
+
+    历史消息不广播到前端，也不转发到AI模块。
+
+    Args:
+        attachments: platform_message_id -> [(attachment_data, file_data)]，由调用方在事务外下载
+
+    Returns:
+        新写入的消息数
+    """
+    attachments = attachments or {}
+    # 同一批次内重复的消息ID只保留一条
+    rows_by_id: Dict[str, Tuple] = {}
+    for message_data in messages:
+        row = _to_staging_row(message_data, channel)
+        if row is not None:
+            rows_by_id.setdefault(row[0], row)
+    rows = list(rows_by_id.values())
+    if not rows:
+        return 0
+
+    if channel.type == 11:
+        existing_platform_user_id = _resolve_thread_kol(db, channel)
+        if existing_platform_user_id:
+            rows = [(row[0], existing_platform_user_id) + row[2:] for row in rows]
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    db.execute(text("""
+        CREATE TEMP TABLE IF NOT EXISTS staging_messages (
+            platform_message_id VARCHAR NOT NULL,
+            kol_platform_user_id VARCHAR NOT NULL,
+            kol_name VARCHAR,
+            content VARCHAR,
+            embeds TEXT,
+            referenced_message_id VARCHAR,
+            referenced_content VARCHAR,
+            created_at TIMESTAMPTZ
+        ) ON COMMIT DELETE ROWS
+    """))
+    # COPY 使用会话当前事务所在的连接
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY staging_messages ({', '.join(STAGING_COLUMNS)}) FROM STDIN",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+    new_kols = db.execute(text("""
+        INSERT INTO kols (platform, platform_user_id, name, is_active)
+        SELECT DISTINCT ON (kol_platform_user_id) :platform, kol_platform_user_id, kol_name, true
+        FROM staging_messages
+        ORDER BY kol_platform_user_id
+        ON CONFLICT (platform_user_id) DO NOTHING
+        RETURNING id
+    """), {"platform": Platform.DISCORD.value}).scalars().all()
+
+    # embeds 与 store_message 一样存为 JSON 字符串（读取方 json.loads）
+    inserted = db.execute(text("""
+        INSERT INTO messages (
+            platform_message_id, channel_id, kol_id, content, embeds,
+            referenced_message_id, referenced_content, created_at
+        )
+        SELECT s.platform_message_id, :channel_id, k.id, s.content, to_json(s.embeds),
+               s.referenced_message_id, s.referenced_content, s.created_at
+        FROM staging_messages s
+        JOIN kols k ON k.platform_user_id = s.kol_platform_user_id
+        ORDER BY s.created_at
+        ON CONFLICT (platform_message_id) DO NOTHING
+        RETURNING id, platform_message_id, content, created_at
+    """), {"channel_id": channel.id}).all()
+
+    if inserted:
+        attachment_rows = [
+            {
+                "message_id": message_id,
+                "filename": attachment_data["filename"],
+                "content_type": attachment_data.get("content_type", "application/octet-stream"),
+                "file_data": file_data,
+            }
+            for message_id, platform_message_id, _, _ in inserted
+            for attachment_data, file_data in attachments.get(platform_message_id, [])
+        ]
+        if attachment_rows:
+            db.execute(text("""
+                INSERT INTO attachments (message_id, filename, content_type, file_data, created_at)
+                VALUES (:message_id, :filename, :content_type, :file_data, now())
+            """), attachment_rows)
+
+        record_bulk_message_symbols(db, channel.id, [
+            (message_id, content, created_at) for message_id, _, content, created_at in inserted
+        ])
+        increment_unread_count(db, channel.id, len(inserted))
+
+    # 已存在的消息同样说明高水位至少到这里
+    advance_high_water_mark(db, channel.id, max(filter(None, (to_snowflake(row[0]) for row in rows)), default=None))
+    db.commit()
+
+    if new_kols:
+        # 新KOL只有ID列表，让身份缓存整体重新加载
+        identity_cache.invalidate()
+    logger.info(f"频道 {channel.name} 批量导入 {len(inserted)}/{len(rows)} 条消息，新增 {len(new_kols)} 个KOL")
+    return len(inserted)
@@ -0,0 +1,60 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from datetime import datetime, timezone
+
+from ..models.base import Channel
+
+# Discord snowflake 的时间起点（2015-01-01T00:00:00Z，毫秒）
+DISCORD_EPOCH_MS = 1420070400000
+
+# 不包含消息的频道类型：分类、论坛（论坛消息在帖子里）
+NON_MESSAGE_CHANNEL_TYPES = (4, 15)
+
+def to_snowflake(platform_message_id) -> Optional[int]:
+    """Discord 消息ID转为整数 snowflake；手动创建的消息等非数字ID返回 None"""
+    value = str(platform_message_id or "")
+    return int(value) if value.isdigit() else None
+
+def snowflake_from_datetime(dt: datetime) -> int:
+    """该时刻对应的最小 snowflake，可作为 after= 的下界"""
+    return max(int(dt.timestamp() * 1000) - DISCORD_EPOCH_MS, 0) << 22
+
+def snowflake_to_datetime(snowflake: int) -> datetime:
+    """snowflake 中的时间戳（UTC）"""
+    return datetime.fromtimestamp(((snowflake >> 22) + DISCORD_EPOCH_MS) / 1000, tz=timezone.utc)
+
+def advance_high_water_mark(db: Session, channel_id: int, snowflake: Optional[int]) -> None:
+    """
+    推进频道的高水位（不提交，随消息一起提交）
+
+    只在新值更大时更新：乱序到达或回填更早的消息时高水位不会倒退，也不会写入频道行。
+    使用 Core UPDATE 并显式保留 updated_at，避免 onupdate 让 updated_at 变成“最后一条消息的时间”，
+    updated_at 仍只表示频道元数据的变更。
+    """
+    if snowflake is None:
+        return
+    channels = Channel.__table__
+    db.execute(
+        update(channels)
+        .where(channels.c.id == channel_id)
+        .where(channels.c.last_message_snowflake.is_(None) | (channels.c.last_message_snowflake < snowflake))
+        .values(last_message_snowflake=snowflake, updated_at=channels.c.updated_at)
+    )
+
+def get_high_water_marks(db: Session) -> Dict[str, int]:
+    """所有有高水位的频道，键为Discord频道ID"""
+    rows = db.execute(
+        select(Channel.platform_channel_id, Channel.last_message_snowflake)
+        .where(Channel.last_message_snowflake.isnot(None))
+    )
+    return {platform_channel_id: snowflake for platform_channel_id, snowflake in rows}
+
+def get_gap_fill_targets(db: Session) -> List[Tuple[str, str]]:
+    """需要补齐断线期间消息的频道：(Discord频道ID, 名称)，只包含监控中的文字频道和帖子"""
+    rows = db.execute(
+        select(Channel.platform_channel_id, Channel.name)
+        .where(Channel.is_active.is_(True))
+        .where(Channel.type.is_(None) | Channel.type.notin_(NON_MESSAGE_CHANNEL_TYPES))
+    )
+    return [tuple(row) for row in rows]
@@ -3,21 +3,41 @@ import asyncio
 import json
 import logging
 import os
-from typing import Callable, Dict, Any, List
+import random
+from typing import Callable, Dict, Any, List, Optional
 import traceback
 from datetime import datetime, timezone, timedelta
 from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
 
 from ..config.author_categories import is_monitored_channel, get_author_category
-from ..database import SessionLocal
-from ..models.base import Message, KOL, Platform, Channel, Attachment, UnreadMessage
+from ..config.settings import get_settings
+from ..database import SessionLocal, AsyncIngestSessionLocal, DBSession, run_db, rollback_db
+from ..models.base import Message, KOL, Platform, Channel, Attachment
 from ..services.message_utils import extract_message_content
+from ..utils import json_codec
+from ..utils.log_sampling import SamplingLogger
 from .file_utils import FileHandler
+from .discord_rest import discord_rest
+from .gateway_compression import ZlibStreamInflater
+from .gateway_session import gateway_session, NON_RESUMABLE_CLOSE_CODES
+from .gateway_recorder import gateway_recorder
+from .ingest_tracer import ingest_tracer
+from .dispatch_queue import DispatchQueue
+from .unread_counter import increment_unread_count
+from .channel_cursor import (
+    advance_high_water_mark, get_gap_fill_targets, get_high_water_marks, snowflake_from_datetime, snowflake_to_datetime, to_snowflake
+)
+from .symbol_index import record_message_symbols
+from .identity_cache import identity_cache
 from ..ai import ai_message_handler
 from ..ai.models import AIMessage
 
 # 创建Message Logs记录器
 message_logger = logging.getLogger("Message Logs")
+# 每条消息都会触发的日志使用采样
+sampled_logger = SamplingLogger(message_logger, get_settings().log_sample_interval_seconds)
 
 class DiscordClient:
     def __init__(self):
@@ -26,14 +46,28 @@ class DiscordClient:
             raise ValueError("Discord token not found in environment variables")
         
         self.message_callback = None
+        self.dispatch_queue: Optional[DispatchQueue] = None
         self.session = None
+        self.download_session = None  # 附件下载用，不带 Authorization 头，与 session 共用连接池
+        self._connector: Optional[aiohttp.TCPConnector] = None
         self.ws = None
         self._heartbeat_interval = None
         self._last_sequence = None
         self._running = False
-        self.file_handler = FileHandler()
+        self.file_handler = FileHandler(session_provider=self.get_download_session)
         self.connected_websockets = set()
         
+        # 断线补齐：最后收到分发事件的时间、本次断线的起点、补齐任务
+        self._last_event_at: Optional[datetime] = None
+        self._outage_started_at: Optional[datetime] = None
+        # 断线时各频道的高水位快照：重连后实时消息会继续推进高水位，补齐必须从断线时的位置开始
+        self._outage_high_water_marks: Optional[Dict[str, int]] = None
+        self._gap_fill_task: Optional[asyncio.Task] = None
+        self.last_gap_fill: Optional[Dict[str, Any]] = None
+        
+        # 当前网关连接的 zlib-stream 解压器（未启用压缩时为 None）
+        self.gateway_inflater: Optional[ZlibStreamInflater] = None
+        
         # 从环境变量读取代理配置
         self.http_proxy = os.getenv("HTTP_PROXY")
         self.https_proxy = os.getenv("HTTPS_PROXY")
@@ -55,6 +89,32 @@ class DiscordClient:
             return self.https_proxy
         return self.http_proxy
         
+    def _get_connector(self) -> aiohttp.TCPConnector:
+        """
+        进程内共享的连接池：REST、网关和附件下载复用同一组 keep-alive 连接，
+        避免重复的 TCP/TLS 握手；DNS 解析结果缓存 discord_http_dns_ttl 秒
+        """
+        if self._connector is None or self._connector.closed:
+            settings = get_settings()
+            self._connector = aiohttp.TCPConnector(
+                limit=settings.discord_http_pool_size,
+                limit_per_host=settings.discord_http_pool_per_host,
+                ttl_dns_cache=settings.discord_http_dns_ttl,
+                keepalive_timeout=settings.discord_http_keepalive,
+                enable_cleanup_closed=True
+            )
+        return self._connector
+        
+    async def get_download_session(self) -> aiohttp.ClientSession:
+        """附件/文件下载会话（不发送 token），与 REST 会话共用连接池"""
+        if self.download_session is None or self.download_session.closed:
+            self.download_session = aiohttp.ClientSession(
+                connector=self._get_connector(),
+                connector_owner=False,
+                timeout=aiohttp.ClientTimeout(total=120, connect=20, sock_read=60)
+            )
+        return self.download_session
+        
     async def _create_session(self):
         """创建 HTTP 会话"""
         message_logger.debug("[会话] 开始创建HTTP会话")
@@ -103,7 +163,9 @@ class DiscordClient:
                             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
                             'Content-Type': 'application/json'
                         },
-                        timeout=timeout
+                        timeout=timeout,
+                        connector=self._get_connector(),
+                        connector_owner=False
                     )
                     message_logger.info("[会话] HTTP会话创建成功")
                 except Exception as e:
@@ -144,29 +206,28 @@ class DiscordClient:
                 try:
                     # 发送心跳
                     payload = {'op': 1, 'd': self._last_sequence}
-                    message_logger.debug(f"[WebSocket] 发送心跳 (序列号: {self._last_sequence})")
-                    message_logger.debug(f"[WebSocket] 心跳发送前连接状态: closed={self.ws.closed if self.ws else 'N/A'}")
+                    message_logger.debug("[WebSocket] 发送心跳 (序列号: %s)", self._last_sequence)
+                    message_logger.debug("[WebSocket] 心跳发送前连接状态: closed=%s", self.ws.closed if self.ws else 'N/A')
                     
                     # 设置最后发送心跳的时间
                     self.last_heartbeat_sent = asyncio.get_event_loop().time()
                     
                     # 发送消息
                     await self.ws.send_json(payload)
-                    message_logger.debug(f"[WebSocket] 心跳已发送，当前时间戳: {self.last_heartbeat_sent}")
+                    message_logger.debug("[WebSocket] 心跳已发送，当前时间戳: %s", self.last_heartbeat_sent)
                     
                     # 关键变化：不等待整个心跳周期，只等待一个较短的时间
                     # 然后立即发送一个新的心跳，以保持连接活跃
                     # 计算等待时间 - 使用心跳间隔的一半时间 
                     wait_time = min(self._heartbeat_interval / 1000 / 2, 15)  # 最多等待15秒
-                    message_logger.debug(f"[WebSocket] 将等待 {wait_time} 秒后继续")
+                    message_logger.debug("[WebSocket] 将等待 %s 秒后继续", wait_time)
                     
-                    # 等待指定时间
+                    # 等待指定时间（心跳确认由 ack_watchdog 检查）
                     await asyncio.sleep(wait_time)
                     
-                    # 检查是否收到了心跳确认
-                    current_time = asyncio.get_event_loop().time()
-                    time_since_heartbeat = current_time - self.last_heartbeat_sent
-                    message_logger.debug(f"[WebSocket] 距离上次心跳已过 {time_since_heartbeat:.1f} 秒")
+                    if message_logger.isEnabledFor(logging.DEBUG):
+                        time_since_heartbeat = asyncio.get_event_loop().time() - self.last_heartbeat_sent
+                        message_logger.debug("[WebSocket] 距离上次心跳已过 %.1f 秒", time_since_heartbeat)
                     
                 except asyncio.CancelledError:
                     # 任务被取消，直接退出
@@ -221,7 +282,7 @@ class DiscordClient:
                     'activities': [],
                     'afk': False
                 },
-                'compress': False,
+                'compress': False,  # 负载压缩与 zlib-stream 传输压缩不能同时使用
                 'client_state': {
                     'guild_versions': {},
                     'highest_last_message_id': '0',
@@ -235,10 +296,26 @@ class DiscordClient:
         }
         await self.ws.send_json(payload)
         
+    async def _resume(self):
+        """恢复上一个会话 (op 6)，服务器会重放序列号之后错过的事件"""
+        message_logger.info(f"[WebSocket] 尝试恢复会话，序列号: {gateway_session.sequence}")
+        await self.ws.send_json({
+            'op': 6,
+            'd': {
+                'token': self._token,
+                'session_id': gateway_session.session_id,
+                'seq': gateway_session.sequence
+            }
+        })
+        
     async def start_monitoring(self, callback: Callable):
         """开始监听消息"""
         message_logger.info("开始监听Discord消息")
         self.message_callback = callback
+        # 网关读取循环只把消息放入分发队列，由固定数量的消费者处理，读取不会被数据库延迟阻塞
+        if self.dispatch_queue is None:
+            self.dispatch_queue = DispatchQueue(callback)
+            await self.dispatch_queue.start()
         self._running = True
         retry_count = 0
         max_retries = 20
@@ -248,6 +325,9 @@ class DiscordClient:
         self.last_heartbeat_sent = 0
         self.last_heartbeat_ack = 0
         
+        # 配置了 Redis 时读取上一个进程的网关会话，启动后直接恢复
+        await gateway_session.load()
+        
         # 主循环
         while self._running:
             # 用于每次连接尝试的心跳任务
@@ -272,8 +352,15 @@ class DiscordClient:
                     sock_read=60  # 减少超时时间到1分钟
                 )
                 
-                # 设置WebSocket URL和代理
-                ws_url = 'wss://gateway.discord.gg/?v=9&encoding=json'
+                # 设置WebSocket URL和代理：恢复会话时连接 READY 返回的 resume_gateway_url
+                resuming = gateway_session.resumable
+                gateway_url = gateway_session.resume_gateway_url if resuming and gateway_session.resume_gateway_url else get_settings().discord_gateway_url
+                ws_url = f"{gateway_url.rstrip('/')}/?v=9&encoding=json"
+                # zlib-stream 的压缩上下文属于单个连接，每次连接新建解压器
+                self.gateway_inflater = None
+                if get_settings().discord_gateway_compression:
+                    ws_url += '&compress=zlib-stream'
+                    self.gateway_inflater = ZlibStreamInflater()
                 ws_proxy = self._get_proxy_for_url(ws_url)
                 if ws_proxy:
                     message_logger.info(f"[WebSocket] 使用代理连接Discord: {ws_proxy}")
@@ -294,34 +381,33 @@ class DiscordClient:
                 )
                 message_logger.info("[WebSocket] 连接成功")
                 
-                # 重置变量
+                # 重置变量（恢复会话时保留序列号，心跳需要带上它）
                 self._heartbeat_interval = None
-                self._last_sequence = None
+                self._last_sequence = gateway_session.sequence if resuming else None
                 connection_start_time = asyncio.get_event_loop().time()
                 
-                # 创建快速保活检查任务
-                async def fast_watchdog():
+                # 僵死连接检测：发出心跳后超过一个心跳间隔仍未收到确认 (op 11) 才关闭连接，
+                # 使用非 1000 的关闭代码，会话保持有效，重连后可以 RESUME
+                async def ack_watchdog():
                     try:
                         while self._running and self.ws and not self.ws.closed:
                             now = asyncio.get_event_loop().time()
-                            # 如果心跳间隔已设置并且上次心跳已发送（表示心跳进程已启动）
-                            if self._heartbeat_interval and self.last_heartbeat_sent > 0:
-                                time_elapsed = now - self.last_heartbeat_sent
-                                # 如果超过心跳间隔的80%没有活动，主动关闭连接以触发重连
-                                if time_elapsed > (self._heartbeat_interval / 1000 * 0.8):
-                                    message_logger.warning(f"[快速监控] 检测到心跳可能超时 ({time_elapsed:.1f}秒无活动)，主动关闭连接")
+                            if self._heartbeat_interval and self.last_heartbeat_sent > self.last_heartbeat_ack:
+                                unacked = now - max(self.last_heartbeat_ack, connection_start_time)
+                                if unacked > self._heartbeat_interval / 1000:
+                                    message_logger.warning(f"[心跳监控] {unacked:.1f} 秒未收到心跳确认，关闭连接并恢复会话")
                                     if self.ws and not self.ws.closed:
-                                        await self.ws.close(code=1000, message=b"Fast reconnect")
+                                        await self.ws.close(code=4000, message=b"Heartbeat ACK timeout")
                                     return
                             # 每2秒检查一次
                             await asyncio.sleep(2)
                     except asyncio.CancelledError:
-                        message_logger.debug("[快速监控] 监控任务被取消")
+                        message_logger.debug("[心跳监控] 监控任务被取消")
                     except Exception as e:
-                        message_logger.error(f"[快速监控] 监控任务错误: {str(e)}")
+                        message_logger.error(f"[心跳监控] 监控任务错误: {str(e)}")
                 
-                # 启动快速监控任务
-                watchdog_task = asyncio.create_task(fast_watchdog())
+                # 启动心跳确认监控任务
+                watchdog_task = asyncio.create_task(ack_watchdog())
                 activity_tasks.append(watchdog_task)
                 
                 # 处理WebSocket消息
@@ -331,16 +417,30 @@ class DiscordClient:
                         # 更新活动时间
                         self.last_activity_time = asyncio.get_event_loop().time()
                         
-                        if msg.type == aiohttp.WSMsgType.TEXT:
-                            data = json.loads(msg.data)
-                            op = data.get('op')
+                        if msg.type == aiohttp.WSMsgType.BINARY and self.gateway_inflater is not None:
+                            raw = self.gateway_inflater.feed(msg.data)
+                            if raw is None:  # 消息被拆成多个帧，等待后续帧
+                                continue
+                        elif msg.type == aiohttp.WSMsgType.TEXT:
+                            raw = msg.data
+                        else:
+                            raw = None
+                        
+                        if raw is not None:
+                            if gateway_recorder.enabled:
+                                gateway_recorder.record(raw)
+                            # 分发事件的负载 d 按需解析（见 json_codec.decode_gateway）
+                            frame = json_codec.decode_gateway(raw)
+                            op = frame.op
                             
-                            # 详细记录所有收到的消息
-                            message_logger.debug(f"[WebSocket] 收到消息: 类型={msg.type}, OP={op}, 完整数据={msg.data[:200]}{'...' if len(msg.data) > 200 else ''}")
+                            # 详细记录所有收到的消息（只在启用 DEBUG 时截取和格式化帧内容）
+                            if message_logger.isEnabledFor(logging.DEBUG):
+                                snippet = raw[:200].decode('utf-8', 'replace') if isinstance(raw, bytes) else raw[:200]
+                                message_logger.debug("[WebSocket] 收到消息: 类型=%s, OP=%s, 完整数据=%s%s", msg.type, op, snippet, '...' if len(raw) > 200 else '')
                             
                             # 收到Hello消息
                             if op == 10:  # Hello
-                                self._heartbeat_interval = data['d']['heartbeat_interval']
+                                self._heartbeat_interval = frame.payload()['heartbeat_interval']
                                 message_logger.info(f"[WebSocket] 收到Hello消息，心跳间隔: {self._heartbeat_interval/1000:.2f}秒")
                                 
                                 # 启动心跳任务
@@ -348,8 +448,11 @@ class DiscordClient:
                                     heartbeat_task.cancel()
                                 heartbeat_task = asyncio.create_task(self._heartbeat())
                                 
-                                # 发送身份验证
-                                await self._identify()
+                                # 有可恢复的会话时 RESUME，否则发送身份验证
+                                if resuming:
+                                    await self._resume()
+                                else:
+                                    await self._identify()
                             
                             # 心跳确认
                             elif op == 11:  # Heartbeat ACK
@@ -359,20 +462,40 @@ class DiscordClient:
                             
                             # 数据分发
                             elif op == 0:  # Dispatch
-                                self._last_sequence = data.get('s')
-                                event_type = data.get('t')
+                                self._last_sequence = frame.s
+                                gateway_session.update_sequence(self._last_sequence)
+                                self._last_event_at = datetime.now(timezone.utc)
+                                event_type = frame.t
                                 
                                 if event_type == 'MESSAGE_CREATE':
-                                    if self.message_callback:
-                                        asyncio.create_task(self.message_callback(data['d']))
+                                    if self.dispatch_queue:
+                                        message = frame.payload()
+                                        ingest_tracer.start(message)
+                                        self.dispatch_queue.submit(message)
                                 elif event_type == 'READY':
-                                    message_logger.info(f"[WebSocket] Discord连接就绪，用户: {data['d'].get('user', {}).get('username', 'Unknown')}")
+                                    ready = frame.payload()
+                                    message_logger.info(f"[WebSocket] Discord连接就绪，用户: {ready.get('user', {}).get('username', 'Unknown')}")
+                                    gateway_session.start(ready.get('session_id'), ready.get('resume_gateway_url'))
+                                    # 新会话不会重放断线期间的事件，通过 REST 补齐
+                                    self._start_gap_fill()
+                                elif event_type == 'RESUMED':
+                                    gateway_session.stats["resumes"] += 1
+                                    message_logger.info(f"[WebSocket] 会话已恢复，错过的事件已重放 (序列号: {self._last_sequence})")
+                                    # 断线期间的事件已由服务器重放，不需要补齐
+                                    self._outage_started_at = None
+                                    self._outage_high_water_marks = None
                             
                             # 无效会话
                             elif op == 9:  # Invalid Session
-                                resumable = data.get('d', False)
+                                resumable = bool(frame.payload())
                                 message_logger.warning(f"[WebSocket] 会话无效，{'可恢复' if resumable else '不可恢复'}，将重新连接")
-                                self._last_sequence = None if not resumable else self._last_sequence
+                                if not resumable:
+                                    if resuming:
+                                        gateway_session.stats["resume_failures"] += 1
+                                    gateway_session.clear()
+                                    self._last_sequence = None
+                                    # Discord 要求等待 1-5 秒再重新 IDENTIFY
+                                    await asyncio.sleep(random.uniform(1, 5))
                                 break
                             
                             # 服务器要求重连
@@ -386,6 +509,8 @@ class DiscordClient:
                             # 详细记录关闭信息
                             if msg.type == aiohttp.WSMsgType.CLOSE:
                                 message_logger.warning(f"[WebSocket] 连接关闭: 代码={msg.data}, 原因={msg.extra}")
+                                if msg.data in NON_RESUMABLE_CLOSE_CODES:
+                                    gateway_session.clear()
                             elif msg.type == aiohttp.WSMsgType.ERROR:
                                 message_logger.error(f"[WebSocket] 连接错误: {msg.data}")
                                 if hasattr(msg, 'extra') and msg.extra:
@@ -419,6 +544,12 @@ class DiscordClient:
                 message_logger.error(f"[WebSocket] 未预期错误: {str(e)}")
                 message_logger.error(traceback.format_exc())
             
+            # 记录断线起点：取最后收到事件的时间（连接可能在被发现之前就已经断开），
+            # 连续多次重连失败时保留最早的起点
+            if self._running and self._outage_started_at is None:
+                self._outage_started_at = self._last_event_at or datetime.now(timezone.utc)
+                self._outage_high_water_marks = await self._snapshot_high_water_marks()
+            
             # 清理资源
             try:
                 # 取消任务
@@ -437,9 +568,10 @@ class DiscordClient:
                     except asyncio.CancelledError:
                         pass
                 
-                # 关闭WebSocket
+                # 关闭WebSocket（非 1000 代码，保持会话可恢复）并立即保存序列号
                 if self.ws and not self.ws.closed:
-                    await self.ws.close()
+                    await self.ws.close(code=4000)
+                await gateway_session.save()
             except Exception as e:
                 message_logger.error(f"[WebSocket] 清理资源错误: {str(e)}")
             
@@ -453,13 +585,107 @@ class DiscordClient:
         
         message_logger.info("消息监听服务已停止")
 
+    def _start_gap_fill(self):
+        """重新连接就绪后在后台补齐断线期间的消息（不阻塞网关读取）"""
+        outage_started_at = self._outage_started_at
+        high_water_marks = self._outage_high_water_marks
+        self._outage_started_at = None
+        self._outage_high_water_marks = None
+        if outage_started_at is None or self.dispatch_queue is None or not get_settings().gap_fill_enabled:
+            return
+        if self._gap_fill_task and not self._gap_fill_task.done():
+            # 上一次补齐尚未结束：它的下界更早，已经覆盖本次断线
+            message_logger.info("[补齐] 上一次补齐仍在进行，跳过")
+            return
+        self._gap_fill_task = asyncio.create_task(self.fill_gap(outage_started_at, high_water_marks))
+
+    async def _snapshot_high_water_marks(self) -> Optional[Dict[str, int]]:
+        """断线时读取各频道的高水位；读取失败时返回 None，补齐只使用断线起点"""
+        try:
+            async with AsyncIngestSessionLocal() as db:
+                return await run_db(db, get_high_water_marks)
+        except Exception as e:
+            message_logger.warning(f"[补齐] 读取频道高水位失败，将从断线起点补齐: {str(e)}")
+            return None
+
+    async def fill_gap(self, outage_started_at: datetime, high_water_marks: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """
+        补齐断线期间的消息
+
+        对每个监控中的频道，从 max(断线时的频道高水位, 断线起点 - 余量) 之后用 after= 拉取消息。
+        高水位使用断线时的快照：重连后实时消息已经在推进高水位，此时读取会跳过断线期间的消息。
+        消息按时间顺序提交到分发队列，与实时消息在同一个频道分片中依次处理
+        （store_message 会跳过已存在的消息）。
+        """
+        settings = get_settings()
+        since = outage_started_at - timedelta(seconds=settings.gap_fill_margin_seconds)
+        floor = snowflake_from_datetime(since)
+        started = datetime.now(timezone.utc)
+        result: Dict[str, Any] = {
+            "outage_started_at": outage_started_at.isoformat(),
+            "since": since.isoformat(),
+            "channels": 0,
+            "processed": 0,  # 提交到分发队列的消息数（已存在的消息由 store_message 跳过）
+            "dropped": 0,  # 分发队列已满被丢弃的消息数（drop_* 溢出策略）
+        }
+
+        try:
+            async with AsyncIngestSessionLocal() as db:
+                targets = await run_db(db, get_gap_fill_targets)
+            message_logger.info(f"[补齐] 断线起点 {outage_started_at.isoformat()}，检查 {len(targets)} 个频道")
+
+            semaphore = asyncio.Semaphore(settings.gap_fill_concurrency)
+
+            async def fill_channel(platform_channel_id: str, name: str):
+                async with semaphore:
+                    after = max((high_water_marks or {}).get(platform_channel_id) or 0, floor)
+                    messages = await self.get_channel_messages(
+                        platform_channel_id,
+                        limit=settings.gap_fill_max_messages,
+                        after=str(after)
+                    )
+                if not messages:
+                    return
+                if len(messages) >= settings.gap_fill_max_messages:
+                    message_logger.warning(f"[补齐] 频道 {name} 达到补齐上限 {settings.gap_fill_max_messages} 条，可能仍有遗漏")
+                result["channels"] += 1
+                for message_data in sorted(messages, key=lambda m: int(m['id'])):
+                    if self.dispatch_queue.submit(message_data):
+                        result["processed"] += 1
+                    else:
+                        result["dropped"] += 1
+
+            await asyncio.gather(*(fill_channel(*target) for target in targets))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            message_logger.error(f"[补齐] 补齐失败: {str(e)}")
+            result["error"] = str(e)
+
+        result["duration_seconds"] = round((datetime.now(timezone.utc) - started).total_seconds(), 1)
+        self.last_gap_fill = result
+        message_logger.info(f"[补齐] 完成: {result['processed']} 条消息来自 {result['channels']} 个频道，用时 {result['duration_seconds']} 秒")
+        return result
+
     async def close(self):
         """关闭客户端连接"""
         self._running = False
+        if self._gap_fill_task and not self._gap_fill_task.done():
+            self._gap_fill_task.cancel()
         if self.ws:
-            await self.ws.close()
+            # 非 1000 代码关闭，配置了 Redis 时重启后可以恢复会话
+            await self.ws.close(code=4000)
+        await gateway_session.save()
+        if self.dispatch_queue:
+            await self.dispatch_queue.stop()
+            self.dispatch_queue = None
+        gateway_recorder.close()
         if self.session:
             await self.session.close()
+        if self.download_session:
+            await self.download_session.close()
+        if self._connector:
+            await self._connector.close()
         message_logger.info("Discord客户端已关闭")
 
     async def verify_token(self):
@@ -478,7 +704,7 @@ class DiscordClient:
                 timeout = aiohttp.ClientTimeout(total=10)  # 设置10秒超时
                 message_logger.debug(f"[请求] 设置请求超时时间: 10秒")
                 
-                async with self.session.get(verification_url, timeout=timeout, proxy=self._get_proxy_for_url(verification_url)) as response:
+                async with discord_rest.request(self.session, 'GET', verification_url, timeout=timeout, proxy=self._get_proxy_for_url(verification_url)) as response:
                     status_code = response.status
                     message_logger.debug(f"[响应] 验证token状态码: {status_code}")
                     
@@ -550,7 +776,7 @@ class DiscordClient:
         """获取频道信息"""
         try:
             await self._create_session()
-            async with self.session.get(f'https://discord.com/api/v9/channels/{channel_id}', proxy=self._get_proxy_for_url(f'https://discord.com/api/v9/channels/{channel_id}')) as response:
+            async with discord_rest.request(self.session, 'GET', f'https://discord.com/api/v9/channels/{channel_id}', proxy=self._get_proxy_for_url(f'https://discord.com/api/v9/channels/{channel_id}')) as response:
                 if response.status == 200:
                     data = await response.json()
                     message_logger.info(f"获取到频道信息: {data.get('name', '未知频道')}")
@@ -562,158 +788,128 @@ class DiscordClient:
             message_logger.error("获取频道信息出错")
             return {}
 
-    async def get_forum_threads(self, channel_id: str) -> List[Dict[str, Any]]:
-        """获取论坛频道的所有帖子"""
+    async def get_forum_threads(self, channel_id: str, since_snowflake: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        获取论坛频道的帖子（活跃帖子 + 已归档公开帖子），按帖子ID去重
+
+        Args:
+            since_snowflake: 上次抓取记录的游标（最新活动的 snowflake）。传入时只返回之后有新消息或新归档的帖子：
+                搜索结果按最后消息时间倒序，已归档列表按归档时间倒序，遇到早于游标的帖子即停止翻页
+
+        Returns:
+            帖子列表；每个帖子的 last_activity 为其最新活动的 snowflake，用于推进游标。
+            请求失败时只返回已获取的帖子，且 last_activity 均为 0，避免游标越过未获取的帖子
+        """
+        threads: Dict[str, Dict[str, Any]] = {}
+        complete = True
+        since_time = snowflake_to_datetime(since_snowflake) if since_snowflake else None
+        
+        def thread_activity(thread: Dict[str, Any]) -> int:
+            return max(to_snowflake(thread.get('last_message_id')) or 0, to_snowflake(thread.get('id')) or 0)
+        
+        def add_thread(thread: Dict[str, Any], archived: bool):
+            metadata = thread.get('thread_metadata') or {}
+            thread_id = str(thread.get('id'))
+            activity = thread_activity(thread)
+            previous = threads.get(thread_id)
+            threads[thread_id] = {
+                'id': thread_id,
+                'name': thread.get('name'),
+                'archived': archived or metadata.get('archived', False) or bool(previous and previous['archived']),
+                'created_at': metadata.get('create_timestamp'),
+                'owner_id': thread.get('owner_id'),
+                'parent_id': channel_id,
+                'last_activity': max(activity, previous['last_activity'] if previous else 0),
+            }
+        
         try:
-            message_logger.info(f"[开始] 获取论坛频道 {channel_id} 的帖子")
             await self._create_session()
-            message_logger.debug(f"[会话] 已创建会话准备获取论坛帖子")
-            all_threads = set()  # 使用集合避免重复
             
-            # 1. 通过搜索API获取活跃帖子
-            start_msg = "尝试获取所有帖子..."
-            print(start_msg)
-            message_logger.info(start_msg)
+            # 1. 通过搜索API获取活跃帖子（按最后消息时间倒序）
+            url = f'https://discord.com/api/v9/channels/{channel_id}/threads/search'
             offset = 0
-            has_more = True
-            
-            while has_more:
-                url = f'https://discord.com/api/v9/channels/{channel_id}/threads/search'
+            while True:
                 params = {
                     'limit': 25,  # Discord 限制最大为 25
                     'offset': offset,
                     'sort_by': 'last_message_time',
                     'sort_order': 'desc'
                 }
+                async with discord_rest.request(self.session, 'GET', url, params=params, proxy=self._get_proxy_for_url(url)) as response:
+                    if response.status != 200:
+                        message_logger.error(f"获取活跃帖子失败: 状态码={response.status}\n错误响应: {await response.text()}")
+                        complete = False
+                        break
+                    data = await response.json()
                 
-                message_logger.debug(f"[请求] 获取论坛帖子: URL={url}, 参数={params}")
-                try:
-                    async with self.session.get(url, params=params, proxy=self._get_proxy_for_url(url)) as response:
-                        status_code = response.status
-                        message_logger.debug(f"[响应] 获取论坛帖子状态码: {status_code}")
-                        
-                        if status_code == 200:
-                            threads_data = await response.json()
-                            message_logger.debug(f"[数据] 获取到帖子数据结构: {list(threads_data.keys())}")
-                            
-                            threads = threads_data.get('threads', [])
-                            total_results = threads_data.get('total_results', 0)
-                            
-                            message_logger.info(f"[结果] 当前批次获取到 {len(threads)} 个帖子, 总计 {total_results} 个结果")
-                            
-                            if not threads:
-                                message_logger.info("[结束] 没有更多帖子，停止获取")
-                                has_more = False
-                                continue
-                            
-                            for thread in threads:
-                                thread_id = thread.get('id', '未知ID')
-                                thread_name = thread.get('name', '未知名称')
-                                message_logger.debug(f"[帖子] 处理帖子: ID={thread_id}, 名称={thread_name}")
-                                
-                                thread_data = {
-                                    'id': thread.get('id'),
-                                    'name': thread.get('name'),
-                                    'archived': thread.get('archived', False),
-                                    'created_at': thread.get('thread_metadata', {}).get('create_timestamp'),
-                                    'owner_id': thread.get('owner_id'),
-                                    'parent_id': channel_id
-                                }
-                                all_threads.add(json.dumps(thread_data))
-                            
-                            # 更新 offset
-                            old_offset = offset
-                            offset += len(threads)
-                            message_logger.debug(f"[分页] 更新offset: {old_offset} -> {offset}")
-                            
-                            # 如果已经获取了所有结果，停止
-                            if offset >= total_results or len(threads) < 25:
-                                message_logger.info(f"[结束] 已获取所有结果或结果不足一页，停止获取: offset={offset}, total={total_results}")
-                                has_more = False
-                        else:
-                            response_text = await response.text()
-                            error_msg = f"获取活跃帖子失败: 状态码={status_code}\n错误响应: {response_text}"
-                            print(error_msg)
-                            message_logger.error(error_msg)
-                            message_logger.debug(f"[错误] 获取活跃帖子失败详情: URL={url}, 参数={params}, 状态码={status_code}, 响应={response_text}")
-                            has_more = False
-                except Exception as e:
-                    message_logger.error(f"[异常] 获取活跃帖子时发生异常: {str(e)}")
-                    message_logger.debug(f"[异常详情] {traceback.format_exc()}")
-                    has_more = False
-            
-            threads_found_msg = f"从搜索中发现 {len(all_threads)} 个帖子"
-            print(threads_found_msg)
-            message_logger.info(threads_found_msg)
+                page = data.get('threads', [])
+                reached_cursor = False
+                for thread in page:
+                    if since_snowflake and thread_activity(thread) <= since_snowflake:
+                        reached_cursor = True
+                        break
+                    add_thread(thread, archived=False)
+                offset += len(page)
+                if reached_cursor or not page or len(page) < 25 or offset >= data.get('total_results', 0):
+                    break
             
-            # 2. 获取已归档帖子
-            archive_msg = "尝试获取已归档帖子..."
-            print(archive_msg)
-            message_logger.info(archive_msg)
+            # 2. 获取已归档帖子（按归档时间倒序，用 before 翻页）
             url = f'https://discord.com/api/v9/channels/{channel_id}/threads/archived/public'
-            params = {'limit': 100}
-            
-            message_logger.debug(f"[请求] 获取已归档帖子: URL={url}, 参数={params}")
-            try:
-                async with self.session.get(url, params=params, proxy=self._get_proxy_for_url(url)) as response:
-                    status_code = response.status
-                    message_logger.debug(f"[响应] 获取已归档帖子状态码: {status_code}")
-                    
-                    if status_code == 200:
-                        archived_data = await response.json()
-                        message_logger.debug(f"[数据] 获取到已归档帖子数据结构: {list(archived_data.keys())}")
-                        
-                        archived_threads = archived_data.get('threads', [])
-                        message_logger.info(f"[结果] 获取到 {len(archived_threads)} 个已归档帖子")
-                        
-                        for thread in archived_threads:
-                            thread_id = thread.get('id', '未知ID')
-                            thread_name = thread.get('name', '未知名称')
-                            message_logger.debug(f"[归档帖子] 处理归档帖子: ID={thread_id}, 名称={thread_name}")
-                            
-                            thread_data = {
-                                'id': thread.get('id'),
-                                'name': thread.get('name'),
-                                'archived': True,
-                                'created_at': thread.get('thread_metadata', {}).get('create_timestamp'),
-                                'owner_id': thread.get('owner_id'),
-                                'parent_id': channel_id
-                            }
-                            all_threads.add(json.dumps(thread_data))
-                        
-                        archived_msg = f"获取到 {len(archived_threads)} 个已归档帖子"
-                        print(archived_msg)
-                        message_logger.info(archived_msg)
-                    else:
-                        response_text = await response.text()
-                        error_msg = f"获取已归档帖子失败: 状态码={status_code}\n错误响应: {response_text}"
-                        print(error_msg)
-                        message_logger.error(error_msg)
-                        message_logger.debug(f"[错误] 获取已归档帖子失败详情: URL={url}, 参数={params}, 状态码={status_code}, 响应={response_text}")
-            except Exception as e:
-                message_logger.error(f"[异常] 获取已归档帖子时发生异常: {str(e)}")
-                message_logger.debug(f"[异常详情] {traceback.format_exc()}")
+            before = None
+            while True:
+                params = {'limit': 100}
+                if before:
+                    params['before'] = before
+                async with discord_rest.request(self.session, 'GET', url, params=params, proxy=self._get_proxy_for_url(url)) as response:
+                    if response.status != 200:
+                        message_logger.error(f"获取已归档帖子失败: 状态码={response.status}\n错误响应: {await response.text()}")
+                        complete = False
+                        break
+                    data = await response.json()
+                
+                page = data.get('threads', [])
+                reached_cursor = False
+                for thread in page:
+                    archived_at = (thread.get('thread_metadata') or {}).get('archive_timestamp')
+                    if since_time and archived_at and datetime.fromisoformat(archived_at.replace('Z', '+00:00')) <= since_time:
+                        reached_cursor = True
+                        break
+                    add_thread(thread, archived=True)
+                if reached_cursor or not page or not data.get('has_more'):
+                    break
+                before = (page[-1].get('thread_metadata') or {}).get('archive_timestamp')
+                if not before:
+                    break
             
-            # 将JSON字符串转回字典
-            result = [json.loads(t) for t in all_threads]
-            message_logger.info(f"[完成] 总共获取到 {len(result)} 个帖子(包括活跃和已归档)")
-            return result
+            if not complete:
+                for thread in threads.values():
+                    thread['last_activity'] = 0
+            message_logger.info(
+                f"论坛 {channel_id} 获取到 {len(threads)} 个帖子"
+                f"{'（增量）' if since_snowflake else ''}，其中已归档 {sum(1 for t in threads.values() if t['archived'])} 个"
+            )
+            return list(threads.values())
             
         except Exception as e:
-            error_msg = f"获取论坛帖子出错: {str(e)}"
-            print(error_msg)
-            message_logger.error(error_msg)
-            message_logger.error(f"[严重错误] 获取论坛帖子完全失败: {traceback.format_exc()}")
-            return []
+            message_logger.error(f"获取论坛帖子出错: {str(e)}")
+            message_logger.debug(f"[异常详情] {traceback.format_exc()}")
+            for thread in threads.values():
+                thread['last_activity'] = 0
+            return list(threads.values())
 
     async def sync_channels_to_db(self, db: Session):
-        """同步频道信息到数据库，检查权限并标记不可访问的频道"""
+        """
+        同步频道信息到数据库，检查权限并标记不可访问的频道
+
+        分两个阶段：
+        1. 并发获取所有服务器的频道列表、频道权限和论坛帖子（请求速率由 discord_rest 控制）
+        2. 与数据库中的频道快照比较，一次事务内批量插入/更新
+        """
         try:
             # 发送开始同步通知到 Telegram
             start_msg = "🚀 开始同步 Discord 频道和帖子..."
             print(start_msg)
             message_logger.info(start_msg, extra={'startup_msg': True})
-            message_logger.debug("[DEBUG] sync_channels_to_db: 开始创建session")
             
             # 1. 创建HTTP会话
             try:
@@ -723,35 +919,22 @@ class DiscordClient:
                 message_logger.error(f"[严重错误] 创建HTTP会话失败: {str(e)}")
                 message_logger.debug(f"[会话错误详情] {traceback.format_exc()}")
                 raise Exception(f"创建HTTP会话失败: {str(e)}")
-                
-            accessible_count = 0
-            inaccessible_count = 0
-            thread_count = 0
             
             # 2. 获取用户所在的所有服务器
-            guild_msg = "正在获取服务器列表..."
-            print(guild_msg)
-            message_logger.info(guild_msg)
-            message_logger.debug("[DEBUG] sync_channels_to_db: 请求 https://discord.com/api/v9/users/@me/guilds")
-            
             guilds_url = 'https://discord.com/api/v9/users/@me/guilds'
             message_logger.debug(f"[请求] 获取服务器列表: URL={guilds_url}")
             
             try:
-                async with self.session.get(guilds_url, proxy=self._get_proxy_for_url(guilds_url)) as response:
+                async with discord_rest.request(self.session, 'GET', guilds_url, proxy=self._get_proxy_for_url(guilds_url)) as response:
                     status_code = response.status
-                    message_logger.debug(f"[响应] 获取服务器列表状态码: {status_code}")
-                    
                     if status_code != 200:
                         response_text = await response.text()
                         error_msg = f"获取服务器列表失败: HTTP {status_code}\n响应: {response_text}"
                         print(error_msg)
                         message_logger.error(error_msg)
-                        message_logger.debug(f"[错误] 获取服务器列表失败详情: URL={guilds_url}, 状态码={status_code}, 响应={response_text}")
                         raise Exception("Failed to fetch guilds")
                     
                     guilds = await response.json()
-                    message_logger.debug(f"[数据] 获取到服务器列表格式: {list(guilds[0].keys()) if guilds else '空列表'}")
                     guild_found_msg = f"发现 {len(guilds)} 个服务器"
                     print(guild_found_msg)
                     message_logger.info(guild_found_msg)
@@ -760,233 +943,32 @@ class DiscordClient:
                 message_logger.debug(f"[服务器列表错误详情] {traceback.format_exc()}")
                 raise Exception(f"获取服务器列表失败: {str(e)}")
             
-            # 3. 处理每个服务器
-            for guild_index, guild in enumerate(guilds):
-                guild_id = guild['id']
-                guild_name = guild['name']
-                guild_process_msg = f"正在处理服务器 ({guild_index+1}/{len(guilds)}): {guild_name} (ID: {guild_id})"
-                print(guild_process_msg)
-                message_logger.info(guild_process_msg)
-                
-                # 4. 获取服务器中的所有频道
-                channels_url = f'https://discord.com/api/v9/guilds/{guild_id}/channels'
-                message_logger.debug(f"[请求] 获取服务器频道: URL={channels_url}")
-                message_logger.debug(f"[DEBUG] sync_channels_to_db: 请求 {channels_url}")
-                
-                channel_list_msg = f"正在获取服务器 {guild_name} 的频道列表..."
-                print(channel_list_msg)
-                message_logger.info(channel_list_msg)
-                
-                try:
-                    async with self.session.get(channels_url, proxy=self._get_proxy_for_url(channels_url)) as channels_response:
-                        status_code = channels_response.status
-                        message_logger.debug(f"[响应] 获取服务器频道状态码: {status_code}")
-                        
-                        if status_code != 200:
-                            response_text = await channels_response.text()
-                            error_msg = f"获取服务器 {guild_name} 的频道列表失败: HTTP {status_code}\n响应: {response_text}"
-                            print(error_msg)
-                            message_logger.error(error_msg)
-                            message_logger.debug(f"[错误] 获取服务器频道失败详情: URL={channels_url}, 状态码={status_code}, 响应={response_text}")
-                            continue
-                        
-                        channels = await channels_response.json()
-                        message_logger.debug(f"[数据] 获取到频道列表格式: {list(channels[0].keys()) if channels else '空列表'}")
-                        channels_found_msg = f"在服务器 {guild_name} 中发现 {len(channels)} 个频道"
-                        print(channels_found_msg)
-                        message_logger.info(channels_found_msg)
-                except Exception as e:
-                    message_logger.error(f"[错误] 获取服务器 {guild_name} 频道列表失败: {str(e)}")
-                    message_logger.debug(f"[频道列表错误详情] {traceback.format_exc()}")
-                    continue
-                
-                # 5. 处理频道分类
-                message_logger.debug(f"[处理] 开始分析频道分类信息")
-                categories = {}
-                category_count = 0
-                
-                try:
-                    for channel in channels:
-                        if channel.get('type') == 4:  # Discord分类
-                            categories[channel['id']] = channel
-                            category_count += 1
-                    
-                    categories_msg = f"发现 {category_count} 个分类"
-                    print(categories_msg)
-                    message_logger.info(categories_msg)
-                    message_logger.debug(f"[分类] 分类ID列表: {list(categories.keys())}")
-                except Exception as e:
-                    message_logger.error(f"[错误] 处理频道分类失败: {str(e)}")
-                    message_logger.debug(f"[分类处理错误详情] {traceback.format_exc()}")
-                
-                # 6. 处理所有频道
-                message_logger.info(f"[处理] 开始处理 {len(channels)} 个频道")
-                for channel_index, channel_data in enumerate(channels):
-                    try:
-                        channel_id = channel_data.get('id')
-                        channel_name = channel_data.get('name', '未知频道')
-                        channel_type = channel_data.get('type', 0)
-                        parent_id = channel_data.get('parent_id')
-                        position = channel_data.get('position', 0)
-                        
-                        process_channel_msg = f"处理频道 ({channel_index+1}/{len(channels)}): {channel_name} (ID: {channel_id}, 类型: {channel_type})"
-                        print(process_channel_msg)
-                        message_logger.info(process_channel_msg)
-                        message_logger.debug(f"[频道详情] 频道数据: ID={channel_id}, 名称={channel_name}, 类型={channel_type}, 父级={parent_id}")
-                        
-                        # 7. 跳过语音频道
-                        if channel_type == 2:
-                            skip_msg = f"跳过语音频道: {channel_name}"
-                            print(skip_msg)
-                            message_logger.info(skip_msg)
-                            continue
-                        
-                        # 8. 检查频道权限
-                        message_logger.debug(f"[权限] 开始检查频道 {channel_name} 的访问权限")
-                        has_access = True if channel_type == 4 else await self._check_channel_access(channel_id)
-                        access_msg = f"频道 {channel_name} 权限检查结果: {'有权限' if has_access else '无权限'}"
-                        print(access_msg)
-                        message_logger.info(access_msg)
-                        
-                        # 9. 获取分类名称
-                        category_name = None
-                        if parent_id and parent_id in categories:
-                            category_name = categories[parent_id].get('name')
-                            message_logger.debug(f"[分类] 频道 {channel_name} 属于分类: {category_name}")
-                        
-                        # 10. 更新或创建频道记录
-                        message_logger.debug(f"[数据库] 查询频道 {channel_id} 是否存在于数据库")
-                        channel = db.query(Channel).filter(
-                            Channel.platform_channel_id == str(channel_id)
-                        ).first()
-                        
-                        if not channel:
-                            message_logger.debug(f"[数据库] 频道 {channel_name} 不存在，创建新记录")
-                            channel = Channel(
-                                platform_channel_id=str(channel_id),
-                                name=channel_name,
-                                guild_id=str(guild_id),
-                                guild_name=guild_name,
-                                type=channel_type,
-                                parent_id=str(parent_id) if parent_id else None,
-                                category_name=category_name,
-                                is_active=has_access,
-                                position=position
-                            )
-                            db.add(channel)
-                        else:
-                            message_logger.debug(f"[数据库] 更新已存在的频道 {channel_name}")
-                            channel.name = channel_name
-                            channel.guild_name = guild_name
-                            channel.type = channel_type
-                            channel.parent_id = str(parent_id) if parent_id else None
-                            channel.category_name = category_name
-                            channel.is_active = has_access
-                            channel.position = position
-                        
-                        try:
-                            db.commit()
-                            message_logger.debug(f"[数据库] 成功提交频道 {channel_name} 的变更")
-                        except Exception as e:
-                            message_logger.error(f"[数据库错误] 提交频道 {channel_name} 变更失败: {str(e)}")
-                            message_logger.debug(f"[数据库错误详情] {traceback.format_exc()}")
-                            db.rollback()
-                            continue
-                        
-                        # 11. 更新计数
-                        if has_access:
-                            accessible_count += 1
-                            
-                            # 12. 如果是论坛频道，同步帖子
-                            if channel_type == 15:  # Discord论坛频道类型
-                                forum_sync_msg = f"正在同步论坛 {channel_name} 的帖子..."
-                                print(forum_sync_msg)
-                                message_logger.info(forum_sync_msg)
-                                
-                                try:
-                                    message_logger.debug(f"[论坛] 开始获取论坛 {channel_name} 的帖子")
-                                    threads = await self.get_forum_threads(channel_id)
-                                    message_logger.info(f"[论坛] 获取到 {len(threads)} 个帖子")
-                                    
-                                    # 13. 处理每个帖子
-                                    for thread_index, thread_data in enumerate(threads):
-                                        try:
-                                            thread_id = thread_data.get('id')
-                                            thread_name = thread_data.get('name', '未知帖子')
-                                            is_archived = thread_data.get('archived', False)
-                                            
-                                            message_logger.debug(f"[帖子] 处理帖子 ({thread_index+1}/{len(threads)}): {thread_name}")
-                                            
-                                            # 14. 创建或更新帖子作为子频道
-                                            thread = db.query(Channel).filter(
-                                                Channel.platform_channel_id == str(thread_id)
-                                            ).first()
-                                            
-                                            if not thread:
-                                                message_logger.debug(f"[数据库] 帖子 {thread_name} 不存在，创建新记录")
-                                                thread = Channel(
-                                                    platform_channel_id=str(thread_id),
-                                                    name=thread_name,
-                                                    guild_id=str(guild_id),
-                                                    guild_name=guild_name,
-                                                    type=11,  # Discord 帖子类型
-                                                    parent_id=str(channel_id),
-                                                    category_name=channel_name,
-                                                    is_active=False if is_archived else True,
-                                                    position=0,
-                                                    owner_id=thread_data.get('owner_id')  # 添加帖子创建者ID
-                                                )
-                                                db.add(thread)
-                                                thread_count += 1
-                                            else:
-                                                message_logger.debug(f"[数据库] 更新已存在的帖子 {thread_name}")
-                                                thread.name = thread_name
-                                                if is_archived:  # 如果是已归档帖子，直接设置为False
-                                                    thread.is_active = False
-                                            
-                                            try:
-                                                db.commit()
-                                                message_logger.debug(f"[数据库] 成功提交帖子 {thread_name} 的变更")
-                                            except Exception as e:
-                                                message_logger.error(f"[数据库错误] 提交帖子 {thread_name} 变更失败: {str(e)}")
-                                                message_logger.debug(f"[数据库错误详情] {traceback.format_exc()}")
-                                                db.rollback()
-                                        except Exception as e:
-                                            message_logger.error(f"[错误] 处理帖子时出错: {str(e)}")
-                                            message_logger.debug(f"[帖子错误详情] {traceback.format_exc()}")
-                                            continue
-                                    
-                                    forum_threads_msg = f"论坛 {channel_name} 同步了 {len(threads)} 个帖子"
-                                    print(forum_threads_msg)
-                                    message_logger.info(forum_threads_msg)
-                                except Exception as e:
-                                    error_msg = f"同步论坛 {channel_name} 帖子失败: {str(e)}"
-                                    print(error_msg)
-                                    message_logger.error(error_msg)
-                                    message_logger.debug(f"[论坛错误详情] {traceback.format_exc()}")
-                        else:
-                            inaccessible_count += 1
-                    except Exception as e:
-                        error_msg = f"处理频道 {channel_name} 时出错: {str(e)}"
-                        print(error_msg)
-                        message_logger.error(error_msg)
-                        message_logger.debug(f"[频道处理错误详情] {traceback.format_exc()}")
-                        continue
+            # 3. 并发获取每个服务器的频道、权限和帖子
+            semaphore = asyncio.Semaphore(get_settings().discord_sync_concurrency)
+            snapshots = await asyncio.gather(*(self._fetch_guild_snapshot(guild, semaphore) for guild in guilds))
             
-            # 15. 发送同步完成通知到 Telegram
+            desired: Dict[str, Dict[str, Any]] = {}
+            synced_guild_ids = set()
+            for guild_id, rows in snapshots:
+                if rows is None:
+                    continue  # 频道列表获取失败的服务器不参与比较，保留数据库中的原有记录
+                synced_guild_ids.add(guild_id)
+                for row in rows:
+                    desired[row['platform_channel_id']] = row
+            
+            # 4. 与数据库快照比较并批量写入
+            result = await run_db(db, self._apply_channel_snapshot, desired, synced_guild_ids)
+            
+            # 5. 发送同步完成通知到 Telegram
             final_msg = f"""🎉 Discord 频道同步完成:
-- {accessible_count} 个可访问频道
-- {inaccessible_count} 个无权限频道
-- {thread_count} 个论坛帖子"""
+- {result['accessible_count']} 个可访问频道
+- {result['inaccessible_count']} 个无权限频道
+- {result['thread_count']} 个新论坛帖子
+- 新增 {result['inserted_count']} / 更新 {result['updated_count']} / 停用 {result['archived_count']}"""
             print(final_msg)
             message_logger.info(final_msg, extra={'startup_msg': True})
-            message_logger.debug(f"[完成] sync_channels_to_db 完成: accessible={accessible_count}, inaccessible={inaccessible_count}, threads={thread_count}")
             
-            return {
-                "accessible_count": accessible_count,
-                "inaccessible_count": inaccessible_count,
-                "thread_count": thread_count
-            }
+            return result
         except Exception as e:
             error_msg = f"同步频道时发生异常: {str(e)}"
             print(error_msg)
@@ -994,6 +976,155 @@ class DiscordClient:
             message_logger.error(f"[严重错误] 同步频道完全失败: {traceback.format_exc()}")
             raise
 
+    async def _fetch_guild_snapshot(self, guild: Dict[str, Any], semaphore: asyncio.Semaphore) -> tuple:
+        """
+        获取一个服务器的频道快照
+
+        Returns:
+            (服务器ID, 频道行列表)；频道列表获取失败时行列表为 None
+        """
+        guild_id = str(guild['id'])
+        guild_name = guild['name']
+        channels_url = f'https://discord.com/api/v9/guilds/{guild_id}/channels'
+        
+        try:
+            async with semaphore:
+                async with discord_rest.request(self.session, 'GET', channels_url, proxy=self._get_proxy_for_url(channels_url)) as response:
+                    if response.status != 200:
+                        response_text = await response.text()
+                        message_logger.error(f"获取服务器 {guild_name} 的频道列表失败: HTTP {response.status}\n响应: {response_text}")
+                        return guild_id, None
+                    channels = await response.json()
+        except Exception as e:
+            message_logger.error(f"[错误] 获取服务器 {guild_name} 频道列表失败: {str(e)}")
+            message_logger.debug(f"[频道列表错误详情] {traceback.format_exc()}")
+            return guild_id, None
+        
+        categories = {channel['id']: channel for channel in channels if channel.get('type') == 4}
+        # 跳过语音频道
+        channels = [channel for channel in channels if channel.get('type', 0) != 2]
+        message_logger.info(f"服务器 {guild_name}: {len(channels)} 个频道, {len(categories)} 个分类")
+        
+        async def check_access(channel_data: Dict[str, Any]) -> bool:
+            if channel_data.get('type') == 4:
+                return True
+            async with semaphore:
+                return await self._check_channel_access(channel_data['id'])
+        
+        access = await asyncio.gather(*(check_access(channel) for channel in channels))
+        
+        rows = []
+        forums = []
+        for channel_data, has_access in zip(channels, access):
+            parent_id = channel_data.get('parent_id')
+            channel_type = channel_data.get('type', 0)
+            rows.append({
+                'platform_channel_id': str(channel_data['id']),
+                'name': channel_data.get('name', '未知频道'),
+                'guild_id': guild_id,
+                'guild_name': guild_name,
+                'type': channel_type,
+                'parent_id': str(parent_id) if parent_id else None,
+                'category_name': categories[parent_id].get('name') if parent_id in categories else None,
+                'is_active': has_access,
+                'position': channel_data.get('position', 0),
+                'owner_id': None,
+            })
+            if has_access and channel_type == 15:  # Discord论坛频道类型
+                forums.append(channel_data)
+        
+        async def fetch_threads(forum: Dict[str, Any]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self.get_forum_threads(forum['id'])
+        
+        forum_threads = await asyncio.gather(*(fetch_threads(forum) for forum in forums))
+        for forum, threads in zip(forums, forum_threads):
+            for thread_data in threads:
+                rows.append({
+                    'platform_channel_id': str(thread_data.get('id')),
+                    'name': thread_data.get('name', '未知帖子'),
+                    'guild_id': guild_id,
+                    'guild_name': guild_name,
+                    'type': 11,  # Discord 帖子类型
+                    'parent_id': str(forum['id']),
+                    'category_name': forum.get('name'),
+                    'is_active': not thread_data.get('archived', False),
+                    'position': 0,
+                    'owner_id': thread_data.get('owner_id'),  # 帖子创建者ID
+                })
+            message_logger.info(f"论坛 {forum.get('name')} 获取到 {len(threads)} 个帖子")
+        
+        return guild_id, rows
+
+    def _apply_channel_snapshot(self, db: Session, desired: Dict[str, Dict[str, Any]], synced_guild_ids: set) -> Dict[str, int]:
+        """
+        把获取到的频道快照写入数据库（同步数据库阶段，一次提交）
+
+        - 新频道/帖子批量插入（ON CONFLICT DO NOTHING，与网关同时创建帖子时不冲突）；
+          频道行和帖子行使用相同的列，才能放进同一条多行 INSERT
+        - 已有频道只在字段变化时更新；已有帖子只更新名称，已归档时停用（与之前一致，不会重新启用）
+        - 已同步的服务器中 Discord 不再返回的频道（不含帖子）标记为停用
+        """
+        existing = {channel.platform_channel_id: channel for channel in db.query(Channel).all()}
+        inserts = []
+        updates = []
+        archived_count = 0
+        
+        for platform_channel_id, row in desired.items():
+            channel = existing.get(platform_channel_id)
+            if channel is None:
+                inserts.append(row)
+                continue
+            
+            if row['type'] == 11:
+                changes = {'name': row['name']}
+                if not row['is_active']:
+                    changes['is_active'] = False
+            else:
+                changes = {key: value for key, value in row.items() if key not in ('platform_channel_id', 'owner_id')}
+            changes = {key: value for key, value in changes.items() if getattr(channel, key) != value}
+            if changes:
+                if changes.get('is_active') is False and channel.is_active:
+                    archived_count += 1
+                updates.append({'id': channel.id, **changes})
+        
+        for platform_channel_id, channel in existing.items():
+            if (
+                platform_channel_id not in desired
+                and channel.guild_id in synced_guild_ids
+                and channel.type != 11
+                and channel.is_active
+            ):
+                updates.append({'id': channel.id, 'is_active': False})
+                archived_count += 1
+        
+        inserted_count = 0
+        for start in range(0, len(inserts), 1000):
+            stmt = insert(Channel).values(inserts[start:start + 1000]).on_conflict_do_nothing(
+                index_elements=[Channel.platform_channel_id]
+            )
+            inserted_count += db.execute(stmt).rowcount
+        if updates:
+            db.execute(update(Channel), updates)
+        db.commit()
+        
+        if inserted_count or updates:
+            # 批量写入后让身份缓存整体重新加载
+            identity_cache.invalidate()
+        
+        channel_rows = [row for row in desired.values() if row['type'] != 11]
+        result = {
+            # 保留原有返回字段
+            "accessible_count": sum(1 for row in channel_rows if row['is_active']),
+            "inaccessible_count": sum(1 for row in channel_rows if not row['is_active']),
+            "thread_count": sum(1 for row in inserts if row['type'] == 11),
+            "inserted_count": inserted_count,
+            "updated_count": len(updates),
+            "archived_count": archived_count,
+        }
+        message_logger.info(f"[数据库] 频道同步写入完成: {result}")
+        return result
+
     async def _check_channel_access(self, channel_id: str) -> bool:
         """检查是否有权限访问频道"""
         try:
@@ -1003,7 +1134,7 @@ class DiscordClient:
             params = {'limit': 1}
             message_logger.debug(f"[请求] 权限检查: URL={url}, 参数={params}")
             
-            async with self.session.get(url, params=params, proxy=self._get_proxy_for_url(url)) as response:
+            async with discord_rest.request(self.session, 'GET', url, params=params, proxy=self._get_proxy_for_url(url)) as response:
                 status_code = response.status
                 message_logger.debug(f"[响应] 权限检查状态码: {status_code}")
                 
@@ -1032,8 +1163,13 @@ class DiscordClient:
             message_logger.debug(f"[权限异常详情] {traceback.format_exc()}")
             return False
 
-    async def store_message(self, message_data: dict, db: Session) -> None:
-        """Store a Discord message in the database"""
+    async def store_message(self, message_data: dict, db: DBSession) -> None:
+        """
+        Store a Discord message in the database
+
+        db 可以是同步 Session 或 AsyncSession。数据库操作集中在同步函数中，
+        通过 run_db 执行；附件下载、WebSocket广播和AI入队在事务之外进行。
+        """
         platform_message_id = str(message_data.get('id'))
         
         try:
@@ -1043,155 +1179,224 @@ class DiscordClient:
                 return
                 
             # 简单的重复消息检查 - 不使用锁定
-            existing_message = db.query(Message).filter(
-                Message.platform_message_id == platform_message_id
-            ).first()
+            if await run_db(db, self._message_exists, platform_message_id):
+                sampled_logger.debug("消息已存在，跳过: %s", platform_message_id)
+                ingest_tracer.finish(platform_message_id)
+                return
+            
+            # 附件在事务之外下载，避免下载期间占用数据库连接和事务
+            attachments = await self.download_attachments(message_data)
             
-            if existing_message:
-                message_logger.debug(f"消息已存在，跳过: {platform_message_id}")
+            result = await run_db(db, self._persist_message, message_data, attachments)
+            if not result:
+                ingest_tracer.finish(platform_message_id)
                 return
+            ingest_tracer.mark(platform_message_id, "db_committed")
             
-            # Get channel
-            channel_id = str(message_data.get('channel_id'))
-            if not channel_id:
-                message_logger.error("Channel ID not found in message data")
+            # Send WebSocket notification with UTC timestamp
+            await self.broadcast_message(result["broadcast"])
+            ingest_tracer.mark(platform_message_id, "ws_broadcast")
+
+            # Forward message to AI module if enabled
+            if result["ai_prepared"]:
+                ingest_tracer.link_ai(platform_message_id, result["ai_prepared"]["ai_message_id"])
+                await ai_message_handler.dispatch_prepared(result["ai_prepared"])
+            else:
+                ingest_tracer.finish(platform_message_id)
+            
+            sampled_logger.info("消息存储成功: %s", platform_message_id)
+            
+        except Exception as e:
+            ingest_tracer.finish(platform_message_id)
+            # 特别处理重复消息错误
+            error_msg = str(e).lower()
+            if any(keyword in error_msg for keyword in [
+                "duplicate key", 
+                "unique constraint", 
+                "already exists",
+                "uniqueviolation"
+            ]):
+                message_logger.debug("消息重复，安全跳过: %s", platform_message_id)
+                await rollback_db(db)
                 return
-                
-            channel = db.query(Channel).filter(
+            else:
+                # 错误由调用方记录（网关消息由分发队列记录）
+                await rollback_db(db)
+                raise
+
+    async def download_attachments(self, message_data: dict) -> List[tuple]:
+        """下载消息的所有附件，返回 [(attachment_data, file_data)]，下载失败的附件跳过"""
+        attachments = []
+        for attachment_data in message_data.get('attachments', []):
+            file_data = await self._download_attachment(attachment_data)
+            if file_data is not None:
+                attachments.append((attachment_data, file_data))
+        return attachments
+
+    def _message_exists(self, db: Session, platform_message_id: str) -> bool:
+        """检查消息是否已存储"""
+        return db.query(Message.id).filter(
+            Message.platform_message_id == platform_message_id
+        ).first() is not None
+
+    def _persist_message(self, db: Session, message_data: dict, attachments: List[tuple]) -> Optional[Dict[str, Any]]:
+        """
+        在一个事务中写入消息、附件和未读计数（同步数据库阶段）
+
+        Returns:
+            包含WebSocket广播数据和AI转发准备结果的字典；频道或作者无效时返回None
+        """
+        platform_message_id = str(message_data.get('id'))
+
+        # Get channel
+        channel_id = str(message_data.get('channel_id'))
+        if not channel_id:
+            message_logger.error("Channel ID not found in message data")
+            return None
+        
+        # 频道和KOL从进程内身份缓存获取，缓存命中时不产生查询
+        identity_cache.ensure_loaded(db)
+        channel = identity_cache.get_channel(channel_id)
+        if not channel:
+            # 缓存未命中时回退到数据库（例如其他进程刚创建的频道）
+            channel_row = db.query(Channel).filter(
                 Channel.platform_channel_id == channel_id
             ).first()
-            
-            if not channel:
+            if not channel_row:
                 message_logger.error(f"Channel not found: {channel_id}")
-                return
+                return None
+            channel = identity_cache.put_channel(channel_row)
 
-            # 如果是帖子类型的频道，使用帖子名称作为KOL名称
-            if channel.type == 11:  # Discord帖子类型
-                # 使用帖子名称作为KOL标识
+        # 如果是帖子类型的频道，使用帖子名称作为KOL名称
+        if channel.type == 11:  # Discord帖子类型
+            # 使用帖子名称作为KOL标识
+            kol = identity_cache.get_kol_by_name(channel.name)
+            if not kol:
                 kol = db.query(KOL).filter(
                     KOL.platform == Platform.DISCORD.value,
                     KOL.name == channel.name  # 使用帖子名称作为KOL名称
                 ).first()
+            
+            if not kol:
+                kol = KOL(
+                    name=channel.name,  # 使用帖子名称
+                    platform=Platform.DISCORD.value,
+                    platform_user_id=channel.platform_channel_id,  # 使用帖子ID作为platform_user_id
+                    is_active=True
+                )
+                db.add(kol)
+                db.flush()  # 使用flush而不是commit，确保在同一事务中
+        else:
+            # 对于非帖子类型的频道，使用原来的作者逻辑
+            author = message_data.get('author', {})
+            if not author:
+                message_logger.error(f"Author data not found in message: {platform_message_id}")
+                return None
                 
-                if not kol:
-                    kol = KOL(
-                        name=channel.name,  # 使用帖子名称
-                        platform=Platform.DISCORD.value,
-                        platform_user_id=channel.platform_channel_id,  # 使用帖子ID作为platform_user_id
-                        is_active=True
-                    )
-                    db.add(kol)
-                    db.flush()  # 使用flush而不是commit，确保在同一事务中
-            else:
-                # 对于非帖子类型的频道，使用原来的作者逻辑
-                author = message_data.get('author', {})
-                if not author:
-                    message_logger.error(f"Author data not found in message: {platform_message_id}")
-                    return
-                    
-                author_id = str(author.get('id'))
-                if not author_id:
-                    message_logger.error(f"Author ID not found in message data: {platform_message_id}")
-                    return
-                    
+            author_id = str(author.get('id'))
+            if not author_id:
+                message_logger.error(f"Author ID not found in message data: {platform_message_id}")
+                return None
+                
+            kol = identity_cache.get_kol(author_id)
+            if not kol:
                 kol = db.query(KOL).filter(
                     KOL.platform == Platform.DISCORD.value,
                     KOL.platform_user_id == author_id
                 ).first()
-                
-                if not kol:
-                    kol = KOL(
-                        name=f"{author.get('username')}#{author.get('discriminator', '0')}",
-                        platform=Platform.DISCORD.value,
-                        platform_user_id=author_id,
-                        is_active=True
-                    )
-                    db.add(kol)
-                    db.flush()  # 使用flush而不是commit，确保在同一事务中
-            
-            # Create message
-            message = Message(
-                platform_message_id=platform_message_id,
-                channel_id=channel.id,
-                kol_id=kol.id,
-                content=message_data.get('content'),
-                embeds=json.dumps(message_data.get('embeds', [])),
-                referenced_message_id=str(message_data.get('referenced_message', {}).get('id')) if message_data.get('referenced_message') else None,
-                referenced_content=message_data.get('referenced_message', {}).get('content') if message_data.get('referenced_message') else None,
-                created_at=datetime.fromisoformat(message_data.get('timestamp').replace('Z', '+00:00'))  # Discord 返回的是 UTC 时间
-            )
-            
-            db.add(message)
-            db.flush()  # 确保message被分配ID
             
-            # Handle attachments
-            for attachment_data in message_data.get('attachments', []):
-                await self._store_attachment(attachment_data, message.id, db)
-            
-            # Increment unread count
-            unread = db.query(UnreadMessage).filter(UnreadMessage.channel_id == channel.id).first()
-            if unread:
-                unread.unread_count += 1
-            else:
-                unread = UnreadMessage(
-                    channel_id=channel.id,
-                    unread_count=1
+            if not kol:
+                kol = KOL(
+                    name=f"{author.get('username')}#{author.get('discriminator', '0')}",
+                    platform=Platform.DISCORD.value,
+                    platform_user_id=author_id,
+                    is_active=True
                 )
-                db.add(unread)
-            
-            # 统一提交所有更改
-            db.commit()
-            
-            # Send WebSocket notification with UTC timestamp
-            await self.broadcast_message({
+                db.add(kol)
+                db.flush()  # 使用flush而不是commit，确保在同一事务中
+        
+        kol_name = kol.name
+        created_at = datetime.fromisoformat(message_data.get('timestamp').replace('Z', '+00:00'))  # Discord 返回的是 UTC 时间
+        
+        # Create message
+        message = Message(
+            platform_message_id=platform_message_id,
+            channel_id=channel.id,
+            kol_id=kol.id,
+            content=message_data.get('content'),
+            embeds=json.dumps(message_data.get('embeds', [])),
+            referenced_message_id=str(message_data.get('referenced_message', {}).get('id')) if message_data.get('referenced_message') else None,
+            referenced_content=message_data.get('referenced_message', {}).get('content') if message_data.get('referenced_message') else None,
+            created_at=created_at
+        )
+        
+        db.add(message)
+        db.flush()  # 确保message被分配ID
+        
+        # Handle attachments
+        for attachment_data, file_data in attachments:
+            db.add(Attachment(
+                message_id=message.id,
+                filename=attachment_data['filename'],
+                content_type=attachment_data.get('content_type', 'application/octet-stream'),
+                file_data=file_data
+            ))
+        
+        # Increment unread count（单条 upsert，并发接收时不会丢失计数）
+        increment_unread_count(db, channel.id)
+        advance_high_water_mark(db, channel.id, to_snowflake(platform_message_id))
+        
+        # 代币符号索引
+        record_message_symbols(db, message.id, channel.id, message_data.get('content'), created_at)
+        
+        # 统一提交所有更改
+        db.commit()
+        # 数据库中查到或新建的KOL在提交成功后才写入缓存
+        if isinstance(kol, KOL):
+            identity_cache.put_kol(kol)
+        
+        # 转发到AI模块：在同一个数据库阶段内创建AI消息记录
+        ai_prepared = None
+        if channel.is_forwarding:
+            db.refresh(message)  # Refresh to get the attachments relationship
+            ai_prepared = ai_message_handler.prepare_message(db, message)
+        
+        return {
+            "broadcast": {
                 'type': 'new_message',
                 'channel_id': channel.platform_channel_id,
                 'channel_name': channel.name,
-                'author_name': kol.name,
-                'content': message.content,
-                'created_at': message.created_at.isoformat()  # 直接使用 UTC 时间的 ISO 格式
-            })
+                'author_name': kol_name,
+                'content': message_data.get('content'),
+                'created_at': created_at.isoformat()  # 直接使用 UTC 时间的 ISO 格式
+            },
+            "ai_prepared": ai_prepared
+        }
 
-            # Forward message to AI module if enabled
-            if channel.is_forwarding:
-                db.refresh(message)  # Refresh to get the attachments relationship
-                # Store message in AI handler and broadcast
-                await ai_message_handler.store_message(db, message)
-            
-            message_logger.info(f"消息存储成功: {platform_message_id}")
-            
-        except Exception as e:
-            # 特别处理重复消息错误
-            error_msg = str(e).lower()
-            if any(keyword in error_msg for keyword in [
-                "duplicate key", 
-                "unique constraint", 
-                "already exists",
-                "uniqueviolation"
-            ]):
-                message_logger.debug(f"消息重复，安全跳过: {platform_message_id}")
-                db.rollback()
-                return
-            else:
-                message_logger.error(f"Error storing message {platform_message_id}: {str(e)}")
-                message_logger.error(traceback.format_exc())
-                db.rollback()
-                raise
+    async def get_channel_messages(self, channel_id: str, limit: int = 100, after: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        获取频道的历史消息，支持分页
 
-    async def get_channel_messages(self, channel_id: str, limit: int = 100) -> List[Dict[str, Any]]:
-        """获取频道的历史消息，支持分页"""
+        默认从最新消息开始用 before= 向前翻页；传入 after 时从该消息之后用 after= 向后翻页，
+        只拉取比它新的消息（增量同步）。
+        """
         all_messages = []
         before_id = None
+        after_id = after
         
         try:
             await self._create_session()
             
             while len(all_messages) < limit:
                 params = {'limit': min(100, limit - len(all_messages))}
-                if before_id:
+                if after_id:
+                    params['after'] = after_id
+                elif before_id:
                     params['before'] = before_id
                 
-                async with self.session.get(
+                async with discord_rest.request(
+                    self.session,
+                    'GET',
                     f'https://discord.com/api/v9/channels/{channel_id}/messages',
                     params=params,
                     proxy=self._get_proxy_for_url(f'https://discord.com/api/v9/channels/{channel_id}/messages')
@@ -1203,13 +1408,18 @@ class DiscordClient:
                             
                         all_messages.extend(messages)
                         
-                        # 获取最后一条消息的ID用于下一次请求
-                        before_id = messages[-1]['id']
+                        if after_id:
+                            # after= 返回紧接在 after 之后的一页（页内仍为倒序），下一页从本页最新的消息继续
+                            after_id = max(messages, key=lambda m: int(m['id']))['id']
+                        else:
+                            # 获取最后一条消息的ID用于下一次请求
+                            before_id = messages[-1]['id']
                         
                         message_logger.info(f"已获取 {len(all_messages)}/{limit} 条历史消息")
                         
-                        # 添加延迟避免触发限制
-                        await asyncio.sleep(1)
+                        # 翻页速度由 discord_rest 按限流响应头控制，不再固定等待
+                        if len(messages) < params['limit']:  # 最后一页
+                            break
                     else:
                         error_data = await response.json()
                         if response.status == 403 or response.status == 401 or error_data.get('code') == 50001:
@@ -1228,7 +1438,7 @@ class DiscordClient:
         """获取服务器的所有频道"""
         try:
             await self._create_session()
-            async with self.session.get(f'https://discord.com/api/v9/guilds/{guild_id}/channels', proxy=self._get_proxy_for_url(f'https://discord.com/api/v9/guilds/{guild_id}/channels')) as response:
+            async with discord_rest.request(self.session, 'GET', f'https://discord.com/api/v9/guilds/{guild_id}/channels', proxy=self._get_proxy_for_url(f'https://discord.com/api/v9/guilds/{guild_id}/channels')) as response:
                 if response.status == 200:
                     channels = await response.json()
                     message_logger.info(f"获取到{len(channels)}个服务器频道")
@@ -1244,7 +1454,7 @@ class DiscordClient:
         """获取服务器信息"""
         try:
             await self._create_session()
-            async with self.session.get(f'https://discord.com/api/v9/guilds/{guild_id}', proxy=self._get_proxy_for_url(f'https://discord.com/api/v9/guilds/{guild_id}')) as response:
+            async with discord_rest.request(self.session, 'GET', f'https://discord.com/api/v9/guilds/{guild_id}', proxy=self._get_proxy_for_url(f'https://discord.com/api/v9/guilds/{guild_id}')) as response:
                 if response.status == 200:
                     data = await response.json()
                     message_logger.info(f"获取到服务器信息: {data.get('name', '未知服务器')}")
@@ -1260,7 +1470,7 @@ class DiscordClient:
         """获取用户信息"""
         try:
             await self._create_session()
-            async with self.session.get(f'https://discord.com/api/v9/users/{user_id}', proxy=self._get_proxy_for_url(f'https://discord.com/api/v9/users/{user_id}')) as response:
+            async with discord_rest.request(self.session, 'GET', f'https://discord.com/api/v9/users/{user_id}', proxy=self._get_proxy_for_url(f'https://discord.com/api/v9/users/{user_id}')) as response:
                 if response.status == 200:
                     data = await response.json()
                     message_logger.info(f"获取到用户信息: {data.get('username', '未知用户')}")
@@ -1272,33 +1482,22 @@ class DiscordClient:
             message_logger.error("获取用户信息出错")
             return {}
 
-    async def _store_attachment(self, attachment_data: Dict[str, Any], message_id: int, db: Session) -> None:
-        """Store a message attachment in the database"""
+    async def _download_attachment(self, attachment_data: Dict[str, Any]) -> Optional[bytes]:
+        """Download a message attachment"""
         try:
-            # Download the attachment
-            async with self.session.get(attachment_data['url'], proxy=self._get_proxy_for_url(attachment_data['url'])) as response:
+            session = await self.get_download_session()
+            async with session.get(attachment_data['url'], proxy=self._get_proxy_for_url(attachment_data['url'])) as response:
                 if response.status != 200:
                     message_logger.error(f"Failed to download attachment: {attachment_data['filename']}")
-                    return
+                    return None
                 
                 file_data = await response.read()
-                
-                # Create new attachment record
-                attachment = Attachment(
-                    message_id=message_id,
-                    filename=attachment_data['filename'],
-                    content_type=attachment_data.get('content_type', 'application/octet-stream'),
-                    file_data=file_data
-                )
-                
-                db.add(attachment)
-                db.commit()
-                
-                message_logger.info(f"Successfully stored attachment: {attachment_data['filename']}")
+                message_logger.info(f"Successfully downloaded attachment: {attachment_data['filename']}")
+                return file_data
                 
         except Exception as e:
-            message_logger.error(f"Error storing attachment: {str(e)}")
-            db.rollback()
+            message_logger.error(f"Error downloading attachment: {str(e)}")
+            return None
 
     def register_websocket(self, websocket):
         """Register a WebSocket connection"""
@@ -1314,7 +1513,7 @@ class DiscordClient:
             return
             
         # Convert message to JSON string
-        message_str = json.dumps(message)
+        message_str = json_codec.dumps(message)
         
         # Send to all connected clients
         for websocket in self.connected_websockets.copy():
@@ -1322,4 +1521,18 @@ class DiscordClient:
                 await websocket.send_text(message_str)
             except Exception as e:
                 message_logger.error(f"Error broadcasting message: {str(e)}")
-                self.connected_websockets.discard(websocket) 
\ No newline at end of file
+                self.connected_websockets.discard(websocket) 
+
+_discord_client: Optional[DiscordClient] = None
+
+def get_discord_client() -> DiscordClient:
+    """
+    进程内共享的 DiscordClient（首次使用时创建）
+
+    网关监听、API 路由和前端 WebSocket 注册都使用这一个实例，共用一个HTTP连接池；
+    也作为 FastAPI 依赖使用：Depends(get_discord_client)
+    """
+    global _discord_client
+    if _discord_client is None:
+        _discord_client = DiscordClient()
+    return _discord_client
@@ -0,0 +1,241 @@
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+import aiohttp
+import asyncio
+import logging
+import re
+
+from ..config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# 限流桶按主要参数区分：同一路由下不同频道/服务器/Webhook 的请求互不影响
+_MAJOR_PARAM_RE = re.compile(r"^/api/v\d+/(channels|guilds|webhooks)/(\d+)")
+_ID_RE = re.compile(r"/\d{5,}")
+
+# 探测请求的响应没有限流头时，按不受桶限制处理：放行这么多次请求后再探测一次
+_NO_LIMIT_REMAINING = 1000
+_NO_LIMIT_RESET_SECONDS = 5.0
+
+def route_key(method: str, url: str) -> str:
+    """
+    请求的路由标识：方法 + 路径模板，主要参数保留原值，其他ID替换为 {id}
+
+    例如 GET /api/v9/channels/123/messages/456 -> "GET /api/v9/channels/123/messages/{id}"
+    """
+    path = urlsplit(url).path
+    match = _MAJOR_PARAM_RE.match(path)
+    if match:
+        prefix = match.group(0)
+        return f"{method} {prefix}{_ID_RE.sub('/{id}', path[len(prefix):])}"
+    return f"{method} {_ID_RE.sub('/{id}', path)}"
+
+def _major_param(url: str) -> str:
+    match = _MAJOR_PARAM_RE.match(urlsplit(url).path)
+    return f"{match.group(1)}/{match.group(2)}" if match else ""
+
+@dataclass
+class RateLimitBucket:
+    """一个限流桶的状态（时间为事件循环时间）"""
+    remaining: Optional[int] = None  # 未知时按 1 处理：只放行一个请求，其余等待它的响应头
+    reset_at: float = 0.0
+    probing: bool = False  # 剩余次数未知时是否已有请求在途
+    probe_done: asyncio.Event = field(default_factory=asyncio.Event)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+class DiscordRestScheduler:
+    """
+    Discord REST 请求调度
+
+    - 按 X-RateLimit-Bucket 跟踪每个路由（按频道/服务器区分）的剩余次数和重置时间，
+      剩余为 0 时同一桶的请求排队等待重置，不同桶互不阻塞；等待在锁外进行，
+      重置后剩余次数未知，先只发一个请求，收到响应头后再放行其余请求
+    - 全局限制：每秒最多 discord_rest_global_rate 个请求；收到全局 429 时所有请求暂停 retry_after 秒
+    - 429 按 retry_after 等待后重试，最多 discord_rest_max_retries 次
+
+    进程内所有 DiscordClient 共用同一个调度器（同一个 token 共享 Discord 的限额）。
+    """
+
+    def __init__(self):
+        self._route_buckets: Dict[str, str] = {}  # 路由 -> Discord 返回的桶哈希
+        self._buckets: Dict[str, RateLimitBucket] = {}
+        self._global_reset_at = 0.0
+        self._global_next_slot = 0.0
+        self._global_lock = asyncio.Lock()
+        self.stats = {
+            "requests": 0,
+            "rate_limited": 0,
+            "global_rate_limited": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def _bucket_key(self, route: str, url: str) -> str:
+        bucket_hash = self._route_buckets.get(route)
+        if bucket_hash is None:
+            return route
+        return f"{bucket_hash}:{_major_param(url)}"
+
+    def _get_bucket(self, key: str) -> RateLimitBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = RateLimitBucket()
+        return bucket
+
+    async def _sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.stats["wait_seconds"] += seconds
+            await asyncio.sleep(seconds)
+
+    async def _acquire_global(self) -> None:
+        """等待全局 429 暂停结束，并按全局速率分配发送时间"""
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / max(get_settings().discord_rest_global_rate, 1)
+        async with self._global_lock:
+            now = loop.time()
+            slot = max(now, self._global_next_slot, self._global_reset_at)
+            self._global_next_slot = slot + interval
+        await self._sleep(slot - now)
+
+    async def _acquire_bucket(self, route: str, url: str) -> Tuple[RateLimitBucket, bool]:
+        """
+        占用桶内的一次请求，返回 (桶, 是否为探测请求)
+
+        锁内只计算需要等待多久，等待在锁外进行，同一桶的其他请求不会排在一个 sleep 后面。
+        剩余次数未知（首次请求或刚重置）时按 1 处理：只放行一个请求，其余等待它的响应头。
+        每次等待后重新查找桶，期间可能已得知路由所属的桶哈希。
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            bucket = self._get_bucket(self._bucket_key(route, url))
+            probe_done = None
+            async with bucket.lock:
+                now = loop.time()
+                if bucket.remaining is not None and bucket.remaining <= 0 and bucket.reset_at <= now:
+                    bucket.remaining = None  # 已重置，剩余次数未知
+                if bucket.remaining is None:
+                    if not bucket.probing:
+                        bucket.probing = True
+                        return bucket, True
+                    probe_done = bucket.probe_done
+                elif bucket.remaining > 0:
+                    bucket.remaining -= 1
+                    return bucket, False
+                else:
+                    wait = bucket.reset_at - now
+            if probe_done is not None:
+                await probe_done.wait()
+            else:
+                await self._sleep(wait)
+
+    def _release_probe(self, bucket: RateLimitBucket) -> None:
+        """探测请求结束（收到响应或失败），唤醒等待响应头的请求"""
+        bucket.probing = False
+        bucket.probe_done.set()
+        bucket.probe_done = asyncio.Event()
+
+    def _update_bucket(self, route: str, url: str, bucket: RateLimitBucket, headers, probing: bool) -> RateLimitBucket:
+        """
+        根据响应头更新桶状态；首次得知路由所属的桶时迁移到按桶哈希的键
+
+        探测请求的响应没有限流头时，该路由不受桶限制（仍受全局限制），
+        放行 _NO_LIMIT_REMAINING 次请求后再探测，避免一直只有一个请求在途。
+        """
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        if bucket_hash and self._route_buckets.get(route) != bucket_hash:
+            self._route_buckets[route] = bucket_hash
+            bucket = self._get_bucket(self._bucket_key(route, url))
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining is not None and reset_after is not None:
+            try:
+                bucket.remaining = int(remaining)
+                bucket.reset_at = asyncio.get_running_loop().time() + float(reset_after)
+            except ValueError:
+                pass
+        elif probing and bucket.remaining is None:
+            bucket.remaining = _NO_LIMIT_REMAINING
+            bucket.reset_at = asyncio.get_running_loop().time() + _NO_LIMIT_RESET_SECONDS
+        return bucket
+
+    async def _retry_after(self, response: aiohttp.ClientResponse) -> tuple:
+        """解析 429 响应：返回 (等待秒数, 是否全局限制)"""
+        try:
+            data = await response.json(content_type=None)
+        except Exception:
+            data = {}
+        retry_after = data.get("retry_after") or response.headers.get("Retry-After") or 1
+        is_global = bool(data.get("global")) or response.headers.get("X-RateLimit-Global") == "true"
+        return float(retry_after), is_global
+
+    async def send(self, session: aiohttp.ClientSession, method: str, url: str, **kwargs: Any) -> aiohttp.ClientResponse:
+        """
+        发送请求，遵守限流并自动重试 429
+
+        返回的响应需要由调用方释放；一般使用 request() 上下文管理器。
+        重试次数用完后返回最后一个 429 响应，由调用方按普通错误处理。
+        """
+        route = route_key(method, url)
+        max_retries = get_settings().discord_rest_max_retries
+        attempt = 0
+        while True:
+            acquired, probing = await self._acquire_bucket(route, url)
+            try:
+                await self._acquire_global()
+
+                self.stats["requests"] += 1
+                response = await session.request(method, url, **kwargs)
+                bucket = self._update_bucket(route, url, acquired, response.headers, probing)
+
+                if response.status != 429 or attempt >= max_retries:
+                    return response
+
+                retry_after, is_global = await self._retry_after(response)
+                response.release()
+                attempt += 1
+                now = asyncio.get_running_loop().time()
+                if is_global:
+                    self.stats["global_rate_limited"] += 1
+                    self._global_reset_at = max(self._global_reset_at, now + retry_after)
+                else:
+                    self.stats["rate_limited"] += 1
+                    bucket.remaining = 0
+                    bucket.reset_at = max(bucket.reset_at, now + retry_after)
+            finally:
+                # 探测请求的响应头已写入桶（或请求失败），放行等待中的请求
+                if probing:
+                    self._release_probe(acquired)
+            logger.warning(
+                f"Discord 限流 {route}: {'全局' if is_global else '路由'}限制，"
+                f"{retry_after:.2f} 秒后重试 ({attempt}/{max_retries})"
+            )
+
+    @asynccontextmanager
+    async def request(self, session: aiohttp.ClientSession, method: str, url: str, **kwargs: Any) -> AsyncIterator[aiohttp.ClientResponse]:
+        """与 session.request 用法相同的上下文管理器"""
+        response = await self.send(session, method, url, **kwargs)
+        try:
+            yield response
+        finally:
+            response.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        loop_time = None
+        try:
+            loop_time = asyncio.get_running_loop().time()
+        except RuntimeError:
+            pass
+        return {
+            **self.stats,
+            "wait_seconds": round(self.stats["wait_seconds"], 2),
+            "buckets": len(self._buckets),
+            "exhausted_buckets": sum(
+                1 for bucket in self._buckets.values()
+                if bucket.remaining == 0 and loop_time is not None and bucket.reset_at > loop_time
+            ),
+        }
+
+# 全局调度器实例
+discord_rest = DiscordRestScheduler()
@@ -0,0 +1,271 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from dataclasses import dataclass, field
+import asyncio
+import glob
+import logging
+import os
+import zlib
+
+from ..config.settings import get_settings
+from ..utils import json_codec
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("spill", "drop_oldest", "drop_newest")
+
+@dataclass
+class _Shard:
+    """一个消费者及其有界队列；同一频道的消息总是进入同一个分片，按到达顺序处理"""
+    index: int
+    queue: asyncio.Queue
+    spill_path: str
+    spilled: int = 0  # 溢出文件中尚未读回的条数
+    spill_offset: int = 0  # 溢出文件的读取位置
+    spill_writer: Optional[Any] = None
+    processed: int = 0
+    worker: Optional[asyncio.Task] = field(default=None, repr=False)
+
+class DispatchQueue:
+    """
+    网关消息分发队列
+
+    网关读取循环只调用 submit()（不等待），消息按频道ID分片到固定数量的消费者，
+    每个分片一个有界队列和一个消费者：同一频道内按到达顺序处理，数据库并发不超过消费者数量。
+
+    分片队列满时按 dispatch_overflow_policy 处理：
+    - spill: 写入分片的溢出文件（ndjson），队列有空位后按顺序读回；分片有未读回的溢出时，
+      新消息也写入溢出文件，保证频道内顺序。停止时队列中剩余的消息同样写入溢出文件，启动时恢复
+    - drop_oldest: 丢弃队列中最早的消息
+    - drop_newest: 丢弃新到达的消息
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[Any]]):
+        settings = get_settings()
+        self.handler = handler
+        self.workers = max(settings.dispatch_workers, 1)
+        self.maxsize = max(settings.dispatch_queue_size, 1)
+        self.policy = settings.dispatch_overflow_policy if settings.dispatch_overflow_policy in OVERFLOW_POLICIES else "spill"
+        self.spill_dir = settings.dispatch_spill_dir
+        self._shards: List[_Shard] = []
+        self.stats = {
+            "submitted": 0,
+            "processed": 0,
+            "errors": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "recovered": 0,
+            "max_depth": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    async def start(self) -> None:
+        if self._shards:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        leftovers = self._claim_leftover_spills()
+        self._shards = [
+            _Shard(
+                index=i,
+                queue=asyncio.Queue(maxsize=self.maxsize),
+                spill_path=os.path.join(self.spill_dir, f"dispatch-{i}.ndjson")
+            )
+            for i in range(self.workers)
+        ]
+        for shard in self._shards:
+            shard.worker = asyncio.create_task(self._consume(shard))
+        for path in leftovers:
+            self._recover(path)
+        logger.info(f"消息分发队列已启动: {self.workers} 个消费者，每个分片最多 {self.maxsize} 条，溢出策略 {self.policy}")
+
+    async def stop(self) -> None:
+        """停止消费者；spill 策略下把尚未处理的消息写入溢出文件，下次启动时恢复"""
+        for shard in self._shards:
+            if shard.worker:
+                shard.worker.cancel()
+        await asyncio.gather(*(shard.worker for shard in self._shards if shard.worker), return_exceptions=True)
+
+        pending = 0
+        for shard in self._shards:
+            while not shard.queue.empty():
+                _, message = shard.queue.get_nowait()
+                if self.policy == "spill":
+                    self._write_spill(shard, message, prepend=True)
+                    pending += 1
+            self._close_spill_writer(shard)
+            if shard.spilled:
+                self._discard_read_part(shard)
+        if pending:
+            logger.warning(f"消息分发队列停止时有 {pending} 条消息未处理，已写入溢出文件")
+        self._shards = []
+
+    def _shard_for(self, message: Dict[str, Any]) -> _Shard:
+        key = str(message.get("channel_id") or "")
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    def submit(self, message: Dict[str, Any]) -> bool:
+        """
+        提交一条消息（不等待）
+
+        Returns:
+            消息是否被接收（进入队列或溢出文件）；被丢弃时返回 False
+        """
+        if not self._shards:
+            raise RuntimeError("分发队列尚未启动")
+        self.stats["submitted"] += 1
+        shard = self._shard_for(message)
+        item = (asyncio.get_running_loop().time(), message)
+
+        if shard.spilled and self.policy == "spill":
+            # 分片仍有未读回的溢出消息，新消息排在它们后面
+            self._write_spill(shard, message)
+            return True
+
+        try:
+            shard.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            if self.policy == "spill":
+                self._write_spill(shard, message)
+                return True
+            self.stats["dropped"] += 1
+            if self.stats["dropped"] == 1 or self.stats["dropped"] % 1000 == 0:
+                logger.warning(f"分发队列分片 {shard.index} 已满，按 {self.policy} 策略累计丢弃 {self.stats['dropped']} 条消息")
+            if self.policy == "drop_newest":
+                return False
+            shard.queue.get_nowait()
+            shard.queue.put_nowait(item)
+            return True
+
+        self.stats["max_depth"] = max(self.stats["max_depth"], shard.queue.qsize())
+        return True
+
+    async def _consume(self, shard: _Shard) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if shard.spilled and shard.queue.qsize() <= self.maxsize // 2:
+                self._refill(shard)
+            enqueued_at, message = await shard.queue.get()
+            wait = loop.time() - enqueued_at
+            self.stats["wait_seconds_total"] += wait
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], wait)
+            try:
+                await self.handler(message)
+            except asyncio.CancelledError:
+                # 停止时正在处理的消息写入溢出文件，下次启动时重新处理（已入库的由 store_message 跳过）
+                if self.policy == "spill":
+                    self._write_spill(shard, message, prepend=True)
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"分发队列处理消息 {message.get('id')} 失败: {str(e)}", exc_info=True)
+            finally:
+                shard.processed += 1
+                self.stats["processed"] += 1
+
+    # ---- 溢出文件 ----
+
+    def _write_spill(self, shard: _Shard, message: Dict[str, Any], prepend: bool = False) -> None:
+        """
+        追加到分片的溢出文件
+
+        prepend 用于停止时写回队列中的消息：它们比文件中已有的溢出消息更早，
+        因此写入单独的 .head 文件，启动恢复时先于主文件读取。
+        """
+        if prepend:
+            with open(shard.spill_path + ".head", "a", encoding="utf-8") as f:
+                f.write(json_codec.dumps(message) + "\n")
+            return
+        if shard.spill_writer is None:
+            shard.spill_writer = open(shard.spill_path, "a", encoding="utf-8")
+        shard.spill_writer.write(json_codec.dumps(message) + "\n")
+        shard.spill_writer.flush()
+        shard.spilled += 1
+        self.stats["spilled"] += 1
+        if shard.spilled == 1 or shard.spilled % 1000 == 0:
+            logger.warning(f"分发队列分片 {shard.index} 已满，{shard.spilled} 条消息写入溢出文件")
+
+    def _refill(self, shard: _Shard) -> None:
+        """按顺序把溢出文件中的消息读回队列，直到队列满或文件读完"""
+        loop_time = asyncio.get_running_loop().time()
+        with open(shard.spill_path, "r", encoding="utf-8") as f:
+            f.seek(shard.spill_offset)
+            while shard.spilled and not shard.queue.full():
+                line = f.readline()
+                if not line:
+                    break
+                shard.queue.put_nowait((loop_time, json_codec.loads(line)))
+                shard.spilled -= 1
+            shard.spill_offset = f.tell()
+        if shard.spilled == 0:
+            self._close_spill_writer(shard)
+            os.remove(shard.spill_path)
+            shard.spill_offset = 0
+
+    def _discard_read_part(self, shard: _Shard) -> None:
+        """溢出文件只保留尚未读回的部分，避免下次启动时重复提交已处理的消息"""
+        if not shard.spill_offset:
+            return
+        with open(shard.spill_path, "r", encoding="utf-8") as f:
+            f.seek(shard.spill_offset)
+            remaining = f.read()
+        with open(shard.spill_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(remaining)
+        os.replace(shard.spill_path + ".tmp", shard.spill_path)
+        shard.spill_offset = 0
+
+    def _close_spill_writer(self, shard: _Shard) -> None:
+        if shard.spill_writer is not None:
+            shard.spill_writer.close()
+            shard.spill_writer = None
+
+    def _claim_leftover_spills(self) -> List[str]:
+        """
+        上次运行留下的溢出文件（未读回部分）改名后在启动时重新提交；
+        .head 文件中是更早的消息，排在前面
+        """
+        claimed = []
+        for pattern in ("dispatch-*.ndjson.head", "dispatch-*.ndjson"):
+            for path in sorted(glob.glob(os.path.join(self.spill_dir, pattern))):
+                target = path + ".recovering"
+                os.replace(path, target)
+                claimed.append(target)
+        claimed.extend(
+            path for path in sorted(glob.glob(os.path.join(self.spill_dir, "*.recovering")))
+            if path not in claimed
+        )
+        return claimed
+
+    def _recover(self, path: str) -> None:
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    message = json_codec.loads(line)
+                except ValueError:
+                    continue
+                self.submit(message)
+                count += 1
+        os.remove(path)
+        self.stats["recovered"] += count
+        if count:
+            logger.info(f"从溢出文件恢复 {count} 条消息: {os.path.basename(path)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        processed = self.stats["processed"]
+        return {
+            **self.stats,
+            "wait_seconds_total": round(self.stats["wait_seconds_total"], 3),
+            "wait_seconds_avg": round(self.stats["wait_seconds_total"] / processed, 4) if processed else None,
+            "wait_seconds_max": round(self.stats["wait_seconds_max"], 3),
+            "workers": self.workers,
+            "policy": self.policy,
+            "depth": sum(shard.queue.qsize() for shard in self._shards),
+            "spill_pending": sum(shard.spilled for shard in self._shards),
+            "shards": [
+                {"depth": shard.queue.qsize(), "spilled": shard.spilled, "processed": shard.processed}
+                for shard in self._shards
+            ],
+        }
@@ -3,13 +3,15 @@ import aiohttp
 import logging
 from datetime import datetime, timezone
 import hashlib
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 import traceback
 
 message_logger = logging.getLogger("Message Logs")
 
 class FileHandler:
-    def __init__(self):
+    def __init__(self, session_provider: Optional[Callable[[], Awaitable[aiohttp.ClientSession]]] = None):
+        # 共享的下载会话（复用连接池）；未提供时每次下载临时创建会话
+        self._session_provider = session_provider
         # 创建存储目录
         self.base_dir = os.path.join(os.getcwd(), 'storage')
         os.makedirs(self.base_dir, exist_ok=True)
@@ -20,20 +22,25 @@ class FileHandler:
         返回本地存储路径（相对于storage目录）
         """
         try:
+            if self._session_provider:
+                return await self._download(await self._session_provider(), url, filename)
             async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        message_logger.error(f"下载文件失败: {url}, 状态码: {response.status}")
-                        return None
-                    
-                    # 读取文件内容
-                    content = await response.read()
-                    return await self.save_file(content, filename or self._generate_filename(url, response.headers.get('Content-Type', '')))
+                return await self._download(session, url, filename)
                     
         except Exception as e:
             message_logger.error(f"保存文件出错: {str(e)}")
             return None
             
+    async def _download(self, session: aiohttp.ClientSession, url: str, filename: Optional[str]) -> Optional[str]:
+        async with session.get(url) as response:
+            if response.status != 200:
+                message_logger.error(f"下载文件失败: {url}, 状态码: {response.status}")
+                return None
+            
+            # 读取文件内容
+            content = await response.read()
+            return await self.save_file(content, filename or self._generate_filename(url, response.headers.get('Content-Type', '')))
+            
     async def save_file(self, content: bytes, filename: str, save_dir: str = None) -> Optional[str]:
         """
         保存文件内容到本地
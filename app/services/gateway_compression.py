@@ -0,0 +1,47 @@
+from typing import Any, Dict, Optional
+import zlib
+
+# zlib-stream 传输压缩：每条完整消息以 Z_SYNC_FLUSH 结尾，最后 4 字节固定为此后缀
+ZLIB_SUFFIX = b"\x00\x00\xff\xff"
+
+class ZlibStreamInflater:
+    """
+    Discord 网关 zlib-stream 传输压缩的解压器
+
+    整个连接共用一个压缩上下文（字典跨消息延续），因此每个连接必须使用一个
+    持久的 decompressobj，重连时新建。一条消息可能拆成多个二进制帧，
+    收到以 ZLIB_SUFFIX 结尾的帧之前先缓存。
+    """
+
+    def __init__(self):
+        self._inflator = zlib.decompressobj()
+        self._buffer = bytearray()
+        self.compressed_bytes = 0
+        self.decompressed_bytes = 0
+        self.messages = 0
+
+    def feed(self, data: bytes) -> Optional[bytes]:
+        """
+        输入一个二进制帧
+
+        Returns:
+            完整消息的 JSON（UTF-8 字节，直接交给 json_codec 解析）；消息尚未结束时返回 None
+        """
+        self._buffer.extend(data)
+        self.compressed_bytes += len(data)
+        if len(self._buffer) < 4 or self._buffer[-4:] != ZLIB_SUFFIX:
+            return None
+
+        payload = self._inflator.decompress(self._buffer)
+        self._buffer.clear()
+        self.decompressed_bytes += len(payload)
+        self.messages += 1
+        return payload
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "compressed_bytes": self.compressed_bytes,
+            "decompressed_bytes": self.decompressed_bytes,
+            "ratio": round(self.decompressed_bytes / self.compressed_bytes, 2) if self.compressed_bytes else None,
+        }
@@ -0,0 +1,98 @@
+from typing import Any, Dict, Optional, Union
+from datetime import datetime
+import gzip
+import logging
+import os
+import time
+
+from ..config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+class GatewayRecorder:
+    """
+    网关帧录制
+
+    把收到的原始网关帧（解压后的 JSON）连同接收时间写入 gzip 压缩的 ndjson 文件，
+    每行 {"ts": <接收时间戳>, "frame": <原始帧>}；帧内容原样拼接，不重新编码。
+    文件超过 gateway_record_max_mb（未压缩大小）后轮转，只保留最近 gateway_record_keep_files 个。
+
+    录制文件可以用 app/tools/gateway_replay.py 离线重放，
+    也可以作为 tests/benchmarks/bench_json_codec.py 的 --payloads 输入。
+    注意录制内容包含完整的消息正文，文件目录不要放在公开挂载的位置。
+    """
+
+    def __init__(self):
+        settings = get_settings()
+        self.enabled = settings.gateway_record_enabled
+        self.record_dir = settings.gateway_record_dir
+        self.max_bytes = int(settings.gateway_record_max_mb * 1024 * 1024)
+        self.keep_files = settings.gateway_record_keep_files
+        self._file: Optional[gzip.GzipFile] = None
+        self._path: Optional[str] = None
+        self._written = 0
+        self.stats = {"frames": 0, "bytes": 0, "files": 0, "errors": 0}
+
+    def _open(self) -> None:
+        os.makedirs(self.record_dir, exist_ok=True)
+        # 文件名按时间排序；同一秒内轮转多次时用序号区分
+        name = f"gateway-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self.stats['files']:03d}.ndjson.gz"
+        self._path = os.path.join(self.record_dir, name)
+        # 压缩级别 1：录制在网关读取循环中同步执行，优先保证速度
+        self._file = gzip.open(self._path, "ab", compresslevel=1)
+        self._written = 0
+        self.stats["files"] += 1
+        logger.info(f"开始录制网关帧: {self._path}")
+        self._prune()
+
+    def _prune(self) -> None:
+        if self.keep_files <= 0:
+            return
+        files = sorted(
+            name for name in os.listdir(self.record_dir)
+            if name.startswith("gateway-") and name.endswith(".ndjson.gz")
+        )
+        for name in files[:-self.keep_files]:
+            try:
+                os.remove(os.path.join(self.record_dir, name))
+            except OSError as e:
+                logger.warning(f"删除旧录制文件 {name} 失败: {str(e)}")
+
+    def record(self, raw: Union[str, bytes]) -> None:
+        """记录一个网关帧（解压后的原始 JSON）"""
+        if not self.enabled:
+            return
+        try:
+            if self._file is None or self._written >= self.max_bytes:
+                self.close()
+                self._open()
+            data = raw.encode("utf-8") if isinstance(raw, str) else raw
+            line = b'{"ts":%.6f,"frame":%s}\n' % (time.time(), data)
+            self._file.write(line)
+            self._written += len(line)
+            self.stats["frames"] += 1
+            self.stats["bytes"] += len(line)
+        except Exception as e:
+            self.stats["errors"] += 1
+            # 录制失败不影响消息接收，停止录制
+            self.enabled = False
+            logger.error(f"录制网关帧失败，已停止录制: {str(e)}")
+            self.close()
+
+    def close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception as e:
+                logger.warning(f"关闭录制文件失败: {str(e)}")
+            self._file = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "current_file": os.path.basename(self._path) if self._file is not None and self._path else None,
+        }
+
+# 全局网关录制实例
+gateway_recorder = GatewayRecorder()
@@ -0,0 +1,123 @@
+from typing import Any, Dict, Optional
+import asyncio
+import json
+import logging
+import time
+
+from ..config.settings import get_settings
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis 为可选依赖：没有时会话状态只保存在内存中
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "discord:gateway:session"
+
+# 这些关闭代码表示会话已失效，只能重新 IDENTIFY
+NON_RESUMABLE_CLOSE_CODES = {4004, 4007, 4009, 4010, 4011, 4012, 4013, 4014}
+
+class GatewaySessionStore:
+    """
+    网关会话状态（session_id、resume_gateway_url、最后序列号），用于断线后 RESUME (op 6)
+
+    配置了 REDIS_URL 时同时写入 Redis（带过期时间），进程重启后也可以恢复会话；
+    序列号按 gateway_session_save_interval 节流写入，断开连接时立即写入。
+    重放的事件中已存在的消息由 store_message 跳过。
+    """
+
+    def __init__(self):
+        self.session_id: Optional[str] = None
+        self.resume_gateway_url: Optional[str] = None
+        self.sequence: Optional[int] = None
+        self._redis = None
+        self._last_saved = 0.0
+        self._save_task: Optional[asyncio.Task] = None
+        self.stats = {"resumes": 0, "resume_failures": 0, "identifies": 0}
+
+    def _get_redis(self):
+        settings = get_settings()
+        if self._redis is None and settings.redis_url and aioredis is not None:
+            self._redis = aioredis.from_url(settings.redis_url, decode_responses=True)
+        return self._redis
+
+    @property
+    def resumable(self) -> bool:
+        return bool(get_settings().gateway_resume_enabled and self.session_id and self.sequence is not None)
+
+    async def load(self) -> None:
+        """启动时从 Redis 读取上一个进程的会话"""
+        client = self._get_redis()
+        if client is None or self.session_id:
+            return
+        try:
+            raw = await client.get(REDIS_KEY)
+        except Exception as e:
+            logger.warning(f"读取网关会话失败: {str(e)}")
+            return
+        if raw:
+            data = json.loads(raw)
+            self.session_id = data.get("session_id")
+            self.resume_gateway_url = data.get("resume_gateway_url")
+            self.sequence = data.get("sequence")
+            logger.info(f"已从 Redis 读取网关会话，序列号 {self.sequence}")
+
+    async def save(self) -> None:
+        client = self._get_redis()
+        if client is None:
+            return
+        self._last_saved = time.monotonic()
+        try:
+            if self.session_id:
+                await client.set(
+                    REDIS_KEY,
+                    json.dumps({
+                        "session_id": self.session_id,
+                        "resume_gateway_url": self.resume_gateway_url,
+                        "sequence": self.sequence,
+                    }),
+                    ex=get_settings().gateway_session_ttl_seconds
+                )
+            else:
+                await client.delete(REDIS_KEY)
+        except Exception as e:
+            logger.warning(f"保存网关会话失败: {str(e)}")
+
+    def _schedule_save(self) -> None:
+        if self._get_redis() is None or (self._save_task and not self._save_task.done()):
+            return
+        self._save_task = asyncio.create_task(self.save())
+
+    def start(self, session_id: str, resume_gateway_url: Optional[str]) -> None:
+        """READY：记录新会话"""
+        self.session_id = session_id
+        self.resume_gateway_url = resume_gateway_url
+        self.stats["identifies"] += 1
+        self._schedule_save()
+
+    def update_sequence(self, sequence: Optional[int]) -> None:
+        if sequence is None:
+            return
+        self.sequence = sequence
+        if time.monotonic() - self._last_saved >= get_settings().gateway_session_save_interval:
+            self._last_saved = time.monotonic()
+            self._schedule_save()
+
+    def clear(self) -> None:
+        """会话失效（op 9 不可恢复或不可恢复的关闭代码），下次连接重新 IDENTIFY"""
+        self.session_id = None
+        self.resume_gateway_url = None
+        self.sequence = None
+        self._schedule_save()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "has_session": self.session_id is not None,
+            "sequence": self.sequence,
+            "persisted": self._get_redis() is not None,
+        }
+
+# 全局网关会话实例
+gateway_session = GatewaySessionStore()
@@ -0,0 +1,180 @@
+from typing import Dict, Optional, Any
+from dataclasses import dataclass
+from sqlalchemy.orm import Session
+import threading
+import logging
+
+from ..models.base import Channel, KOL
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class CachedChannel:
+    """频道快照，只包含消息热路径需要的字段"""
+    id: int
+    platform_channel_id: str
+    name: str
+    guild_id: str
+    guild_name: str
+    type: Optional[int]
+    parent_id: Optional[str]
+    is_active: bool
+    is_forwarding: bool
+    kol_category: Optional[str]
+
+    @classmethod
+    def from_model(cls, channel: Channel) -> "CachedChannel":
+        return cls(
+            id=channel.id,
+            platform_channel_id=channel.platform_channel_id,
+            name=channel.name,
+            guild_id=channel.guild_id,
+            guild_name=channel.guild_name,
+            type=channel.type,
+            parent_id=channel.parent_id,
+            is_active=bool(channel.is_active),
+            is_forwarding=bool(channel.is_forwarding),
+            kol_category=channel.kol_category.value if channel.kol_category else None
+        )
+
+@dataclass(frozen=True)
+class CachedKOL:
+    """KOL快照"""
+    id: int
+    name: str
+    platform_user_id: str
+
+    @classmethod
+    def from_model(cls, kol: KOL) -> "CachedKOL":
+        return cls(id=kol.id, name=kol.name, platform_user_id=kol.platform_user_id)
+
+class IdentityCache:
+    """
+    进程内的频道/KOL身份缓存
+
+    channels 和 kols 表很小且很少变化，消息热路径上按平台ID查找它们的查询由这里的内存映射代替。
+    写入频道/KOL的代码在提交后调用 put_*；无法逐条更新时调用 invalidate()，
+    版本号递增后缓存视为过期，下一次 ensure_loaded() 会整体重新加载。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._channels: Dict[str, CachedChannel] = {}
+        self._channels_by_id: Dict[int, CachedChannel] = {}
+        self._kols: Dict[str, CachedKOL] = {}
+        self._kols_by_name: Dict[str, CachedKOL] = {}
+        self.version = 0
+        self._loaded_version: Optional[int] = None
+
+        # 统计信息
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "reloads": 0
+        }
+
+    @property
+    def is_loaded(self) -> bool:
+        """缓存是否已加载且未失效"""
+        return self._loaded_version == self.version
+
+    def load(self, db: Session) -> None:
+        """从数据库全量加载频道和KOL"""
+        channels = db.query(Channel).all()
+        kols = db.query(KOL).order_by(KOL.id).all()
+
+        with self._lock:
+            self._channels.clear()
+            self._channels_by_id.clear()
+            self._kols.clear()
+            self._kols_by_name.clear()
+
+            for channel in channels:
+                self._store_channel(CachedChannel.from_model(channel))
+            for kol in kols:
+                self._store_kol(CachedKOL.from_model(kol))
+
+            self._loaded_version = self.version
+            self.stats["reloads"] += 1
+
+        logger.info(f"身份缓存已加载: {len(self._channels)} 个频道, {len(self._kols)} 个KOL (版本 {self.version})")
+
+    def ensure_loaded(self, db: Session) -> None:
+        """缓存失效或尚未加载时重新加载"""
+        if not self.is_loaded:
+            self.load(db)
+
+    def invalidate(self) -> None:
+        """使缓存失效，下一次 ensure_loaded 时重新加载"""
+        with self._lock:
+            self.version += 1
+        logger.debug(f"身份缓存已失效，当前版本 {self.version}")
+
+    def get_channel(self, platform_channel_id: str) -> Optional[CachedChannel]:
+        """按Discord频道ID获取频道"""
+        channel = self._channels.get(platform_channel_id)
+        self.stats["hits" if channel else "misses"] += 1
+        return channel
+
+    def get_channel_by_id(self, channel_id: int) -> Optional[CachedChannel]:
+        """按数据库ID获取频道"""
+        return self._channels_by_id.get(channel_id)
+
+    def put_channel(self, channel: Channel) -> CachedChannel:
+        """写入或更新频道（在数据库提交之后调用）"""
+        cached = CachedChannel.from_model(channel)
+        with self._lock:
+            self._store_channel(cached)
+            self._bump_version()
+        return cached
+
+    def get_kol(self, platform_user_id: str) -> Optional[CachedKOL]:
+        """按平台用户ID获取KOL"""
+        kol = self._kols.get(platform_user_id)
+        self.stats["hits" if kol else "misses"] += 1
+        return kol
+
+    def get_kol_by_name(self, name: str) -> Optional[CachedKOL]:
+        """按名称获取KOL（论坛帖子以帖子名称作为KOL）"""
+        kol = self._kols_by_name.get(name)
+        self.stats["hits" if kol else "misses"] += 1
+        return kol
+
+    def put_kol(self, kol: KOL) -> CachedKOL:
+        """写入或更新KOL（在数据库提交之后调用）"""
+        cached = CachedKOL.from_model(kol)
+        with self._lock:
+            self._store_kol(cached)
+            self._bump_version()
+        return cached
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        return {
+            **self.stats,
+            "version": self.version,
+            "is_loaded": self.is_loaded,
+            "channel_count": len(self._channels),
+            "kol_count": len(self._kols)
+        }
+
+    def _store_channel(self, cached: CachedChannel) -> None:
+        self._channels[cached.platform_channel_id] = cached
+        self._channels_by_id[cached.id] = cached
+
+    def _store_kol(self, cached: CachedKOL) -> None:
+        self._kols[cached.platform_user_id] = cached
+        # 同名KOL保留最早创建的一条，与原先 query(...).first() 的行为一致
+        existing = self._kols_by_name.get(cached.name)
+        if existing is None or existing.id >= cached.id:
+            self._kols_by_name[cached.name] = cached
+
+    def _bump_version(self) -> None:
+        """逐条更新后递增版本号，已加载的缓存保持有效"""
+        was_loaded = self.is_loaded
+        self.version += 1
+        if was_loaded:
+            self._loaded_version = self.version
+
+# 全局身份缓存实例
+identity_cache = IdentityCache()
@@ -0,0 +1,198 @@
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from collections import deque
+from datetime import datetime
+import logging
+import math
+import time
+
+from ..config.settings import get_settings
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # opentelemetry 为可选依赖：没有时只在进程内统计
+    otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+# 链路上的节点，按先后顺序；每个阶段的耗时 = 该节点时间 - 上一个节点时间
+STAGES = (
+    "discord",           # 消息的 Discord timestamp
+    "received",          # 网关收到帧
+    "db_committed",      # 消息写入数据库并提交（含分发队列等待和附件下载）
+    "ws_broadcast",      # 推送到前端WebSocket
+    "ai_enqueued",       # 加入AI处理队列
+    "ai_started",        # AI工作器开始处理
+    "openai_response",   # OpenAI 返回分析结果
+    "result_broadcast",  # AI处理结果推送到前端 (broadcast_processing_result)
+)
+
+# 汇总指标：从 Discord timestamp 到某个节点的总耗时
+TOTALS = {"ws_broadcast": "ingest_total", "result_broadcast": "end_to_end"}
+
+class _Trace:
+    __slots__ = ("message_id", "channel_id", "ai_message_id", "marks")
+
+    def __init__(self, message_id: str, channel_id: Optional[str], marks: List[Tuple[str, float]]):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.ai_message_id: Optional[int] = None
+        self.marks = marks
+
+def _percentile(values: List[float], pct: float) -> float:
+    """最近秩法分位数（values 已排序）"""
+    index = max(math.ceil(pct / 100 * len(values)) - 1, 0)
+    return values[index]
+
+class IngestTracer:
+    """
+    消息接收链路耗时追踪
+
+    网关实时收到的每条消息从 Discord timestamp 开始，依次记录 STAGES 中各节点的时间（time.time()），
+    每到一个节点就把这一段的耗时加入该阶段的滑动窗口（最近 ingest_trace_window 个样本），
+    按需计算 p50/p95/p99。补齐、帖子抓取等历史消息不经过网关，不会被追踪。
+
+    未进入AI处理的消息在推送前端后结束；进入AI的消息在AI处理结束后结束。
+    进行中的链路最多保留 ingest_trace_max_active 条，超出时丢弃最早的。
+    开启 ingest_trace_otel 且安装了 opentelemetry 时，结束的链路导出为一个根 span 加每个阶段一个子 span，
+    由应用配置的 OpenTelemetry SDK/导出器发送。
+
+    注意 received 阶段（Discord 到网关）包含本机与 Discord 的时钟偏差。
+    """
+
+    def __init__(self):
+        settings = get_settings()
+        self.enabled = settings.ingest_trace_enabled
+        self.window = max(settings.ingest_trace_window, 1)
+        self.max_active = max(settings.ingest_trace_max_active, 1)
+        self._otel = otel_trace.get_tracer(__name__) if otel_trace is not None and settings.ingest_trace_otel else None
+        self._active: Dict[str, _Trace] = {}
+        self._by_ai_id: Dict[int, str] = {}
+        self._samples: Dict[str, Deque[float]] = {}
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self.stats = {"started": 0, "finished": 0, "evicted": 0}
+
+    def start(self, message_data: Dict[str, Any]) -> None:
+        """网关收到 MESSAGE_CREATE 时开始一条链路"""
+        if not self.enabled:
+            return
+        now = time.time()
+        message_id = str(message_data.get("id"))
+        marks = []
+        timestamp = message_data.get("timestamp")
+        if timestamp:
+            try:
+                marks.append(("discord", datetime.fromisoformat(timestamp).timestamp()))
+            except ValueError:
+                pass
+        marks.append(("received", now))
+        if len(marks) == 2:
+            self._record("received", now - marks[0][1])
+
+        if len(self._active) >= self.max_active:
+            oldest = next(iter(self._active))
+            self._drop(oldest)
+            self.stats["evicted"] += 1
+        self._active[message_id] = _Trace(message_id, message_data.get("channel_id"), marks)
+        self.stats["started"] += 1
+
+    def mark(self, message_id: str, stage: str) -> None:
+        """记录一个节点；没有进行中的链路（例如补齐的历史消息）时忽略"""
+        trace = self._active.get(message_id)
+        if trace is None:
+            return
+        now = time.time()
+        self._record(stage, now - trace.marks[-1][1])
+        if stage in TOTALS and trace.marks[0][0] == "discord":
+            self._record(TOTALS[stage], now - trace.marks[0][1])
+        trace.marks.append((stage, now))
+
+    def link_ai(self, message_id: str, ai_message_id: int) -> None:
+        """消息进入AI处理：之后的节点按 AI 消息ID记录"""
+        trace = self._active.get(message_id)
+        if trace is not None:
+            trace.ai_message_id = ai_message_id
+            self._by_ai_id[ai_message_id] = message_id
+
+    def mark_ai(self, ai_message_id: int, stage: str) -> None:
+        message_id = self._by_ai_id.get(ai_message_id)
+        if message_id is not None:
+            self.mark(message_id, stage)
+
+    def finish(self, message_id: str) -> None:
+        trace = self._drop(message_id)
+        if trace is None:
+            return
+        self.stats["finished"] += 1
+        first = trace.marks[0][1]
+        self._recent.append({
+            "message_id": trace.message_id,
+            "ai_message_id": trace.ai_message_id,
+            "stages": {stage: round((at - first) * 1000, 1) for stage, at in trace.marks},
+        })
+        if self._otel is not None:
+            self._export(trace)
+
+    def finish_ai(self, ai_message_id: int) -> None:
+        message_id = self._by_ai_id.get(ai_message_id)
+        if message_id is not None:
+            self.finish(message_id)
+
+    def _drop(self, message_id: str) -> Optional[_Trace]:
+        trace = self._active.pop(message_id, None)
+        if trace is not None and trace.ai_message_id is not None:
+            self._by_ai_id.pop(trace.ai_message_id, None)
+        return trace
+
+    def _record(self, name: str, seconds: float) -> None:
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def _export(self, trace: _Trace) -> None:
+        """导出为 OpenTelemetry span（时间使用记录的节点时间）"""
+        def to_ns(at: float) -> int:
+            return int(at * 1e9)
+
+        try:
+            attributes = {"discord.message_id": trace.message_id}
+            if trace.channel_id:
+                attributes["discord.channel_id"] = str(trace.channel_id)
+            if trace.ai_message_id is not None:
+                attributes["ai.message_id"] = trace.ai_message_id
+            root = self._otel.start_span("discord.ingest", start_time=to_ns(trace.marks[0][1]), attributes=attributes)
+            context = otel_trace.set_span_in_context(root)
+            for (_, started), (stage, ended) in zip(trace.marks, trace.marks[1:]):
+                self._otel.start_span(f"ingest.{stage}", context=context, start_time=to_ns(started)).end(end_time=to_ns(ended))
+            root.end(end_time=to_ns(trace.marks[-1][1]))
+        except Exception as e:
+            logger.warning(f"导出接收链路 span 失败: {str(e)}")
+
+    def get_stats(self, recent: bool = False) -> Dict[str, Any]:
+        """每个阶段和汇总指标的样本数及 p50/p95/p99/max（毫秒）"""
+        stages = {}
+        for name in STAGES[1:] + tuple(TOTALS.values()):
+            samples = self._samples.get(name)
+            if not samples:
+                continue
+            values = sorted(samples)
+            stages[name] = {
+                "count": len(values),
+                "p50_ms": round(_percentile(values, 50) * 1000, 1),
+                "p95_ms": round(_percentile(values, 95) * 1000, 1),
+                "p99_ms": round(_percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+        result = {
+            **self.stats,
+            "enabled": self.enabled,
+            "active": len(self._active),
+            "otel": self._otel is not None,
+            "stages": stages,
+        }
+        if recent:
+            result["recent"] = list(self._recent)
+        return result
+
+# 全局接收链路追踪实例
+ingest_tracer = IngestTracer()
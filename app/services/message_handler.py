@@ -4,22 +4,25 @@ from datetime import datetime
 import logging
 import asyncio
 import json
-import traceback
 
 from ..models.base import Message, KOL, Platform, Channel, UnreadMessage
-from ..database import SessionLocal
-from .discord_client import DiscordClient
+from ..database import AsyncIngestSessionLocal, run_db
+from .discord_client import get_discord_client
 from .message_utils import extract_message_content
+from .identity_cache import identity_cache, CachedChannel
+from ..config.settings import get_settings
+from ..utils.log_sampling import SamplingLogger
 
 # 创建Message Logs记录器
 message_logger = logging.getLogger("Message Logs")
 logger = logging.getLogger(__name__)
+# 每条消息都会触发的日志使用采样
+sampled_logger = SamplingLogger(message_logger, get_settings().log_sample_interval_seconds)
 
 class MessageHandler:
     def __init__(self):
-        self.discord_client = DiscordClient()
+        self.discord_client = get_discord_client()
         self._monitoring_task: Optional[asyncio.Task] = None
-        self._db: Session = SessionLocal()
 
     async def start(self):
         """启动消息监控服务"""
@@ -38,9 +41,6 @@ class MessageHandler:
         if hasattr(self.discord_client, 'close'):
             await self.discord_client.close()
             
-        if not self._db.is_active:
-            self._db.close()
-            
         message_logger.info("消息监听服务已停止")
         
     async def _monitor_messages(self):
@@ -56,84 +56,90 @@ class MessageHandler:
 
     async def handle_discord_message(self, message_data: Dict[str, Any]):
         """处理接收到的Discord消息"""
-        try:
-            # 验证消息数据
-            if not message_data:
-                return
-                
-            # 记录关键信息
-            content = message_data.get('content', '')
-            author = message_data.get('author', {})
-            username = f"{author.get('username')}#{author.get('discriminator')}"
-            channel_id = str(message_data.get('channel_id'))
+        # 验证消息数据
+        if not message_data:
+            return
             
-            # 获取频道信息
-            channel = self._db.query(Channel).filter(
-                Channel.platform_channel_id == channel_id
-            ).first()
-            
-            # 如果是新的论坛帖子，需要先创建或更新帖子记录
-            if message_data.get('thread'):
-                thread_data = message_data['thread']
-                thread_id = str(thread_data.get('id'))
-                thread_name = thread_data.get('name', '未知帖子')
-                parent_id = str(thread_data.get('parent_id'))
-                
-                # 查找父级论坛频道
-                parent_channel = self._db.query(Channel).filter(
-                    Channel.platform_channel_id == parent_id
-                ).first()
-                
-                if parent_channel:
-                    # 创建或更新帖子记录
-                    thread = self._db.query(Channel).filter(
-                        Channel.platform_channel_id == thread_id
-                    ).first()
-                    
-                    if not thread:
-                        thread = Channel(
-                            platform_channel_id=thread_id,
-                            name=thread_name,
-                            guild_id=parent_channel.guild_id,
-                            guild_name=parent_channel.guild_name,
-                            type=11,  # Discord 帖子类型
-                            parent_id=parent_id,
-                            is_active=True,
-                            position=0
-                        )
-                        self._db.add(thread)
-                        self._db.commit()
-                        message_logger.info(f"创建新帖子: {thread_name}")
-                    
-                    # 更新 channel 为新创建的帖子
-                    channel = thread
+        # 记录关键信息
+        content = message_data.get('content', '')
+        author = message_data.get('author', {})
+        username = f"{author.get('username')}#{author.get('discriminator')}"
+        
+        # 每条消息使用独立的异步会话，数据库等待不会阻塞网关读取
+        async with AsyncIngestSessionLocal() as db:
+            channel = await run_db(db, self._resolve_channel, message_data)
             
             # 简化的日志输出
-            message_logger.info(f"{username}发了消息: {content or '[空消息]'}")
+            sampled_logger.info("%s发了消息: %s", username, content or '[空消息]')
             
             # 使用 discord_client 的方法存储消息（已包含所有必要的数据库操作）
-            await self.discord_client.store_message(message_data, self._db)
+            await self.discord_client.store_message(message_data, db)
+        
+        # 返回消息处理结果（如果需要）
+        if channel:
+            return {
+                'type': 'new_message',
+                'channel_id': channel.platform_channel_id,
+                'channel_name': channel.name,
+                'author_name': username,
+                'content': content,
+                'created_at': datetime.now().isoformat()
+            }
+
+    def _resolve_channel(self, db: Session, message_data: Dict[str, Any]) -> Optional[CachedChannel]:
+        """获取消息所属频道，新的论坛帖子会先创建帖子记录（同步数据库阶段）"""
+        channel_id = str(message_data.get('channel_id'))
+        
+        # 获取频道信息（来自进程内身份缓存）
+        identity_cache.ensure_loaded(db)
+        channel = identity_cache.get_channel(channel_id)
+        
+        # 如果是新的论坛帖子，需要先创建或更新帖子记录
+        if message_data.get('thread'):
+            thread_data = message_data['thread']
+            thread_id = str(thread_data.get('id'))
+            thread_name = thread_data.get('name', '未知帖子')
+            parent_id = str(thread_data.get('parent_id'))
             
-            # 返回消息处理结果（如果需要）
-            if channel:
-                return {
-                    'type': 'new_message',
-                    'channel_id': channel.platform_channel_id,
-                    'channel_name': channel.name,
-                    'author_name': username,
-                    'content': content,
-                    'created_at': datetime.now().isoformat()
-                }
+            # 查找父级论坛频道
+            parent_channel = identity_cache.get_channel(parent_id)
             
-        except Exception as e:
-            message_logger.error(f"处理消息出错: {str(e)}")
-            message_logger.error(traceback.format_exc())
-            self._db.rollback()
-            raise
+            if parent_channel:
+                # 创建或更新帖子记录
+                thread = identity_cache.get_channel(thread_id)
+
+                if not thread:
+                    # 缓存未命中时确认数据库中是否已存在（例如由其他进程创建）
+                    thread_row = db.query(Channel).filter(
+                        Channel.platform_channel_id == thread_id
+                    ).first()
+                    if thread_row:
+                        thread = identity_cache.put_channel(thread_row)
+
+                if not thread:
+                    thread_row = Channel(
+                        platform_channel_id=thread_id,
+                        name=thread_name,
+                        guild_id=parent_channel.guild_id,
+                        guild_name=parent_channel.guild_name,
+                        type=11,  # Discord 帖子类型
+                        parent_id=parent_id,
+                        is_active=True,
+                        position=0
+                    )
+                    db.add(thread_row)
+                    db.commit()
+                    thread = identity_cache.put_channel(thread_row)
+                    message_logger.info(f"创建新帖子: {thread_name}")
+                
+                # 更新 channel 为新创建的帖子
+                channel = thread
+        
+        return channel
 
-    def _get_or_create_kol(self, author_data: Dict[str, Any]) -> KOL:
+    def _get_or_create_kol(self, db: Session, author_data: Dict[str, Any]) -> KOL:
         """获取或创建KOL记录"""
-        kol = self._db.query(KOL).filter(
+        kol = db.query(KOL).filter(
             KOL.platform == Platform.DISCORD.value,
             KOL.platform_user_id == str(author_data["id"])
         ).first()
@@ -145,14 +151,14 @@ class MessageHandler:
                 platform_user_id=str(author_data["id"]),
                 is_active=True
             )
-            self._db.add(kol)
-            self._db.commit()
+            db.add(kol)
+            db.commit()
         
         return kol
 
-    def _get_or_create_channel(self, channel_data: Dict[str, Any]) -> Channel:
+    def _get_or_create_channel(self, db: Session, channel_data: Dict[str, Any]) -> Channel:
         """获取或创建Channel记录"""
-        channel = self._db.query(Channel).filter(
+        channel = db.query(Channel).filter(
             Channel.platform_channel_id == str(channel_data["id"])
         ).first()
         
@@ -164,7 +170,7 @@ class MessageHandler:
                 guild_name=channel_data.get("guild_name", "Unknown"),
                 is_active=True
             )
-            self._db.add(channel)
-            self._db.commit()
+            db.add(channel)
+            db.commit()
         
         return channel 
\ No newline at end of file
@@ -0,0 +1,122 @@
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import select, func, desc, or_, literal_column
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.ext.compiler import compiles
+import json
+import logging
+
+from ..models.base import Message, Channel
+from ..config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# 与 messages.content_tsv 生成列使用同一个文本搜索配置（以常量写入SQL，asyncpg 无需推断 regconfig 参数类型）
+TS_CONFIG = literal_column("'simple'::regconfig")
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10, FragmentDelimiter= ... "
+
+class _ExplainJSON(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) <statement>，参数照常绑定"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(_ExplainJSON, "postgresql")
+def _compile_explain_json(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _needs_substring_match(term: str) -> bool:
+    """
+    是否追加 ILIKE 子串匹配
+
+    'simple' 分词无法切分中文，也匹配不到单词内部的子串，这些情况由 pg_trgm 索引上的 ILIKE 补充；
+    少于3个字符的纯ASCII词用不上三元组索引，只走全文检索。
+    """
+    return len(term) >= 3 or any(ord(ch) > 127 for ch in term)
+
+def build_search_filter(term: str):
+    """
+    构建搜索条件
+
+    Returns:
+        tuple: (过滤条件, tsquery 表达式)
+    """
+    ts_query = func.websearch_to_tsquery(TS_CONFIG, term)
+    condition = Message.content_tsv.op("@@")(ts_query)
+    if _needs_substring_match(term):
+        condition = or_(condition, Message.content.ilike(f"%{_escape_like(term)}%", escape="\\"))
+    return condition, ts_query
+
+def count_matches(db: Session, query) -> Tuple[int, bool]:
+    """
+    统计匹配条数：上限以内精确计数，超过上限时改用查询计划的行数估算
+
+    Returns:
+        tuple: (条数, 是否为估算值)
+    """
+    cap = get_settings().search_count_cap
+    capped = query.with_only_columns(Message.id).order_by(None).limit(cap + 1).subquery()
+    count = db.scalar(select(func.count()).select_from(capped))
+    if count <= cap:
+        return count, False
+
+    try:
+        plan = db.execute(_ExplainJSON(query.with_only_columns(Message.id).order_by(None))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.warning(f"估算搜索结果数失败: {str(e)}")
+        estimate = count
+    return max(estimate, count), True
+
+def search_messages(
+    db: Session,
+    term: str,
+    page: int,
+    per_page: int,
+    channel_id: Optional[int] = None,
+    sort: str = "relevance"
+) -> Dict[str, Any]:
+    """
+    搜索消息
+
+    Args:
+        term: 搜索词，支持 websearch 语法（引号短语、OR、-排除）
+        channel_id: 数据库频道ID，为空时全局搜索
+        sort: relevance 按相关度（ts_rank_cd）排序，time 按时间倒序
+
+    Returns:
+        dict: results 为 (Message, Channel, 高亮片段) 列表，total 和 total_is_estimate 为匹配条数
+    """
+    condition, ts_query = build_search_filter(term)
+
+    query = select(Message, Channel).join(Channel, Message.channel_id == Channel.id).where(condition)
+    if channel_id is not None:
+        query = query.where(Message.channel_id == channel_id)
+
+    if sort == "relevance":
+        order_by = [desc(func.ts_rank_cd(Message.content_tsv, ts_query)), desc(Message.created_at)]
+    else:
+        order_by = [desc(Message.created_at)]
+
+    total, total_is_estimate = count_matches(db, query)
+
+    headline = func.ts_headline(TS_CONFIG, Message.content, ts_query, HEADLINE_OPTIONS)
+    rows = db.execute(
+        query.add_columns(headline)
+        .options(selectinload(Message.kol), selectinload(Message.attachments))
+        .order_by(*order_by)
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+    ).all()
+
+    return {
+        "results": [(message, channel, highlight) for message, channel, highlight in rows],
+        "total": total,
+        "total_is_estimate": total_is_estimate
+    }
@@ -0,0 +1,229 @@
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime, timezone, timedelta
+import asyncio
+import logging
+import re
+
+from ..config.settings import get_settings
+from ..database import AsyncSessionLocal, run_db
+
+logger = logging.getLogger(__name__)
+
+# 按月范围分区的表及其分区键
+PARTITIONED_TABLES: Dict[str, str] = {
+    "ai_processing_logs": "start_time",
+    "ai_processing_steps": "start_time",
+}
+
+_PARTITION_NAME_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+def _month_start(dt: datetime) -> datetime:
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    month_index = dt.year * 12 + dt.month - 1 + months
+    return dt.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+class PartitionManager:
+    """
+    月分区维护和数据保留
+
+    - ai_processing_logs / ai_processing_steps 按月范围分区：提前创建分区，超过保留期的分区整体分离或删除
+    - messages / ai_messages 有入站外键，并且 platform_message_id 需要全局唯一（分区表的唯一约束必须包含分区键），
+      因此不分区，保留策略为按批删除过期行并先处理引用它们的表
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    # ---- 分区表 ----
+
+    def ensure_partitions(self, db: Session, months_ahead: Optional[int] = None) -> List[str]:
+        """创建上个月到未来 months_ahead 个月的分区（已存在的跳过）"""
+        settings = get_settings()
+        months_ahead = settings.partition_months_ahead if months_ahead is None else months_ahead
+        current = _month_start(datetime.now(timezone.utc))
+
+        created = []
+        for table in PARTITIONED_TABLES:
+            existing = set(self.list_partitions(db, table))
+            for offset in range(-1, months_ahead + 1):
+                month = _add_months(current, offset)
+                name = partition_name(table, month)
+                if name in existing:
+                    continue
+                db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+                ))
+                created.append(name)
+        db.commit()
+
+        if created:
+            logger.info(f"已创建分区: {', '.join(created)}")
+        return created
+
+    def list_partitions(self, db: Session, table: str) -> List[str]:
+        """列出表当前挂载的分区名"""
+        rows = db.execute(text("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = :table
+            ORDER BY child.relname
+        """), {"table": table}).scalars().all()
+        return list(rows)
+
+    def expire_partitions(self, db: Session, retention_days: Optional[int] = None, mode: Optional[str] = None) -> List[str]:
+        """
+        分离或删除整月都超过保留期的分区
+
+        detach 模式下分区成为同名的独立表，可以归档后再删除；drop 模式直接删除。
+        """
+        settings = get_settings()
+        retention_days = settings.partition_retention_days if retention_days is None else retention_days
+        mode = mode or settings.partition_retention_mode
+        if retention_days <= 0:
+            return []
+        if mode not in ("detach", "drop"):
+            raise ValueError(f"不支持的分区保留模式: {mode}")
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+        expired = []
+        for table in PARTITIONED_TABLES:
+            for name in self.list_partitions(db, table):
+                match = _PARTITION_NAME_RE.search(name)
+                if not match:
+                    continue
+                month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+                if _add_months(month, 1) > cutoff:
+                    continue
+                db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                if mode == "drop":
+                    db.execute(text(f"DROP TABLE {name}"))
+                expired.append(name)
+        db.commit()
+
+        if expired:
+            logger.info(f"已{'删除' if mode == 'drop' else '分离'}过期分区: {', '.join(expired)}")
+        return expired
+
+    # ---- 非分区表的按批保留 ----
+
+    def delete_messages_by_ids(self, db: Session, ids: List[int]) -> None:
+        """
+        删除指定消息（不提交）
+
+        unread_messages.last_read_message_id 先置空；附件和符号索引由外键 ON DELETE CASCADE 删除。
+        """
+        if not ids:
+            return
+        params = {"ids": list(ids)}
+        db.execute(text(
+            "UPDATE unread_messages SET last_read_message_id = NULL WHERE last_read_message_id = ANY(:ids)"
+        ), params)
+        db.execute(text("DELETE FROM messages WHERE id = ANY(:ids)"), params)
+
+    def delete_ai_messages_by_ids(self, db: Session, ids: List[int]) -> None:
+        """删除指定AI消息及其处理步骤、手动编辑记录（不提交）"""
+        if not ids:
+            return
+        params = {"ids": list(ids)}
+        db.execute(text("DELETE FROM ai_processing_steps WHERE ai_message_id = ANY(:ids)"), params)
+        db.execute(text("DELETE FROM ai_manual_edits WHERE ai_message_id = ANY(:ids)"), params)
+        db.execute(text("DELETE FROM ai_messages WHERE id = ANY(:ids)"), params)
+
+    def delete_expired_messages(self, db: Session, retention_days: int, batch_size: int) -> int:
+        """删除一批过期消息（每批单独提交）"""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+        ids = db.execute(text(
+            "SELECT id FROM messages WHERE created_at < :cutoff ORDER BY id LIMIT :limit"
+        ), {"cutoff": cutoff, "limit": batch_size}).scalars().all()
+        self.delete_messages_by_ids(db, ids)
+        db.commit()
+        return len(ids)
+
+    def delete_expired_ai_messages(self, db: Session, retention_days: int, batch_size: int) -> int:
+        """删除一批过期AI消息（每批单独提交）"""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+        ids = db.execute(text(
+            "SELECT id FROM ai_messages WHERE created_at < :cutoff ORDER BY id LIMIT :limit"
+        ), {"cutoff": cutoff, "limit": batch_size}).scalars().all()
+        self.delete_ai_messages_by_ids(db, ids)
+        db.commit()
+        return len(ids)
+
+    async def _delete_in_batches(self, db, fn, retention_days: int, batch_size: int) -> int:
+        total = 0
+        while True:
+            deleted = await run_db(db, fn, retention_days, batch_size)
+            total += deleted
+            if deleted < batch_size:
+                return total
+            # 批次之间让出事件循环，避免长时间占用连接和锁
+            await asyncio.sleep(0.1)
+
+    # ---- 定期维护 ----
+
+    async def run_once(self) -> Dict[str, Any]:
+        """执行一次维护：创建分区、处理过期分区、归档冷数据、按批删除过期消息"""
+        settings = get_settings()
+        result: Dict[str, Any] = {"started_at": datetime.now(timezone.utc).isoformat()}
+
+        async with AsyncSessionLocal() as db:
+            result["created_partitions"] = await run_db(db, self.ensure_partitions)
+            result["expired_partitions"] = await run_db(db, self.expire_partitions)
+
+            # 先归档再按保留期删除，避免未归档的历史数据被直接清理
+            if settings.archive_after_days > 0:
+                from .archiver import archiver
+                result["archived"] = await archiver.run_once(db)
+
+            if settings.message_retention_days > 0:
+                result["deleted_messages"] = await self._delete_in_batches(
+                    db, self.delete_expired_messages, settings.message_retention_days, settings.retention_batch_size
+                )
+            if settings.ai_message_retention_days > 0:
+                result["deleted_ai_messages"] = await self._delete_in_batches(
+                    db, self.delete_expired_ai_messages, settings.ai_message_retention_days, settings.retention_batch_size
+                )
+
+        result["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self.last_run = result
+        return result
+
+    async def start(self):
+        """启动定期维护任务（启动时立即执行一次，确保当前月分区存在）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_loop(self):
+        interval = get_settings().maintenance_interval_minutes * 60
+        while True:
+            try:
+                result = await self.run_once()
+                logger.info(f"数据库维护完成: {result}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"数据库维护失败: {str(e)}")
+            await asyncio.sleep(interval)
+
+# 全局分区管理器实例
+partition_manager = PartitionManager()
@@ -0,0 +1,61 @@
+from typing import Iterable, List, Optional
+import re
+
+from ..config.symbols import KNOWN_SYMBOLS, QUOTE_SYMBOLS, SYMBOL_ALIASES, MAX_SYMBOLS_PER_MESSAGE
+
+# $PEPE、$sol
+_CASHTAG_RE = re.compile(r"\$([A-Za-z][A-Za-z0-9]{1,14})\b")
+# SOL/USDT、btc-usdt、ETH / BTC
+_PAIR_RE = re.compile(r"\b([A-Za-z][A-Za-z0-9]{1,14})\s*[/\-]\s*(" + "|".join(sorted(QUOTE_SYMBOLS)) + r")\b", re.IGNORECASE)
+# BTCUSDT、SOLUSDC（交易所合约名）
+_CONCAT_PAIR_RE = re.compile(r"\b([A-Z][A-Z0-9]{1,14}?)(USDT|USDC|BUSD|FDUSD)\b")
+# 全大写单词，只保留已知币种
+_BARE_RE = re.compile(r"\b[A-Z][A-Z0-9]{1,9}\b")
+_ALIAS_RE = re.compile("|".join(re.escape(alias) for alias in sorted(SYMBOL_ALIASES, key=len, reverse=True)))
+
+def normalize_symbol(symbol: str) -> Optional[str]:
+    """规范化代币符号：去掉 $ 前缀并转为大写，不合法时返回 None"""
+    symbol = symbol.strip().lstrip("$").upper()
+    if not symbol or len(symbol) > 15 or not symbol.isalnum() or not symbol[0].isalpha():
+        return None
+    return symbol
+
+def extract_symbols(text: Optional[str]) -> List[str]:
+    """
+    从文本中提取代币符号
+
+    识别 $前缀符号、交易对（取基础币种）、已知币种的全大写单词以及中文名称，
+    结果去重并保持首次出现的顺序。
+    """
+    if not text:
+        return []
+
+    found: List[str] = []
+
+    def add(symbol: Optional[str]):
+        symbol = normalize_symbol(symbol) if symbol else None
+        if symbol and symbol not in found:
+            found.append(symbol)
+
+    for match in _CASHTAG_RE.finditer(text):
+        add(match.group(1))
+    for match in _PAIR_RE.finditer(text):
+        add(match.group(1))
+    for match in _CONCAT_PAIR_RE.finditer(text):
+        add(match.group(1))
+    for match in _BARE_RE.finditer(text):
+        if match.group(0) in KNOWN_SYMBOLS:
+            add(match.group(0))
+    for match in _ALIAS_RE.finditer(text):
+        add(SYMBOL_ALIASES[match.group(0)])
+
+    return found[:MAX_SYMBOLS_PER_MESSAGE]
+
+def normalize_symbols(symbols: Iterable[str]) -> List[str]:
+    """规范化符号列表（例如AI返回的 symbols 字段），去重并保持顺序"""
+    result: List[str] = []
+    for symbol in symbols:
+        normalized = normalize_symbol(str(symbol)) if symbol else None
+        if normalized and normalized not in result:
+            result.append(normalized)
+    return result[:MAX_SYMBOLS_PER_MESSAGE]
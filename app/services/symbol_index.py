@@ -0,0 +1,215 @@
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, desc, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime
+import logging
+
+from ..models.base import Message, Channel, KOL, MessageSymbol
+from ..ai.models import AIMessage
+from .symbol_extractor import extract_symbols, normalize_symbols
+from .identity_cache import identity_cache
+
+logger = logging.getLogger(__name__)
+
+SOURCE_MESSAGE = "message"
+SOURCE_AI = "ai"
+
+# 提及次数统计支持的时间桶
+MENTION_BUCKETS = ("minute", "hour", "day")
+
+def _insert_symbols(db: Session, rows: List[Dict[str, Any]]) -> int:
+    if not rows:
+        return 0
+    # 重复处理同一条消息时由部分唯一索引去重
+    db.execute(insert(MessageSymbol).values(rows).on_conflict_do_nothing())
+    return len(rows)
+
+def record_message_symbols(
+    db: Session,
+    message_id: int,
+    channel_id: int,
+    content: Optional[str],
+    created_at: datetime
+) -> List[str]:
+    """提取消息原文中的符号并写入索引（不提交，随消息一起提交）"""
+    symbols = extract_symbols(content)
+    _insert_symbols(db, [
+        {
+            "symbol": symbol,
+            "message_id": message_id,
+            "channel_id": channel_id,
+            "source": SOURCE_MESSAGE,
+            "created_at": created_at
+        }
+        for symbol in symbols
+    ])
+    return symbols
+
+def record_bulk_message_symbols(
+    db: Session,
+    channel_id: int,
+    messages: List[Tuple[int, Optional[str], datetime]]
+) -> int:
+    """批量写入同一频道多条消息的符号（不提交），messages 为 (消息ID, 内容, 消息时间)"""
+    return _insert_symbols(db, [
+        {
+            "symbol": symbol,
+            "message_id": message_id,
+            "channel_id": channel_id,
+            "source": SOURCE_MESSAGE,
+            "created_at": created_at
+        }
+        for message_id, content, created_at in messages
+        for symbol in extract_symbols(content)
+    ])
+
+def record_ai_symbols(db: Session, ai_message: AIMessage) -> List[str]:
+    """
+    写入AI分析结果中的符号（不提交）
+
+    来源为交易信号的 symbols 字段和分析出的关键词。
+    """
+    symbols: List[str] = []
+    signal = ai_message.trading_signal or {}
+    if isinstance(signal.get("symbols"), list):
+        symbols.extend(normalize_symbols(signal["symbols"]))
+    for symbol in extract_symbols(" ".join(str(k) for k in (ai_message.keywords or []))):
+        if symbol not in symbols:
+            symbols.append(symbol)
+
+    if not symbols:
+        return []
+
+    identity_cache.ensure_loaded(db)
+    channel = identity_cache.get_channel(ai_message.channel_id)
+
+    _insert_symbols(db, [
+        {
+            "symbol": symbol,
+            "ai_message_id": ai_message.id,
+            "channel_id": channel.id if channel else None,
+            "source": SOURCE_AI,
+            "created_at": ai_message.created_at
+        }
+        for symbol in symbols
+    ])
+    return symbols
+
+def get_symbol_mentions(
+    db: Session,
+    symbol: str,
+    since: datetime,
+    until: Optional[datetime] = None,
+    source: Optional[str] = None,
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """按时间倒序获取提到某个符号的消息和AI分析结果"""
+    query = select(MessageSymbol).where(
+        MessageSymbol.symbol == symbol,
+        MessageSymbol.created_at >= since
+    )
+    if until is not None:
+        query = query.where(MessageSymbol.created_at < until)
+    if source is not None:
+        query = query.where(MessageSymbol.source == source)
+
+    mentions = db.scalars(query.order_by(desc(MessageSymbol.created_at)).limit(limit)).all()
+
+    # 关联的消息、AI消息按ID各取一次
+    message_ids = [m.message_id for m in mentions if m.message_id]
+    ai_message_ids = [m.ai_message_id for m in mentions if m.ai_message_id]
+
+    messages = {}
+    if message_ids:
+        rows = db.execute(
+            select(Message.id, Message.content, KOL.name, Channel.platform_channel_id, Channel.name)
+            .join(Channel, Message.channel_id == Channel.id)
+            .outerjoin(KOL, Message.kol_id == KOL.id)
+            .where(Message.id.in_(message_ids))
+        ).all()
+        messages = {row[0]: row for row in rows}
+
+    ai_messages = {}
+    if ai_message_ids:
+        rows = db.execute(
+            select(
+                AIMessage.id, AIMessage.message_content, AIMessage.channel_id, AIMessage.channel_name,
+                AIMessage.analysis_summary, AIMessage.sentiment, AIMessage.has_trading_signal
+            ).where(AIMessage.id.in_(ai_message_ids))
+        ).all()
+        ai_messages = {row[0]: row for row in rows}
+
+    result = []
+    for mention in mentions:
+        item = {
+            "symbol": mention.symbol,
+            "source": mention.source,
+            "created_at": mention.created_at.isoformat()
+        }
+        if mention.message_id and mention.message_id in messages:
+            _, content, author_name, channel_id, channel_name = messages[mention.message_id]
+            item.update({
+                "message_id": mention.message_id,
+                "content": content,
+                "author_name": author_name,
+                "channel_id": channel_id,
+                "channel_name": channel_name
+            })
+        elif mention.ai_message_id and mention.ai_message_id in ai_messages:
+            _, content, channel_id, channel_name, summary, sentiment, has_signal = ai_messages[mention.ai_message_id]
+            item.update({
+                "ai_message_id": mention.ai_message_id,
+                "content": content,
+                "channel_id": channel_id,
+                "channel_name": channel_name,
+                "analysis_summary": summary,
+                "sentiment": sentiment,
+                "has_trading_signal": has_signal
+            })
+        else:
+            continue
+        result.append(item)
+
+    return result
+
+def get_mention_rate(
+    db: Session,
+    symbol: str,
+    since: datetime,
+    bucket: str = "hour",
+    source: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """按时间桶统计某个符号的提及次数"""
+    if bucket not in MENTION_BUCKETS:
+        raise ValueError(f"不支持的时间桶: {bucket}")
+    # 时间桶以常量写入SQL，SELECT 和 GROUP BY 中的表达式才能被识别为同一个
+    bucket_start = func.date_trunc(literal_column(f"'{bucket}'"), MessageSymbol.created_at).label("bucket")
+    query = select(bucket_start, func.count().label("mentions")).where(
+        MessageSymbol.symbol == symbol,
+        MessageSymbol.created_at >= since
+    )
+    if source is not None:
+        query = query.where(MessageSymbol.source == source)
+
+    rows = db.execute(query.group_by(bucket_start).order_by(bucket_start)).all()
+    return [{"bucket": row.bucket.isoformat(), "mentions": row.mentions} for row in rows]
+
+def get_top_symbols(
+    db: Session,
+    since: datetime,
+    limit: int = 20,
+    source: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """统计时间窗口内提及次数最多的符号"""
+    mentions = func.count().label("mentions")
+    query = select(
+        MessageSymbol.symbol,
+        mentions,
+        func.count(func.distinct(MessageSymbol.channel_id)).label("channels")
+    ).where(MessageSymbol.created_at >= since)
+    if source is not None:
+        query = query.where(MessageSymbol.source == source)
+
+    rows = db.execute(query.group_by(MessageSymbol.symbol).order_by(desc(mentions)).limit(limit)).all()
+    return [{"symbol": row.symbol, "mentions": row.mentions, "channels": row.channels} for row in rows]
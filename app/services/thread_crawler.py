@@ -0,0 +1,207 @@
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, func, case, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timezone
+import asyncio
+import logging
+
+from ..config.settings import get_settings
+from ..database import AsyncIngestSessionLocal, IngestSessionLocal, run_db
+from ..models.base import Channel
+from .identity_cache import CachedChannel, identity_cache
+from . import bulk_importer
+
+logger = logging.getLogger(__name__)
+
+UPSERT_BATCH_SIZE = 1000
+
+class ThreadCrawler:
+    """
+    论坛帖子抓取
+
+    - 所有论坛并发抓取（并发数 discord_sync_concurrency，请求速率由 discord_rest 控制）
+    - 每个论坛记录抓取游标（channels.thread_cursor_snowflake），增量抓取只获取之后有新消息或新归档的帖子
+    - 每个论坛的帖子用一条 INSERT ... ON CONFLICT DO UPDATE 批量写入
+    - 可选同步有变化的帖子的消息：有高水位的帖子只拉取新消息
+    """
+
+    def __init__(self):
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def load_forums(self, db: Session, forum_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """监控中的论坛频道及其抓取游标"""
+        query = select(
+            Channel.id, Channel.platform_channel_id, Channel.name,
+            Channel.guild_id, Channel.guild_name, Channel.thread_cursor_snowflake
+        ).where(Channel.type == 15, Channel.is_active.is_(True))
+        if forum_ids:
+            query = query.where(Channel.platform_channel_id.in_(forum_ids))
+        return [dict(row._mapping) for row in db.execute(query)]
+
+    def upsert_threads(self, db: Session, forum: Dict[str, Any], threads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量写入一个论坛的帖子并推进论坛游标（一次提交）
+
+        已有帖子更新名称，已归档时停用；未归档时保持原状态（与之前一致，不自动重新启用）。
+
+        Returns:
+            写入的帖子：id, platform_channel_id, is_active, last_message_snowflake, inserted
+        """
+        written: List[Dict[str, Any]] = []
+        # 分批写入：asyncpg 单条语句最多 32767 个参数
+        for start in range(0, len(threads), UPSERT_BATCH_SIZE):
+            stmt = insert(Channel).values([
+                {
+                    'platform_channel_id': thread['id'],
+                    'name': thread.get('name') or '未知帖子',
+                    'guild_id': forum['guild_id'],
+                    'guild_name': forum['guild_name'],
+                    'type': 11,  # Discord 帖子类型
+                    'parent_id': forum['platform_channel_id'],
+                    'category_name': forum['name'],
+                    'is_active': not thread['archived'],
+                    'position': 0,
+                    'owner_id': thread.get('owner_id'),
+                }
+                for thread in threads[start:start + UPSERT_BATCH_SIZE]
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Channel.platform_channel_id],
+                set_={
+                    'name': stmt.excluded.name,
+                    'is_active': case((stmt.excluded.is_active.is_(False), False), else_=Channel.is_active),
+                    'updated_at': func.now(),
+                }
+            ).returning(
+                Channel.id,
+                Channel.platform_channel_id,
+                Channel.is_active,
+                Channel.last_message_snowflake,
+                # xmax = 0 表示本次插入的新行，否则为冲突后更新的已有行
+                literal_column('(xmax = 0)').label('inserted'),
+            )
+            written.extend(dict(row._mapping) for row in db.execute(stmt))
+
+        if threads:
+            cursor = max(thread['last_activity'] for thread in threads)
+            db.execute(
+                update(Channel)
+                .where(Channel.id == forum['id'])
+                .values(thread_cursor_snowflake=func.greatest(func.coalesce(Channel.thread_cursor_snowflake, 0), cursor))
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+        return written
+
+    async def crawl(
+        self,
+        client,
+        forum_ids: Optional[List[str]] = None,
+        full: bool = False,
+        message_count: int = 0,
+        bulk: bool = False
+    ) -> Dict[str, Any]:
+        """
+        抓取论坛帖子
+
+        Args:
+            client: DiscordClient
+            forum_ids: 只抓取这些论坛（Discord频道ID），默认所有监控中的论坛
+            full: 忽略游标，全量抓取
+            message_count: 大于 0 时同步有变化且未归档的帖子的消息（每个帖子最多这么多条）
+            bulk: 消息使用批量导入（不广播、不转发AI）
+        """
+        settings = get_settings()
+        started = datetime.now(timezone.utc)
+        result: Dict[str, Any] = {
+            "forums": 0,
+            "threads_seen": 0,
+            "inserted_count": 0,
+            "updated_count": 0,
+            "message_count": 0,
+            "errors": [],
+        }
+
+        async with AsyncIngestSessionLocal() as db:
+            forums = await run_db(db, self.load_forums, forum_ids)
+        result["forums"] = len(forums)
+        semaphore = asyncio.Semaphore(settings.discord_sync_concurrency)
+        changed_threads: List[Dict[str, Any]] = []
+
+        async def crawl_forum(forum: Dict[str, Any]):
+            try:
+                async with semaphore:
+                    since = None if full else forum['thread_cursor_snowflake']
+                    threads = await client.get_forum_threads(forum['platform_channel_id'], since_snowflake=since)
+                async with AsyncIngestSessionLocal() as db:
+                    written = await run_db(db, self.upsert_threads, forum, threads)
+                result["threads_seen"] += len(threads)
+                result["inserted_count"] += sum(1 for row in written if row['inserted'])
+                result["updated_count"] += sum(1 for row in written if not row['inserted'])
+                changed_threads.extend(row for row in written if row['is_active'])
+            except Exception as e:
+                logger.error(f"抓取论坛 {forum['name']} 的帖子失败: {str(e)}")
+                result["errors"].append(f"论坛 {forum['name']}: {str(e)}")
+
+        await asyncio.gather(*(crawl_forum(forum) for forum in forums))
+        if result["inserted_count"] or result["updated_count"]:
+            # 批量写入后让身份缓存整体重新加载
+            identity_cache.invalidate()
+
+        if message_count > 0 and changed_threads:
+            async def sync_thread(thread: Dict[str, Any]):
+                try:
+                    async with semaphore:
+                        after = str(thread['last_message_snowflake']) if thread['last_message_snowflake'] else None
+                        messages = await client.get_channel_messages(
+                            thread['platform_channel_id'], limit=message_count, after=after
+                        )
+                    if messages:
+                        result["message_count"] += await self._store_thread_messages(client, thread, messages, bulk)
+                except Exception as e:
+                    logger.error(f"同步帖子 {thread['platform_channel_id']} 的消息失败: {str(e)}")
+                    result["errors"].append(f"帖子 {thread['platform_channel_id']}: {str(e)}")
+
+            await asyncio.gather(*(sync_thread(thread) for thread in changed_threads))
+
+        result["duration_seconds"] = round((datetime.now(timezone.utc) - started).total_seconds(), 1)
+        result["errors"] = result["errors"] or None
+        self.last_run = result
+        logger.info(
+            f"帖子抓取完成: {result['forums']} 个论坛, {result['threads_seen']} 个有变化的帖子 "
+            f"(新增 {result['inserted_count']}, 更新 {result['updated_count']}), {result['message_count']} 条消息"
+        )
+        return result
+
+    async def _store_thread_messages(self, client, thread: Dict[str, Any], messages: List[dict], bulk: bool) -> int:
+        """一个帖子的消息共用一个会话写入"""
+        if bulk:
+            db = IngestSessionLocal()
+            try:
+                identity_cache.ensure_loaded(db)
+                channel = identity_cache.get_channel(thread['platform_channel_id'])
+                if channel is None:
+                    channel = CachedChannel.from_model(db.get(Channel, thread['id']))
+                attachments = {}
+                new_ids = set(bulk_importer.filter_new_message_ids(db, [str(m.get('id')) for m in messages if m.get('id')]))
+                for message_data in messages:
+                    message_id = str(message_data.get('id'))
+                    if message_id in new_ids and message_data.get('attachments'):
+                        attachments[message_id] = await client.download_attachments(message_data)
+                return bulk_importer.bulk_import_messages(db, channel, messages, attachments)
+            finally:
+                db.close()
+
+        stored = 0
+        async with AsyncIngestSessionLocal() as db:
+            for message_data in sorted(messages, key=lambda m: int(m['id'])):
+                try:
+                    await client.store_message(message_data, db)
+                    stored += 1
+                except Exception as e:
+                    logger.error(f"存储消息失败: {str(e)}")
+        return stored
+
+# 全局帖子抓取实例
+thread_crawler = ThreadCrawler()
@@ -0,0 +1,79 @@
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, desc, literal
+from sqlalchemy.dialects.postgresql import insert
+
+from ..models.base import Channel, Message, UnreadMessage
+
+def increment_unread_count(db: Session, channel_id: int, n: int = 1) -> None:
+    """
+    原子地增加频道未读计数（不提交，由调用方与消息写入一起提交）
+
+    依赖 unread_messages.channel_id 上的唯一索引：
+    INSERT ... ON CONFLICT (channel_id) DO UPDATE SET unread_count = unread_count + n
+    """
+    stmt = insert(UnreadMessage).values(channel_id=channel_id, unread_count=n)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UnreadMessage.channel_id],
+        set_={
+            "unread_count": UnreadMessage.unread_count + stmt.excluded.unread_count,
+            "updated_at": func.now()
+        }
+    )
+    db.execute(stmt)
+
+def get_unread_counts(db: Session, include_zero: bool = False) -> Dict[str, int]:
+    """一次查询获取所有频道的未读数，键为Discord频道ID"""
+    query = select(Channel.platform_channel_id, UnreadMessage.unread_count).join(
+        Channel, UnreadMessage.channel_id == Channel.id
+    )
+    if not include_zero:
+        query = query.where(UnreadMessage.unread_count > 0)
+
+    return {platform_channel_id: count or 0 for platform_channel_id, count in db.execute(query)}
+
+def mark_channels_read(
+    db: Session,
+    platform_channel_ids: Optional[List[str]] = None,
+    guild_id: Optional[str] = None
+) -> int:
+    """
+    一条语句把频道标记为已读（不提交），不传筛选条件时标记所有频道
+
+    DISTINCT ON (channel_id) 取每个频道的最新消息，再通过 INSERT ... SELECT ... ON CONFLICT
+    同时处理已有和尚未创建未读记录的频道。没有消息的频道保留原来的已读位置。
+
+    Returns:
+        int: 标记的频道数
+    """
+    channel_filters = []
+    if platform_channel_ids is not None:
+        channel_filters.append(Channel.platform_channel_id.in_(platform_channel_ids))
+    if guild_id is not None:
+        channel_filters.append(Channel.guild_id == guild_id)
+
+    latest = select(Message.channel_id, Message.id).distinct(Message.channel_id).order_by(
+        Message.channel_id, desc(Message.created_at)
+    )
+    if channel_filters:
+        latest = latest.where(Message.channel_id.in_(select(Channel.id).where(*channel_filters)))
+    latest = latest.subquery()
+
+    source = select(Channel.id, literal(0), latest.c.id).outerjoin(
+        latest, latest.c.channel_id == Channel.id
+    ).where(*channel_filters)
+
+    stmt = insert(UnreadMessage).from_select(
+        ["channel_id", "unread_count", "last_read_message_id"], source
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UnreadMessage.channel_id],
+        set_={
+            "unread_count": 0,
+            "last_read_message_id": func.coalesce(
+                stmt.excluded.last_read_message_id, UnreadMessage.last_read_message_id
+            ),
+            "updated_at": func.now()
+        }
+    )
+    return db.execute(stmt).rowcount
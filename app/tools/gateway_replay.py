@@ -0,0 +1,258 @@
+"""
+网关重放服务器
+
+本地的 Discord 网关替身（aiohttp WebSocket）：按录制文件（GatewayRecorder 生成的
+gateway-*.ndjson.gz）重放分发事件，用于离线压测 接收 → 数据库 → AI → 前端WebSocket 整条链路，
+或复现突发流量。
+
+- 实现 DiscordClient.start_monitoring 用到的协议：HELLO、心跳确认、IDENTIFY → READY、
+  RESUME → RESUMED（从客户端给出的序列号之后继续），支持 compress=zlib-stream
+- 只重放录制中的分发事件 (op 0)；READY 使用录制中的第一个（替换 session_id 和 resume_gateway_url），
+  没有时发送最小的 READY；其他操作码（心跳确认、HELLO 等）由服务器自己生成
+- 序列号按事件在录制中的顺序重新编号，同一个录制文件每次重放的事件顺序和序列号完全相同
+- --speed 1 按原始间隔，N 为 N 倍速，max 不等待；--max-gap 限制单个间隔的最长等待
+- --reconnect-every N 每发送 N 个事件要求客户端重连 (op 7)，用于测试会话恢复
+
+不依赖应用代码和数据库，只需要 aiohttp。
+
+用法:
+    python app/tools/gateway_replay.py recordings/gateway-20240101-000000-000.ndjson.gz --speed 10
+    python app/tools/gateway_replay.py recordings/ --speed max --events MESSAGE_CREATE --exit-when-done
+
+然后让应用连接重放服务器（token 任意，不要让本地地址走 HTTP_PROXY）:
+    DISCORD_GATEWAY_URL=ws://127.0.0.1:8765 DISCORD_USER_TOKEN=replay uvicorn app.main:app
+
+注意：消息中的附件仍会从 Discord CDN 下载；频道需要已存在于数据库中（与录制时相同的频道）。
+"""
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+import zlib
+from typing import List, Optional, Tuple
+
+from aiohttp import WSMsgType, web
+
+logger = logging.getLogger("gateway_replay")
+
+HEARTBEAT_INTERVAL_MS = 41250
+
+def resolve_paths(paths: List[str]) -> List[str]:
+    """目录展开为其中的录制文件（按文件名，即录制时间排序）"""
+    resolved = []
+    for path in paths:
+        if os.path.isdir(path):
+            resolved.extend(sorted(
+                glob.glob(os.path.join(path, "gateway-*.ndjson.gz")) + glob.glob(os.path.join(path, "gateway-*.ndjson"))
+            ))
+        else:
+            resolved.append(path)
+    return resolved
+
+def load_recording(paths: List[str], events: Optional[set] = None) -> Tuple[List[Tuple[float, str, str]], Optional[dict]]:
+    """
+    读取录制文件
+
+    Returns:
+        (分发事件列表 [(接收时间, 事件类型JSON, 负载JSON)], 第一个 READY 的负载)
+    """
+    dispatches = []
+    ready = None
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程被强制结束时最后一行可能不完整
+                    continue
+                frame = record.get("frame", record)
+                if not isinstance(frame, dict) or frame.get("op") != 0:
+                    continue
+                event_type = frame.get("t")
+                if event_type == "READY":
+                    ready = ready or frame.get("d")
+                    continue
+                if event_type == "RESUMED" or (events and event_type not in events):
+                    continue
+                dispatches.append((
+                    float(record.get("ts", 0)),
+                    json.dumps(event_type),
+                    json.dumps(frame.get("d"), ensure_ascii=False),
+                ))
+    return dispatches, ready
+
+class ReplayServer:
+    def __init__(
+        self,
+        dispatches: List[Tuple[float, str, str]],
+        ready: Optional[dict],
+        speed: Optional[float],
+        max_gap: Optional[float],
+        loop: bool,
+        reconnect_every: int,
+        public_url: str
+    ):
+        self.dispatches = dispatches
+        self.ready = ready or {"v": 9, "user": {"id": "0", "username": "replay"}, "guilds": []}
+        self.speed = speed
+        self.max_gap = max_gap
+        self.loop = loop
+        self.reconnect_every = reconnect_every
+        self.public_url = public_url
+        self.session_id: Optional[str] = None
+        self.done = asyncio.Event()
+        self.stats = {"connections": 0, "identifies": 0, "resumes": 0, "sent": 0}
+        self._started_at: Optional[float] = None
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self.stats["connections"] += 1
+        compressor = zlib.compressobj() if request.query.get("compress") == "zlib-stream" else None
+
+        async def send(data: str) -> None:
+            if compressor is None:
+                await ws.send_str(data)
+            else:
+                payload = data.encode("utf-8")
+                await ws.send_bytes(compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH))
+
+        replay_task: Optional[asyncio.Task] = None
+        await send(json.dumps({"op": 10, "d": {"heartbeat_interval": HEARTBEAT_INTERVAL_MS}}))
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                op = data.get("op")
+                if op == 1:
+                    await send('{"op":11,"d":null}')
+                elif op == 2:
+                    self.stats["identifies"] += 1
+                    self.session_id = uuid.uuid4().hex
+                    ready = {**self.ready, "session_id": self.session_id, "resume_gateway_url": self.public_url}
+                    await send(json.dumps({"op": 0, "s": None, "t": "READY", "d": ready}, ensure_ascii=False))
+                    logger.info("客户端 IDENTIFY，从头重放 %d 个事件", len(self.dispatches))
+                    replay_task = asyncio.create_task(self._replay(ws, send, 0))
+                elif op == 6:
+                    resume = data.get("d") or {}
+                    if resume.get("session_id") != self.session_id or resume.get("seq") is None:
+                        await send('{"op":9,"d":false}')
+                        continue
+                    self.stats["resumes"] += 1
+                    position = int(resume["seq"])
+                    await send(json.dumps({"op": 0, "s": position, "t": "RESUMED", "d": {}}))
+                    logger.info("客户端 RESUME，从序列号 %d 之后继续", position)
+                    replay_task = asyncio.create_task(self._replay(ws, send, position))
+        finally:
+            if replay_task:
+                replay_task.cancel()
+        return ws
+
+    async def _replay(self, ws: web.WebSocketResponse, send, position: int) -> None:
+        """从 position（已发送的最后一个序列号）之后继续发送事件"""
+        total = len(self.dispatches)
+        if not total:
+            return
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+        clock = time.monotonic()
+        sent_here = 0
+        while not ws.closed:
+            if position >= total and not self.loop:
+                self._finish()
+                return
+            index = position % total
+            if self.speed is not None and index > 0 and sent_here > 0:
+                gap = max(self.dispatches[index][0] - self.dispatches[index - 1][0], 0)
+                if self.max_gap is not None:
+                    gap = min(gap, self.max_gap)
+                clock += gap / self.speed
+                delay = clock - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif sent_here % 100 == 0:
+                # 全速重放时让出事件循环，及时回复心跳
+                await asyncio.sleep(0)
+            _, event_type, payload = self.dispatches[index]
+            position += 1
+            await send(f'{{"op":0,"s":{position},"t":{event_type},"d":{payload}}}')
+            sent_here += 1
+            self.stats["sent"] += 1
+            if self.reconnect_every and sent_here >= self.reconnect_every:
+                logger.info("已发送 %d 个事件，要求客户端重连 (序列号 %d)", sent_here, position)
+                await send('{"op":7,"d":null}')
+                return
+
+    def _finish(self) -> None:
+        if self.done.is_set():
+            return
+        elapsed = time.monotonic() - (self._started_at or time.monotonic())
+        rate = self.stats["sent"] / elapsed if elapsed > 0 else 0
+        logger.info(
+            "重放完成: 发送 %d 个事件，用时 %.1f 秒 (%.0f 个/秒)，连接 %d 次，IDENTIFY %d 次，RESUME %d 次",
+            self.stats["sent"], elapsed, rate, self.stats["connections"], self.stats["identifies"], self.stats["resumes"]
+        )
+        self.done.set()
+
+async def serve(args: argparse.Namespace) -> None:
+    paths = resolve_paths(args.recordings)
+    if not paths:
+        raise SystemExit("没有找到录制文件")
+    events = set(args.events.split(",")) if args.events else None
+    dispatches, ready = load_recording(paths, events)
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        raise SystemExit("--speed 必须大于 0，或使用 max")
+    span = dispatches[-1][0] - dispatches[0][0] if dispatches else 0
+    logger.info("读取 %d 个录制文件: %d 个分发事件，录制时长 %.1f 秒", len(paths), len(dispatches), span)
+
+    server = ReplayServer(
+        dispatches, ready, speed, args.max_gap, args.loop, args.reconnect_every,
+        f"ws://{args.host}:{args.port}"
+    )
+    app = web.Application()
+    app.router.add_get("/", server.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    logger.info("网关重放服务器已启动: ws://%s:%d (速度 %s)", args.host, args.port, args.speed)
+    try:
+        if args.exit_when_done:
+            await server.done.wait()
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Discord 网关重放服务器")
+    parser.add_argument("recordings", nargs="+", help="录制文件（ndjson，可为 .gz）或录制目录")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", default="1", help="重放速度倍数，max 表示不等待")
+    parser.add_argument("--max-gap", type=float, default=None, help="单个事件间隔的最长等待（录制时间，秒）")
+    parser.add_argument("--events", help="只重放这些事件类型，逗号分隔，例如 MESSAGE_CREATE")
+    parser.add_argument("--loop", action="store_true", help="重放完后从头继续（序列号继续递增）")
+    parser.add_argument("--reconnect-every", type=int, default=0, help="每个连接发送这么多事件后要求重连 (op 7)")
+    parser.add_argument("--exit-when-done", action="store_true", help="重放完成后输出统计并退出")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+JSON 编解码
+
+按已安装的库选择实现：编码优先 orjson，其次 msgspec，最后标准库 json；
+解析同样优先 orjson。三种实现的输出都是 UTF-8（不转义非 ASCII 字符），
+datetime 编码为 ISO 8601 字符串。
+
+网关帧用 decode_gateway 解析：安装了 msgspec 时解码为带类型的结构体，
+负载 d 保持原始字节，只有需要处理的事件才解析，跳过大量无关的分发事件。
+"""
+from typing import Any, Optional, Union
+from datetime import date, datetime
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKEND = "orjson" if orjson else "msgspec" if msgspec else "json"
+GATEWAY_BACKEND = "msgspec" if msgspec else BACKEND
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+if orjson:
+    def dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default)
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj, default=_default).decode("utf-8")
+
+    loads = orjson.loads
+elif msgspec:
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _decoder = msgspec.json.Decoder()
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return _encoder.encode(obj)
+
+    def dumps(obj: Any) -> str:
+        return _encoder.encode(obj).decode("utf-8")
+
+    def loads(data: Union[str, bytes]) -> Any:
+        return _decoder.decode(data)
+else:
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, default=_default)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return dumps(obj).encode("utf-8")
+
+    loads = json.loads
+
+if msgspec:
+    class GatewayFrame(msgspec.Struct):
+        """网关帧；d 为原始 JSON，调用 payload() 时才解析"""
+        op: int
+        s: Optional[int] = None
+        t: Optional[str] = None
+        d: msgspec.Raw = msgspec.Raw(b"null")
+
+        def payload(self) -> Any:
+            return msgspec.json.decode(self.d)
+
+    _gateway_decoder = msgspec.json.Decoder(GatewayFrame)
+
+    def decode_gateway(data: Union[str, bytes]) -> GatewayFrame:
+        return _gateway_decoder.decode(data)
+else:
+    class GatewayFrame:
+        """网关帧（无 msgspec 时整帧解析）"""
+        __slots__ = ("op", "s", "t", "d")
+
+        def __init__(self, op: int, s: Optional[int] = None, t: Optional[str] = None, d: Any = None):
+            self.op = op
+            self.s = s
+            self.t = t
+            self.d = d
+
+        def payload(self) -> Any:
+            return self.d
+
+    def decode_gateway(data: Union[str, bytes]) -> GatewayFrame:
+        frame = loads(data)
+        return GatewayFrame(frame.get("op"), frame.get("s"), frame.get("t"), frame.get("d"))
@@ -0,0 +1,40 @@
+import logging
+import time
+
+class SamplingLogger:
+    """
+    热路径日志采样：同一条日志（按级别和格式串区分）每 interval 秒最多输出一次，
+    输出时附带期间省略的条数；interval 为 0 时不采样。
+
+    用于每条消息都会触发的日志。日志级别未启用时直接返回，参数不做任何格式化，
+    因此调用方应使用 %-style 参数而不是 f-string。
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float):
+        self.logger = logger
+        self.interval = interval
+        self._next_at = {}
+        self._suppressed = {}
+
+    def _log(self, level: int, msg: str, args: tuple):
+        if not self.logger.isEnabledFor(level):
+            return
+        if self.interval > 0:
+            key = (level, msg)
+            now = time.monotonic()
+            if now < self._next_at.get(key, 0.0):
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return
+            self._next_at[key] = now + self.interval
+            suppressed = self._suppressed.pop(key, 0)
+            if suppressed:
+                msg = msg + " (过去 %.0f 秒内另有 %d 条)"
+                args = args + (self.interval, suppressed)
+        # stacklevel=3：记录调用 debug()/info() 的位置
+        self.logger.log(level, msg, *args, stacklevel=3)
+
+    def debug(self, msg: str, *args):
+        self._log(logging.DEBUG, msg, args)
+
+    def info(self, msg: str, *args):
+        self._log(logging.INFO, msg, args)
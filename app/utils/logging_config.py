@@ -1,11 +1,11 @@
 import os
 import logging
 import sys
-import json
 import asyncio
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from .telegram_logger import TelegramHandler
+from . import json_codec
 
 # 创建日志目录
 log_dir = Path(os.getcwd()) / "logs"
@@ -22,14 +22,17 @@ class WebSocketHandler(logging.Handler):
     """向前端WebSocket发送日志的处理器"""
     
     def emit(self, record):
+        # 没有前端连接时不格式化、不创建任务
+        if not websocket_clients:
+            return
         try:
             log_entry = self.format(record)
             log_data = {
                 'type': 'log',
                 'level': record.levelname,
-                'message': log_entry,
-                'timestamp': record.created,
-                'logger': record.name
+                'logger': record.name,
+                'message': log_entry.strip(),
+                'timestamp': record.created
             }
             
             # 获取当前事件循环
@@ -44,8 +47,8 @@ class WebSocketHandler(logging.Handler):
             self.handleError(record)
     
     async def _broadcast_log(self, log_data):
-        """广播日志到所有已连接的WebSocket客户端"""
-        message = json.dumps(log_data)
+        """广播日志到所有已连接的WebSocket客户端（只编码一次，所有客户端共用）"""
+        message = json_codec.dumps(log_data)
         disconnected = set()
         
         # 创建副本进行遍历，避免在遍历时修改集合
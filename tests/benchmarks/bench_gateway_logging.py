@@ -0,0 +1,92 @@
+"""
+网关热路径日志开销基准测试
+
+对每个网关帧执行处理循环中的日志语句，比较修改前后的单帧 CPU 耗时：
+- 修改前：f-string 在调用 debug()/info() 之前就完成格式化（即使日志级别为 WARNING）
+- 修改后：isEnabledFor 守卫、%-style 延迟格式化、每条消息级别的日志使用 SamplingLogger
+
+分别在 WARNING（生产默认）和 INFO 级别下测量；日志输出到 NullHandler，只统计格式化和调度开销。
+不需要数据库和网络。
+
+用法:
+    python tests/benchmarks/bench_gateway_logging.py
+    python tests/benchmarks/bench_gateway_logging.py --frames 200000 --runs 7
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import statistics
+import time
+
+# 直接按文件加载，避免导入 app 包时初始化 Telegram 等日志处理器
+_spec = importlib.util.spec_from_file_location(
+    "log_sampling",
+    os.path.join(os.path.dirname(__file__), "..", "..", "app", "utils", "log_sampling.py")
+)
+_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_module)
+SamplingLogger = _module.SamplingLogger
+
+def make_frames(count: int) -> list:
+    frame = {
+        "op": 0, "s": 1, "t": "MESSAGE_CREATE",
+        "d": {
+            "id": "1234567890123456789",
+            "channel_id": "1100000000000000000",
+            "content": "BTC 突破 70000，止损 68500，目标 74000 " * 3,
+            "author": {"id": "900000000000000000", "username": "trader", "discriminator": "0"},
+        },
+    }
+    raw = json.dumps(frame, ensure_ascii=False)
+    return [(raw, str(1234567890123456789 + i)) for i in range(count)]
+
+def before(logger: logging.Logger, frames: list):
+    """修改前的日志写法"""
+    for raw, message_id in frames:
+        logger.debug(f"[WebSocket] 收到消息: 类型=TEXT, OP=0, 完整数据={raw[:200]}{'...' if len(raw) > 200 else ''}")
+        logger.info(f"trader#0发了消息: {raw[:80] or '[空消息]'}")
+        logger.debug(f"消息已存在，跳过: {message_id}")
+        logger.info(f"消息存储成功: {message_id}")
+
+def after(logger: logging.Logger, sampled: SamplingLogger, frames: list):
+    """修改后的日志写法"""
+    for raw, message_id in frames:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[WebSocket] 收到消息: 类型=%s, OP=%s, 数据=%r%s", "TEXT", 0, raw[:200], '...' if len(raw) > 200 else '')
+        sampled.info("%s发了消息: %s", "trader#0", raw[:80] or '[空消息]')
+        sampled.debug("消息已存在，跳过: %s", message_id)
+        sampled.info("消息存储成功: %s", message_id)
+
+def bench(fn, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="网关热路径日志开销基准测试")
+    parser.add_argument("--frames", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--sample-interval", type=float, default=10, help="SamplingLogger 采样间隔(秒)")
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    logger = logging.getLogger("bench.gateway")
+    logger.propagate = False
+    logger.addHandler(logging.NullHandler())
+
+    print(f"{args.frames} 个帧，每个帧 4 条日志语句，单帧耗时 (微秒):")
+    print(f"  {'级别':<10}{'修改前':>12}{'修改后':>12}{'加速':>10}")
+    for level in (logging.WARNING, logging.INFO, logging.DEBUG):
+        logger.setLevel(level)
+        sampled = SamplingLogger(logger, args.sample_interval)
+        old = bench(lambda: before(logger, frames), args.runs) / args.frames * 1e6
+        new = bench(lambda: after(logger, sampled, frames), args.runs) / args.frames * 1e6
+        print(f"  {logging.getLevelName(level):<10}{old:>12.2f}{new:>12.2f}{old / new:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
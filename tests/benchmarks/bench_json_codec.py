@@ -0,0 +1,177 @@
+"""
+JSON 编解码基准测试
+
+比较标准库 json、orjson、msgspec（已安装的）在三类热点上的耗时：
+- 网关帧解析：完整解析 vs msgspec 结构体（负载按需解析，只解析 MESSAGE_CREATE）
+- 前端广播编码：broadcast_message 推送的消息字典
+- 负载体积：不同实现编码结果的字节数
+
+默认使用内置的合成负载（MESSAGE_CREATE、PRESENCE_UPDATE、TYPING_START 等按常见比例混合，
+以及一个大 READY）；--payloads 可以指定录制的网关帧文件（每行一个 JSON 帧，可为 .gz）。
+不需要数据库和网络。
+
+用法:
+    python tests/benchmarks/bench_json_codec.py
+    python tests/benchmarks/bench_json_codec.py --payloads recordings/gateway-20240101.ndjson.gz --runs 7
+"""
+import argparse
+import gzip
+import json
+import random
+import statistics
+import time
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+def _message_create(i: int) -> dict:
+    return {
+        "op": 0, "s": i, "t": "MESSAGE_CREATE",
+        "d": {
+            "id": str(1200000000000000000 + i),
+            "channel_id": "1100000000000000000",
+            "guild_id": "1000000000000000000",
+            "content": "BTC 突破 70000，止损 68500，目标 74000 $BTC $ETH " * random.randint(1, 4),
+            "timestamp": "2024-05-01T12:00:00.000000+00:00",
+            "author": {"id": "900000000000000000", "username": "trader", "discriminator": "0", "avatar": "a" * 32},
+            "attachments": [],
+            "embeds": [{"type": "rich", "title": "Signal", "description": "Long BTC" * 10}] if i % 5 == 0 else [],
+            "mentions": [],
+            "member": {"roles": ["1"] * 5, "joined_at": "2023-01-01T00:00:00+00:00"},
+        },
+    }
+
+def _presence_update(i: int) -> dict:
+    return {
+        "op": 0, "s": i, "t": "PRESENCE_UPDATE",
+        "d": {
+            "user": {"id": str(800000000000000000 + i)},
+            "status": "online",
+            "activities": [{"name": "Game", "type": 0, "created_at": 1714564800000}],
+            "client_status": {"desktop": "online"},
+            "guild_id": "1000000000000000000",
+        },
+    }
+
+def _typing_start(i: int) -> dict:
+    return {"op": 0, "s": i, "t": "TYPING_START", "d": {"channel_id": "1", "user_id": "2", "timestamp": 1714564800}}
+
+def synthetic_frames(count: int) -> list:
+    """合成网关帧：约 20% MESSAGE_CREATE，其余为在线状态、输入中和心跳确认"""
+    random.seed(42)
+    frames = []
+    for i in range(count):
+        roll = random.random()
+        if roll < 0.2:
+            frames.append(_message_create(i))
+        elif roll < 0.7:
+            frames.append(_presence_update(i))
+        elif roll < 0.95:
+            frames.append(_typing_start(i))
+        else:
+            frames.append({"op": 11, "d": None})
+    ready = {
+        "op": 0, "s": 1, "t": "READY",
+        "d": {"session_id": "x" * 32, "guilds": [{"id": str(g), "channels": [{"id": str(c), "name": f"ch-{c}"} for c in range(200)]} for g in range(50)]},
+    }
+    frames.append(ready)
+    return [json.dumps(frame, ensure_ascii=False).encode("utf-8") for frame in frames]
+
+def load_frames(path: str) -> list:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        frames = []
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            # 兼容录制文件中带时间戳的包装格式 {"ts": ..., "frame": {...}}
+            frame = record.get("frame", record) if isinstance(record, dict) else record
+            frames.append(json.dumps(frame, ensure_ascii=False).encode("utf-8"))
+    return frames
+
+def bench(label: str, fn, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    print(f"  {label:<40} {median * 1000:9.2f} ms")
+    return median
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 编解码基准测试")
+    parser.add_argument("--payloads", help="录制的网关帧文件（ndjson，可为 .gz）")
+    parser.add_argument("--frames", type=int, default=20000, help="合成帧数量（未指定 --payloads 时）")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    frames = load_frames(args.payloads) if args.payloads else synthetic_frames(args.frames)
+    total_bytes = sum(len(frame) for frame in frames)
+    print(f"{len(frames)} 个网关帧，共 {total_bytes / 1024 / 1024:.1f} MB")
+    print(f"已安装: orjson={'是' if orjson else '否'}, msgspec={'是' if msgspec else '否'}")
+
+    print("\n网关帧解析（只处理 MESSAGE_CREATE 的负载）:")
+    def full_decode(loads):
+        def run():
+            for frame in frames:
+                data = loads(frame)
+                if data.get("t") == "MESSAGE_CREATE":
+                    data["d"]["content"]
+        return run
+
+    results = {"json": bench("json.loads", full_decode(json.loads), args.runs)}
+    if orjson:
+        results["orjson"] = bench("orjson.loads", full_decode(orjson.loads), args.runs)
+    if msgspec:
+        results["msgspec"] = bench("msgspec.json.decode", full_decode(msgspec.json.decode), args.runs)
+
+        class GatewayFrame(msgspec.Struct):
+            op: int
+            s: Optional[int] = None
+            t: Optional[str] = None
+            d: msgspec.Raw = msgspec.Raw(b"null")
+
+        decoder = msgspec.json.Decoder(GatewayFrame)
+
+        def lazy_decode():
+            for frame in frames:
+                parsed = decoder.decode(frame)
+                if parsed.t == "MESSAGE_CREATE":
+                    msgspec.json.decode(parsed.d)["content"]
+
+        results["msgspec struct"] = bench("msgspec 结构体 + 按需解析负载", lazy_decode, args.runs)
+
+    baseline = results["json"]
+    for name, value in results.items():
+        print(f"  {name:<20} 相对 json: {baseline / value:5.2f}x")
+
+    print("\n前端广播编码:")
+    messages = [json.loads(frame)["d"] for frame in frames if b'"MESSAGE_CREATE"' in frame]
+    broadcasts = [{"type": "new_message", "message": message} for message in messages]
+    bench("json.dumps", lambda: [json.dumps(m) for m in broadcasts], args.runs)
+    bench("json.dumps(ensure_ascii=False)", lambda: [json.dumps(m, ensure_ascii=False) for m in broadcasts], args.runs)
+    if orjson:
+        bench("orjson.dumps", lambda: [orjson.dumps(m) for m in broadcasts], args.runs)
+    if msgspec:
+        encoder = msgspec.json.Encoder()
+        bench("msgspec encode", lambda: [encoder.encode(m) for m in broadcasts], args.runs)
+
+    print("\n编码体积:")
+    print(f"  json (ASCII 转义)    {sum(len(json.dumps(m).encode()) for m in broadcasts) / 1024:9.1f} KB")
+    print(f"  json (UTF-8)         {sum(len(json.dumps(m, ensure_ascii=False).encode()) for m in broadcasts) / 1024:9.1f} KB")
+    if orjson:
+        print(f"  orjson               {sum(len(orjson.dumps(m)) for m in broadcasts) / 1024:9.1f} KB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+消息热点查询基准测试
+
+在独立的 schema（默认 bench）中建表并用 generate_series 生成约一百万条消息，
+对各个 API 使用的查询分别在添加索引前后执行 EXPLAIN (ANALYZE, BUFFERS)，输出耗时和执行计划对比。
+只读写 bench schema，不会触碰应用的表；已有 bench schema 时默认复用数据，--reseed 才会删除重建。
+
+用法:
+    python tests/benchmarks/bench_message_queries.py
+    python tests/benchmarks/bench_message_queries.py --messages 2000000 --runs 7 --reseed
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+# 与 alembic/versions/861e15ef5b48_add_hot_query_indexes.py 中的 INDEXES 保持一致
+INDEXES = [
+    ('ix_messages_channel_id_created_at', 'messages', '(channel_id, created_at DESC)'),
+    ('ix_messages_created_at', 'messages', '(created_at)'),
+    ('ix_messages_kol_id', 'messages', '(kol_id)'),
+    ('ix_attachments_message_id', 'attachments', '(message_id)'),
+    ('ix_ai_messages_processed_priority_created', 'ai_messages', '(is_processed, priority, created_at)'),
+    ('ix_ai_messages_processed_created_at', 'ai_messages', '(created_at DESC) WHERE is_processed'),
+    ('ix_ai_messages_unprocessed', 'ai_messages', '(id) WHERE NOT is_processed'),
+    ('ix_ai_messages_trading_priority', 'ai_messages',
+     '(priority DESC, created_at DESC) WHERE is_processed AND is_trading_related'),
+    ('ix_ai_messages_high_priority_processed_at', 'ai_messages',
+     '(processed_at DESC) WHERE is_processed AND is_trading_related AND priority >= 4'),
+    ('ix_ai_processing_logs_stage_start_time', 'ai_processing_logs', '(stage, start_time)'),
+]
+
+# 迁移前的表结构（只保留查询涉及的列和原有索引）
+SCHEMA_DDL = """
+CREATE TABLE channels (
+    id serial PRIMARY KEY,
+    platform_channel_id varchar UNIQUE NOT NULL,
+    name varchar,
+    guild_id varchar,
+    type integer,
+    is_active boolean DEFAULT true
+);
+CREATE TABLE kols (
+    id serial PRIMARY KEY,
+    name varchar,
+    platform_user_id varchar
+);
+CREATE TABLE messages (
+    id serial PRIMARY KEY,
+    platform_message_id varchar UNIQUE NOT NULL,
+    channel_id integer NOT NULL REFERENCES channels(id),
+    kol_id integer REFERENCES kols(id),
+    content varchar,
+    created_at timestamptz
+);
+CREATE TABLE attachments (
+    id serial PRIMARY KEY,
+    message_id integer REFERENCES messages(id) ON DELETE CASCADE,
+    filename varchar,
+    content_type varchar
+);
+CREATE TABLE unread_messages (
+    id serial PRIMARY KEY,
+    channel_id integer NOT NULL REFERENCES channels(id),
+    last_read_message_id integer REFERENCES messages(id),
+    unread_count integer DEFAULT 0
+);
+CREATE TABLE ai_messages (
+    id serial PRIMARY KEY,
+    channel_id varchar(100) NOT NULL,
+    message_content text NOT NULL,
+    is_trading_related boolean DEFAULT false,
+    priority integer DEFAULT 1,
+    category varchar(50),
+    is_processed boolean DEFAULT false,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    processed_at timestamptz
+);
+CREATE INDEX ix_ai_messages_channel_id ON ai_messages (channel_id);
+CREATE INDEX ix_ai_messages_is_trading_related ON ai_messages (is_trading_related);
+CREATE INDEX ix_ai_messages_priority ON ai_messages (priority);
+CREATE INDEX ix_ai_messages_category ON ai_messages (category);
+CREATE INDEX ix_ai_messages_is_processed ON ai_messages (is_processed);
+CREATE TABLE ai_processing_logs (
+    id serial PRIMARY KEY,
+    message_id integer NOT NULL,
+    stage varchar(50) NOT NULL,
+    status varchar(20) NOT NULL,
+    start_time timestamptz DEFAULT now(),
+    duration_ms integer
+);
+CREATE INDEX ix_ai_processing_logs_message_id ON ai_processing_logs (message_id);
+"""
+
+SEED_SQL = [
+    # 频道：约 5% 为论坛帖子
+    """
+    INSERT INTO channels (platform_channel_id, name, guild_id, type)
+    SELECT 'c' || g, 'channel-' || g, 'g' || (g % 20), CASE WHEN g % 20 = 0 THEN 11 ELSE 0 END
+    FROM generate_series(1, %(channels)s) g
+    """,
+    "INSERT INTO kols (name, platform_user_id) SELECT 'kol-' || g, 'u' || g FROM generate_series(1, %(kols)s) g",
+    # 消息：频道分布有偏（少数频道消息很多），时间均匀分布在最近 90 天
+    """
+    INSERT INTO messages (platform_message_id, channel_id, kol_id, content, created_at)
+    SELECT 'm' || g,
+           1 + floor(power(random(), 3) * %(channels)s)::int,
+           1 + floor(random() * %(kols)s)::int,
+           (ARRAY['BTC 突破', '$PEPE to the moon', 'SOL/USDT long', '大饼要涨了', 'ETH 看空',
+                  'gm', 'new listing soon', 'funding rate flipped'])[1 + floor(random() * 8)::int] || ' #' || g,
+           now() - random() * interval '90 days'
+    FROM generate_series(1, %(messages)s) g
+    """,
+    """
+    INSERT INTO attachments (message_id, filename, content_type)
+    SELECT 1 + floor(random() * %(messages)s)::int, 'img-' || g || '.png', 'image/png'
+    FROM generate_series(1, %(messages)s / 20) g
+    """,
+    "INSERT INTO unread_messages (channel_id, unread_count) SELECT id, 0 FROM channels",
+    """
+    INSERT INTO ai_messages (channel_id, message_content, is_trading_related, priority, category,
+                             is_processed, created_at, processed_at)
+    SELECT 'c' || (1 + floor(random() * %(channels)s)::int),
+           'ai message ' || g,
+           random() < 0.4,
+           1 + floor(random() * 5)::int,
+           (ARRAY['新闻', '交易信号', '市场分析', '其他'])[1 + floor(random() * 4)::int],
+           random() < 0.97,
+           ts,
+           ts + interval '5 seconds'
+    FROM (SELECT g, now() - random() * interval '90 days' AS ts
+          FROM generate_series(1, %(messages)s / 5) g) s
+    """,
+    """
+    INSERT INTO ai_processing_logs (message_id, stage, status, start_time, duration_ms)
+    SELECT g, 'stage1', 'completed', now() - random() * interval '90 days', (random() * 8000)::int
+    FROM generate_series(1, %(messages)s / 5) g
+    """,
+]
+
+# (名称, 对应的API, SQL)；:hot_channel 等占位符在运行时替换为实际值
+QUERIES = [
+    ("channel_page", "GET /api/messages",
+     "SELECT id, content, created_at FROM messages WHERE channel_id = %(hot_channel)s "
+     "ORDER BY created_at DESC LIMIT 20 OFFSET 40"),
+    ("channel_page_cold", "GET /api/messages (小频道)",
+     "SELECT id, content, created_at FROM messages WHERE channel_id = %(cold_channel)s "
+     "ORDER BY created_at DESC LIMIT 20"),
+    ("page_attachments", "GET /api/messages (附件预加载)",
+     "SELECT * FROM attachments WHERE message_id IN "
+     "(SELECT id FROM messages WHERE channel_id = %(hot_channel)s ORDER BY created_at DESC LIMIT 20)"),
+    ("build_context", "AI _build_context",
+     "SELECT id, content FROM messages WHERE channel_id = %(hot_channel)s "
+     "AND created_at < now() - interval '1 day' ORDER BY created_at DESC LIMIT 5"),
+    ("mark_all_read_latest", "POST /api/messages/mark-all-read",
+     "SELECT DISTINCT ON (channel_id) channel_id, id FROM messages ORDER BY channel_id, created_at DESC"),
+    ("delete_latest_other", "DELETE /api/messages/{id}",
+     "SELECT id FROM messages WHERE channel_id = %(hot_channel)s AND id <> %(some_message)s "
+     "ORDER BY created_at DESC LIMIT 1"),
+    ("ai_list", "GET /api/ai/messages",
+     "SELECT * FROM ai_messages WHERE is_processed ORDER BY created_at DESC LIMIT 20 OFFSET 20"),
+    ("ai_list_filtered", "GET /api/ai/messages?priority_min=4",
+     "SELECT * FROM ai_messages WHERE is_processed AND priority >= 4 ORDER BY created_at DESC LIMIT 20"),
+    ("ai_unprocessed_count", "AI status",
+     "SELECT count(*) FROM ai_messages WHERE NOT is_processed"),
+    ("ai_high_priority", "AI high priority",
+     "SELECT * FROM ai_messages WHERE is_processed AND is_trading_related AND priority >= 4 "
+     "ORDER BY priority DESC, created_at DESC LIMIT 10"),
+    ("ai_recent_high_priority", "AI status (recent)",
+     "SELECT * FROM ai_messages WHERE is_processed AND is_trading_related AND priority >= 4 "
+     "ORDER BY processed_at DESC LIMIT 5"),
+    ("ai_stats_24h", "AI processing stats",
+     "SELECT count(*), avg(duration_ms) FROM ai_processing_logs "
+     "WHERE stage = 'stage1' AND start_time >= now() - interval '24 hours'"),
+]
+
+def connect():
+    load_dotenv()
+    return psycopg2.connect(
+        dbname=os.getenv("POSTGRES_DB", "autotrade"),
+        user=os.getenv("POSTGRES_USER", "postgres"),
+        password=os.getenv("POSTGRES_PASSWORD", "postgres"),
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=os.getenv("POSTGRES_PORT", "5432")
+    )
+
+def schema_exists(cur, schema):
+    cur.execute("SELECT 1 FROM information_schema.schemata WHERE schema_name = %s", (schema,))
+    return cur.fetchone() is not None
+
+def seed(cur, args):
+    params = {"channels": args.channels, "kols": args.kols, "messages": args.messages}
+    cur.execute(SCHEMA_DDL)
+    for sql in SEED_SQL:
+        start = time.time()
+        cur.execute(sql, params)
+        print(f"  {cur.rowcount:>9} 行  {time.time() - start:6.1f}s  {sql.split()[2]}")
+    cur.execute("ANALYZE")
+
+def drop_indexes(cur):
+    for name, _, _ in INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+def create_indexes(cur):
+    for name, table, definition in INDEXES:
+        start = time.time()
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}")
+        print(f"  {name}: {time.time() - start:.1f}s")
+    for table in dict.fromkeys(table for _, table, _ in INDEXES):
+        cur.execute(f"ANALYZE {table}")
+
+def query_params(cur):
+    # 消息最多和较少的频道各取一个
+    cur.execute("SELECT channel_id FROM messages GROUP BY channel_id ORDER BY count(*) DESC LIMIT 1")
+    hot_channel = cur.fetchone()[0]
+    cur.execute("SELECT channel_id FROM messages GROUP BY channel_id ORDER BY count(*) LIMIT 1")
+    cold_channel = cur.fetchone()[0]
+    cur.execute("SELECT max(id) FROM messages WHERE channel_id = %s", (hot_channel,))
+    some_message = cur.fetchone()[0]
+    return {"hot_channel": hot_channel, "cold_channel": cold_channel, "some_message": some_message}
+
+def _plan_summary(node):
+    """执行计划的简要描述：节点类型和使用的索引，按深度优先展开"""
+    label = node["Node Type"]
+    if node.get("Index Name"):
+        label += f"({node['Index Name']})"
+    children = [_plan_summary(child) for child in node.get("Plans", [])]
+    return label + (" > " + ", ".join(children) if children else "")
+
+def explain(cur, sql, params, runs):
+    timings = []
+    plan = None
+    for _ in range(runs):
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+        result = cur.fetchone()[0]
+        if isinstance(result, str):
+            result = json.loads(result)
+        timings.append(result[0]["Execution Time"])
+        plan = result[0]["Plan"]
+    return statistics.median(timings), _plan_summary(plan)
+
+def run_queries(cur, params, runs):
+    return {name: explain(cur, sql, params, runs) for name, _, sql in QUERIES}
+
+def main():
+    parser = argparse.ArgumentParser(description="消息热点查询索引前后对比")
+    parser.add_argument("--schema", default="bench", help="基准测试使用的独立 schema")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--channels", type=int, default=2_000)
+    parser.add_argument("--kols", type=int, default=5_000)
+    parser.add_argument("--runs", type=int, default=5, help="每条查询执行次数，取中位数")
+    parser.add_argument("--reseed", action="store_true", help="删除并重建已有的 bench schema")
+    args = parser.parse_args()
+
+    if args.schema == "public":
+        sys.exit("不能在 public schema 中运行基准测试")
+
+    conn = connect()
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    try:
+        exists = schema_exists(cur, args.schema)
+        if exists and args.reseed:
+            print(f"删除 schema {args.schema}")
+            cur.execute(f"DROP SCHEMA {args.schema} CASCADE")
+            exists = False
+
+        if not exists:
+            cur.execute(f"CREATE SCHEMA {args.schema}")
+        cur.execute(f"SET search_path TO {args.schema}")
+
+        if not exists:
+            print(f"生成测试数据（{args.messages} 条消息）...")
+            seed(cur, args)
+        else:
+            print(f"复用 schema {args.schema} 中已有的数据（--reseed 重新生成）")
+
+        params = query_params(cur)
+
+        print("\n添加索引前...")
+        drop_indexes(cur)
+        cur.execute("ANALYZE")
+        before = run_queries(cur, params, args.runs)
+
+        print("\n创建索引...")
+        create_indexes(cur)
+        after = run_queries(cur, params, args.runs)
+
+        print(f"\n{'查询':<24}{'API':<36}{'之前(ms)':>12}{'之后(ms)':>12}{'加速':>10}")
+        for name, api, _ in QUERIES:
+            before_ms, before_plan = before[name]
+            after_ms, after_plan = after[name]
+            speedup = before_ms / after_ms if after_ms else float("inf")
+            print(f"{name:<24}{api:<36}{before_ms:>12.2f}{after_ms:>12.2f}{speedup:>9.1f}x")
+            print(f"    之前: {before_plan}")
+            print(f"    之后: {after_plan}")
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()